@@ -0,0 +1,77 @@
+"""Routing of reads to read replicas.
+
+Reads go to replicas only inside of a request passed through ReplicaRoutingMiddleware,
+commands and other code outside of requests use the primary database.
+After the first write the request is pinned to the primary, so it reads its own writes.
+Following requests of the same client are pinned too for REPLICA_PIN_SECONDS (replication lag):
+browsers by cookie, API clients by their user.
+"""
+import random
+from contextvars import ContextVar, Token
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+REPLICA = 'replica'
+PINNED = 'pinned'
+WRITTEN = 'written'
+PIN_COOKIE = 'db_pin'
+
+_route: ContextVar[Optional[str]] = ContextVar('db_route', default=None)
+
+
+class ReplicaRouter:
+    """Router sending reads to random replica of DATABASE_REPLICAS, writes to the default database."""
+
+    def db_for_read(self, model, **hints) -> str:
+        """Return alias of database for reads."""
+        if _route.get() != REPLICA or not settings.DATABASE_REPLICAS:
+            return 'default'
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints) -> str:
+        """Return alias of database for writes, pin the current request to it."""
+        if _route.get() is not None:
+            _route.set(WRITTEN)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints) -> bool:
+        """Objects of all databases are related, replicas have the same data."""
+        return True
+
+
+def start_request() -> Token:
+    """Route reads of the current request to replicas."""
+    return _route.set(REPLICA)
+
+
+def end_request(token: Token) -> None:
+    """Stop routing of the current request."""
+    _route.reset(token)
+
+
+def uses_replicas() -> bool:
+    """Check if reads of the current request go to replicas."""
+    return _route.get() == REPLICA
+
+
+def pin_primary() -> None:
+    """Route all next reads of the current request to the primary."""
+    if _route.get() == REPLICA:
+        _route.set(PINNED)
+
+
+def has_written() -> bool:
+    """Check if the current request wrote to the primary."""
+    return _route.get() == WRITTEN
+
+
+def pin_user(user_id: int) -> None:
+    """Pin next requests of the user to the primary."""
+    cache.set(f'db-pin:{user_id}', 1, settings.REPLICA_PIN_SECONDS)
+
+
+def is_user_pinned(user_id: int) -> bool:
+    """Check if requests of the user are pinned to the primary."""
+    return bool(cache.get(f'db-pin:{user_id}'))
@@ -1,7 +1,13 @@
 import json
-from typing import Any, List, Optional, Tuple
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
 
-from django.http import HttpResponse
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header, parse_etags
 
 
 class Size:
@@ -30,20 +36,89 @@ class Size:
         """Return height."""
         return self.__height
 
+    @staticmethod
+    def unique(sizes: List) -> List:
+        """Return sizes without duplicates, order is kept."""
+        result: Dict[str, Any] = {}
+        for size in sizes:
+            result.setdefault(str(size), size)
+        return list(result.values())
+
+    @staticmethod
+    def is_valid(size_str: str) -> bool:
+        """Check string representation of size."""
+        return bool(re.match(r'^[0-9]+x[0-9]+$', size_str))
+
     @classmethod
     def from_str(cls, size_str: str):
         """Return object by sting representation."""
         width, height = size_str.split('x')
         return cls(int(width), int(height))
 
+    @classmethod
+    def list_from_str(cls, sizes_str: str) -> List:
+        """Return list of objects by comma separated string representation."""
+        return [cls.from_str(size) for size in sizes_str.split(',') if size]
+
     def as_tuple(self) -> Tuple[int, int]:
         """Return width and height in tuple."""
         return self.__width, self.__height
 
+    def covers(self, other) -> bool:
+        """Check that both sides are not less than sides of the other size."""
+        return self.__width >= other.width and self.__height >= other.height
+
+    def round_up(self, step: int):
+        """Return size with sides rounded up to multiples of the step."""
+        return Size(-(-self.__width // step) * step, -(-self.__height // step) * step)
+
+    def snap_up(self, sizes: List):
+        """Return the smallest of the sizes which covers this one, the biggest one if none covers, None if no sizes."""
+        covering = [size for size in sizes if size.covers(self)]
+        if covering:
+            return min(covering, key=lambda size: size.width * size.height)
+        return max(sizes, key=lambda size: size.width * size.height, default=None)
+
 
 Sizes = Optional[List[Size]]
 
 
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Return first and last bytes of Range header.
+
+    None is returned if there is no header, it's incorrect or contains several ranges (whole file is sent then).
+    Raises ValueError if the range is unsatisfiable.
+    """
+    match = re.match(r'^bytes=(\d*)-(\d*)$', header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    first_str, last_str = match.groups()
+    if not first_str:
+        # suffix range: last N bytes
+        if int(last_str) == 0:
+            raise ValueError('Empty range')
+        return max(size - int(last_str), 0), size - 1
+
+    first = int(first_str)
+    if last_str and int(last_str) < first:
+        return None
+    if first >= size:
+        raise ValueError('Range is out of file')
+    return first, min(int(last_str), size - 1) if last_str else size - 1
+
+
+def iter_file(opened_file: BinaryIO, length: int, block_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Yield length bytes of the file from its current position, close the file at the end."""
+    with opened_file:
+        while length > 0:
+            chunk = opened_file.read(min(block_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
 class Response:
     """Wrapper class for HttpResponse to simplify responses."""
 
@@ -54,7 +129,7 @@ class Response:
     SERVER_ERROR = -3
 
     @staticmethod
-    def json(code: int, message: Any, status_code: int = 200) -> HttpResponse:
+    def json(code: int, message: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> HttpResponse:
         """JSON response."""
         return HttpResponse(
             json.dumps({
@@ -63,9 +138,44 @@ class Response:
             }),
             content_type='application/json; charset=utf-8',
             status=status_code,
+            headers=headers,
         )
 
     @staticmethod
     def text(message: str, status_code: int = 200) -> HttpResponse:
         """Plain text response."""
         return HttpResponse(message, content_type='text/plain; charset=utf-8', status=status_code)
+
+    @staticmethod
+    def file(request: WSGIRequest, path: Path, filename: str) -> HttpResponse:
+        """File attachment response supporting Range and If-None-Match headers.
+
+        Raises FileNotFoundError if there is no file.
+        """
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = {'ETag': etag, 'Accept-Ranges': 'bytes'}
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+            return HttpResponseNotModified(headers={'ETag': etag})
+
+        try:
+            byte_range = parse_range(request.headers.get('Range', ''), stat.st_size)
+        except ValueError:
+            return HttpResponse(status=416, headers={'Content-Range': f'bytes */{stat.st_size}'})
+
+        opened_file = open(path, 'rb')
+        if byte_range is None:
+            return FileResponse(opened_file, as_attachment=True, filename=filename, headers=headers)
+
+        first, last = byte_range
+        opened_file.seek(first)
+        headers['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+        headers['Content-Length'] = str(last - first + 1)
+        headers['Content-Disposition'] = content_disposition_header(True, filename) or ''
+        return StreamingHttpResponse(
+            iter_file(opened_file, last - first + 1),
+            status=206,
+            content_type=mimetypes.guess_type(str(path))[0] or 'application/octet-stream',
+            headers=headers,
+        )
@@ -0,0 +1,86 @@
+import hashlib
+import math
+import time
+from typing import Any, Callable, Optional
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+MISSING = 'missing'  # cached instead of rows which don't exist
+PROCESS_CACHES = (LocMemCache, DummyCache)  # caches which aren't shared by processes
+
+
+def is_shared_cache(alias: str = DEFAULT_CACHE_ALIAS) -> bool:
+    """Check that the cache is shared by all processes (memcached, redis, DB or files)."""
+    return not isinstance(caches[alias], PROCESS_CACHES)
+
+
+class CachedLookup:
+    """Lookup of rows by key cached in django cache.
+
+    Cache is shared by all processes using the same cache (memcached or redis), so are invalidations.
+    Missing rows are cached for a shorter time. Concurrent misses of the same key are coalesced:
+    only the request which took the lock of the key loads the row, others wait for the result up to `wait` seconds.
+    Zero ttl turns the cache off, so does the cache of a process (local memory):
+    rows deleted by other processes would be returned until they expire.
+    """
+
+    def __init__(
+        self, prefix: str, ttl: int, miss_ttl: int, wait: float = 0.5, alias: str = DEFAULT_CACHE_ALIAS,
+    ) -> None:
+        """Init method, saves times to live of found and missing rows (in seconds) and alias of the cache."""
+        self.prefix = prefix
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.wait = wait
+        self.alias = alias
+
+    @property
+    def cache(self):
+        """Return the cache."""
+        return caches[self.alias]
+
+    @property
+    def enabled(self) -> bool:
+        """Check that rows are cached."""
+        return bool(self.ttl) and is_shared_cache(self.alias)
+
+    def cache_key(self, key: str) -> str:
+        """Return key of the cache, keys of rows may contain characters not allowed in memcached."""
+        return f'{self.prefix}:{hashlib.sha1(key.encode()).hexdigest()}'
+
+    def get(self, key: str, load: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """Return cached row or load it, None if there is no row."""
+        if not self.enabled:
+            return load()
+        cache_key = self.cache_key(key)
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            cached = self.load(cache_key, load)
+        return None if cached == MISSING else cached
+
+    def load(self, cache_key: str, load: Callable[[], Optional[Any]]) -> Any:
+        """Load the row once for all concurrent requests and cache it, return the row or MISSING."""
+        lock_key = f'{cache_key}:lock'
+        deadline = time.monotonic() + self.wait
+        locked = self.cache.add(lock_key, 1, timeout=math.ceil(self.wait) + 1)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.01)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+            locked = self.cache.add(lock_key, 1, timeout=math.ceil(self.wait) + 1)
+
+        try:
+            row = load()
+            self.cache.set(cache_key, MISSING if row is None else row, self.miss_ttl if row is None else self.ttl)
+        finally:
+            if locked:
+                self.cache.delete(lock_key)
+        return MISSING if row is None else row
+
+    def forget(self, *keys: str) -> None:
+        """Remove rows from the cache."""
+        if self.enabled and keys:
+            self.cache.delete_many([self.cache_key(key) for key in keys])
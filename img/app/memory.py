@@ -0,0 +1,189 @@
+"""Memory watermarks of long-lived processes.
+
+Decoding of big images fragments the allocator, so RSS of a worker grows over time instead of returning to the OS.
+Worker which crossed the soft limit (MEMORY_SOFT_LIMIT_MB) is retired when its requests are finished,
+the server starts a new one. Batch commands are restarted and continue from the last processed item.
+"""
+import logging
+import os
+import resource
+import signal
+import sys
+import threading
+from argparse import Action, OPTIONAL
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished
+from django.db import connections
+
+MB = 1024 ** 2
+
+logger = logging.getLogger(__name__)
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """Return resident set size of the process in bytes (None if unknown)."""
+    try:
+        with open(f'/proc/{pid}/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def rss_bytes() -> int:
+    """Return resident set size of the current process, the peak one if /proc isn't available."""
+    return read_rss(os.getpid()) or peak_rss_bytes()
+
+
+def peak_rss_bytes() -> int:
+    """Return peak resident memory of the process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def option_args(action: Action, value: Any) -> List[str]:
+    """Return command line arguments which set the value of the argument of the parser."""
+    values = list(value) if isinstance(value, (list, tuple)) else [value]
+    if not action.option_strings:
+        return [str(item) for item in values]
+    option = max(action.option_strings, key=len)
+    if action.nargs == 0:
+        return [option]
+    if action.nargs is None or action.nargs == OPTIONAL:
+        return [f'{option}={item}' for item in values]
+    return [option] + [str(item) for item in values]
+
+
+def command_name(command: BaseCommand) -> str:
+    """Return name of the management command."""
+    return command.__module__.rsplit('.', 1)[-1]
+
+
+def command_argv(command: BaseCommand, options: Dict[str, Any]) -> List[str]:
+    """Return arguments of manage.py which run the management command with the options.
+
+    Options equal to the defaults of the parser are omitted, so it's the same for call_command and command line.
+    """
+    name = command_name(command)
+    argv = [str(Path(settings.BASE_DIR) / 'manage.py'), name]
+    for action in command.create_parser('manage.py', name)._actions:
+        value = options.get(action.dest, action.default)
+        if value != action.default:
+            argv += option_args(action, value)
+    return argv
+
+
+class MemoryWatermark:
+    """Peak RSS per kind of work and the soft limit of RSS of the process.
+
+    Work which raised the peak of the process is accounted by the peak, otherwise by RSS after it.
+    Zero limit turns the limit off, peaks are still recorded.
+    """
+
+    def __init__(self, soft_limit: Optional[int] = None) -> None:
+        """Init method, the limit in bytes is taken from settings by default."""
+        self.soft_limit = settings.MEMORY_SOFT_LIMIT_MB * MB if soft_limit is None else soft_limit
+        self.peaks: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def measure(self, kind: str, peak_before: int) -> int:
+        """Record memory used by the work of the kind, return the current RSS."""
+        rss = rss_bytes()
+        peak = peak_rss_bytes()
+        with self.lock:
+            self.peaks[kind] = max(self.peaks.get(kind, 0), rss, peak if peak > peak_before else 0)
+        return rss
+
+    def exceeded(self, rss: int) -> bool:
+        """Check that RSS is over the soft limit."""
+        return bool(self.soft_limit) and rss > self.soft_limit
+
+    def report(self, rss: int) -> str:
+        """Return RSS and peaks of kinds of work, the biggest first."""
+        with self.lock:
+            peaks = sorted(self.peaks.items(), key=lambda item: item[1], reverse=True)
+        peaks_str = ', '.join(f'{kind} {peak // MB} MB' for kind, peak in peaks)
+        return f'RSS {rss // MB} MB of {self.soft_limit // MB} MB, peaks: {peaks_str}'
+
+
+class WorkerRetirement:
+    """Graceful exit of the server worker after its current requests.
+
+    The worker sends MEMORY_RETIRE_SIGNAL to itself when a request is finished (its response is sent),
+    the signal should be graceful shutdown of a worker for the server (SIGTERM for gunicorn).
+    """
+
+    def __init__(self) -> None:
+        """Init method."""
+        self.retiring = False
+        self.lock = threading.Lock()
+
+    def schedule(self, reason: str) -> None:
+        """Retire the worker when the current request is finished, it's done once."""
+        with self.lock:
+            if self.retiring:
+                return
+            self.retiring = True
+        logger.warning('Worker %s is retired: %s', os.getpid(), reason)
+        request_finished.connect(self.retire, weak=False, dispatch_uid='memory-retirement')
+
+    def retire(self, **kwargs) -> None:
+        """Send the signal of graceful exit to the worker."""
+        request_finished.disconnect(dispatch_uid='memory-retirement')
+        os.kill(os.getpid(), getattr(signal, settings.MEMORY_RETIRE_SIGNAL))
+
+
+class CommandWatchdog:
+    """Restarts the batch command whose RSS crossed the soft limit.
+
+    The process is replaced by a new one running the command with the same options and the resume option,
+    so the command continues from the last processed item with fresh memory. Commands which keep their progress
+    elsewhere (in DB, in a manifest) are restarted without the resume option.
+    """
+
+    def __init__(
+        self, command: BaseCommand, options: Dict[str, Any], option: Optional[str] = None,
+        soft_limit: Optional[int] = None,
+    ) -> None:
+        """Init method, option is the argument of the command which sets the item to continue after."""
+        self.command = command
+        self.options = options
+        self.option = option
+        self.watermark = MemoryWatermark(soft_limit)
+        self.peak = peak_rss_bytes()
+        self.rss = 0
+
+    @property
+    def exceeded(self) -> bool:
+        """Check that RSS measured last time is over the soft limit."""
+        return self.watermark.exceeded(self.rss)
+
+    def check(self, resume_value: Any = None) -> None:
+        """Restart the command after the processed item if RSS is over the soft limit."""
+        if self.over_limit():
+            self.restart(resume_value)
+
+    def over_limit(self) -> bool:
+        """Measure RSS of the process, check that it's over the soft limit."""
+        self.rss = self.watermark.measure(command_name(self.command), self.peak)
+        self.peak = peak_rss_bytes()
+        return self.exceeded
+
+    def restart(self, resume_value: Any = None) -> None:
+        """Replace the process by a new one running the command, after the item if the resume option is set."""
+        options = dict(self.options)
+        if self.option:
+            options[self.option.lstrip('-').replace('-', '_')] = resume_value
+            self.command.stdout.write(f'Restarted after {resume_value}: {self.watermark.report(self.rss)}')
+        else:
+            self.command.stdout.write(f'Restarted: {self.watermark.report(self.rss)}')
+        self.command.stdout.flush()
+        sys.stderr.flush()
+        connections.close_all()
+        os.execv(sys.executable, [sys.executable] + command_argv(self.command, options))
@@ -0,0 +1,128 @@
+import cProfile
+import random
+import time
+from contextlib import ExitStack
+from typing import Callable, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.http import HttpResponse
+
+from app.db import PIN_COOKIE, end_request, has_written, pin_primary, start_request
+from app.lookups import is_shared_cache
+from app.memory import MemoryWatermark, WorkerRetirement, peak_rss_bytes
+from app.profiling import StackSampler, save_profile, save_stacks
+from app.timing import Timings, activate, deactivate
+
+
+class ServerTimingMiddleware:
+    """Adds Server-Timing header with durations of request phases and profiles requests.
+
+    Part of requests (PROFILE_SAMPLE_RATE) is profiled by cProfile,
+    stacks of other requests are sampled and saved if request is slower than PROFILE_SLOW_MS.
+    Middleware is not used at all if it is disabled in settings.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        """Init method."""
+        if not (settings.SERVER_TIMING or settings.PROFILE_SAMPLE_RATE or settings.PROFILE_SLOW_MS):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.sampler: Optional[StackSampler] = None
+        if settings.PROFILE_SLOW_MS:
+            self.sampler = StackSampler(settings.PROFILE_SAMPLE_INTERVAL)
+
+    def __call__(self, request: WSGIRequest) -> HttpResponse:
+        """Process request."""
+        timings = Timings()
+        profiler = cProfile.Profile() if random.random() < settings.PROFILE_SAMPLE_RATE else None
+        stacks = self.sampler.watch() if self.sampler and not profiler else None
+
+        token = activate(timings)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.db_wrapper))
+                if profiler:
+                    response = profiler.runcall(self.get_response, request)
+                else:
+                    response = self.get_response(request)
+        finally:
+            duration = (time.perf_counter() - started) * 1000
+            deactivate(token)
+            if self.sampler and stacks is not None:
+                self.sampler.unwatch()
+
+        timings.add('total', duration)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = timings.header()
+        if profiler:
+            save_profile(request, duration, profiler)
+        elif stacks and duration >= settings.PROFILE_SLOW_MS:
+            save_stacks(request, duration, stacks)
+
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Routes reads of requests to read replicas (see app.db).
+
+    Browser which wrote something is pinned to the primary for REPLICA_PIN_SECONDS by cookie.
+    Middleware is not used at all if there are no replicas. Users are pinned in the cache,
+    so it should be shared by all workers.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        """Init method."""
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed()
+        if not is_shared_cache():
+            raise ImproperlyConfigured('Read replicas require a cache shared by all workers (CACHE_BACKEND)')
+        self.get_response = get_response
+
+    def __call__(self, request: WSGIRequest) -> HttpResponse:
+        """Process request."""
+        token = start_request()
+        try:
+            if request.COOKIES.get(PIN_COOKIE):
+                pin_primary()
+            response = self.get_response(request)
+            written = has_written()
+        finally:
+            end_request(token)
+
+        if written:
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+        return response
+
+
+class MemoryWatermarkMiddleware:
+    """Samples RSS of the worker after every request and retires the worker which crossed the soft limit.
+
+    Peak RSS is recorded by method and name of the view, peaks are reported when the worker is retired.
+    Middleware is not used at all if the limit is not set.
+    """
+
+    def __init__(self, get_response: Callable) -> None:
+        """Init method."""
+        if not settings.MEMORY_SOFT_LIMIT_MB:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.watermark = MemoryWatermark()
+        self.retirement = WorkerRetirement()
+
+    def __call__(self, request: WSGIRequest) -> HttpResponse:
+        """Process request."""
+        peak = peak_rss_bytes()
+        response = self.get_response(request)
+
+        resolver_match = request.resolver_match
+        kind = f'{request.method} {resolver_match.view_name if resolver_match else "unknown"}'
+        rss = self.watermark.measure(kind, peak)
+        if self.watermark.exceeded(rss):
+            self.retirement.schedule(self.watermark.report(rss))
+
+        return response
@@ -0,0 +1,106 @@
+"""Profiles of sampled and slow requests.
+
+Sampled requests are profiled by cProfile (files *.prof, readable by pstats),
+stacks of slow requests are sampled by a thread (files *.txt in collapsed format of flame graphs).
+"""
+import cProfile
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+
+PROFILE_EXT = '.prof'
+STACKS_EXT = '.txt'
+
+
+class StackSampler:
+    """Thread which periodically samples stacks of watched threads.
+
+    It is started on the first watch, so it is created after forks of the server.
+    """
+
+    def __init__(self, interval: float) -> None:
+        """Init method."""
+        self.interval = interval
+        self.watched: Dict[int, Counter] = {}
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def collapse(frame) -> str:
+        """Return stack of the frame in collapsed format: outer;...;inner."""
+        names = []
+        while frame is not None:
+            names.append(f'{frame.f_globals.get("__name__", "?")}.{frame.f_code.co_name}')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def watch(self) -> Counter:
+        """Start sampling of the current thread, return counter of its stacks."""
+        stacks: Counter = Counter()
+        with self.lock:
+            self.watched[threading.get_ident()] = stacks
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+                self.thread.start()
+        return stacks
+
+    def unwatch(self) -> None:
+        """Stop sampling of the current thread."""
+        with self.lock:
+            self.watched.pop(threading.get_ident(), None)
+
+    def run(self) -> None:
+        """Sample stacks of watched threads."""
+        while True:
+            time.sleep(self.interval)
+            with self.lock:
+                if not self.watched:
+                    continue
+                frames = sys._current_frames()
+                for ident, stacks in self.watched.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[self.collapse(frame)] += 1
+
+
+def profile_path(request: WSGIRequest, duration: float, ext: str) -> Path:
+    """Return path to a new profile of the request."""
+    slug = re.sub(r'[^a-zA-Z0-9]+', '-', request.path).strip('-')[:50] or 'root'
+    name = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{request.method}-{slug}-{duration:.0f}ms{ext}'
+    os.makedirs(settings.PROFILES_DIR, exist_ok=True)
+    return Path(settings.PROFILES_DIR) / name
+
+
+def save_profile(request: WSGIRequest, duration: float, profiler: cProfile.Profile) -> Path:
+    """Save cProfile stats of the request."""
+    path = profile_path(request, duration, PROFILE_EXT)
+    profiler.dump_stats(path)
+    return path
+
+
+def save_stacks(request: WSGIRequest, duration: float, stacks: Counter) -> Path:
+    """Save sampled stacks of the request."""
+    path = profile_path(request, duration, STACKS_EXT)
+    with open(path, 'w') as profile:
+        for stack, cnt in stacks.most_common():
+            profile.write(f'{stack} {cnt}\n')
+    return path
+
+
+def list_profiles() -> List[Path]:
+    """Return saved profiles, the newest first."""
+    try:
+        entries = os.scandir(settings.PROFILES_DIR)
+    except FileNotFoundError:
+        return []
+    paths = [Path(entry.path) for entry in entries if entry.name.endswith((PROFILE_EXT, STACKS_EXT))]
+    return sorted(paths, key=lambda path: path.name, reverse=True)
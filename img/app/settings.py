@@ -58,9 +58,13 @@ INSTALLED_APPS = [
     # mine
     'images.apps.ImagesConfig',
     'tokens.apps.TokensConfig',
+    'webhooks.apps.WebhooksConfig',
 ]
 
 MIDDLEWARE = [
+    'app.middleware.ServerTimingMiddleware',  # not used if disabled
+    'app.middleware.ReplicaRoutingMiddleware',  # not used if there are no replicas
+    'app.middleware.MemoryWatermarkMiddleware',  # not used if there is no memory limit
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # third-party
@@ -105,6 +109,43 @@ DATABASES = {
         'PORT': 5432,
     }
 }
+# read replicas (streaming replicas of the default database), reads of requests are sent to them
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(host for host in env('POSTGRES_REPLICA_HOSTS', '').split(',') if host):
+    DATABASES[f'replica{index + 1}'] = {**DATABASES['default'], 'HOST': replica_host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{index + 1}')
+DATABASE_ROUTERS = ['app.db.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(env('REPLICA_PIN_SECONDS', '5'))  # requests read from primary after a write (replica lag)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# use memcached or redis to share rate limits between all workers
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', ''),
+    }
+}
+RATE_LIMIT_REQUESTS = int(env('RATE_LIMIT_REQUESTS', '0'))  # API requests of a user per period, 0 – no limit
+RATE_LIMIT_PERIOD = int(env('RATE_LIMIT_PERIOD', '60'))  # seconds
+IMAGE_CACHE_TTL = int(env('IMAGE_CACHE_TTL', '60'))  # seconds images are cached in shared cache, 0 – off
+IMAGE_CACHE_MISS_TTL = int(env('IMAGE_CACHE_MISS_TTL', '5'))  # seconds missing images are cached
+
+
+# Server-Timing header and profiling of requests
+
+SERVER_TIMING = bool(env('SERVER_TIMING', '0') == '1')  # add Server-Timing header to responses
+PROFILE_SAMPLE_RATE = float(env('PROFILE_SAMPLE_RATE', '0'))  # part of requests profiled by cProfile
+PROFILE_SLOW_MS = int(env('PROFILE_SLOW_MS', '0'))  # stacks of slower requests are saved, 0 – off
+PROFILE_SAMPLE_INTERVAL = float(env('PROFILE_SAMPLE_INTERVAL', '0.005'))  # seconds between samples of stacks
+PROFILES_DIR = env('PROFILES_DIR', '/project/profiles')  # profiles of requests (inside docker)
+
+# Memory watermarks of workers and batch commands
+
+MEMORY_SOFT_LIMIT_MB = int(env('MEMORY_SOFT_LIMIT_MB', '0'))  # RSS to retire workers and restart commands, 0 – off
+MEMORY_RETIRE_SIGNAL = env('MEMORY_RETIRE_SIGNAL', 'SIGTERM')  # graceful exit of a worker for the server
 
 
 # Password validation
@@ -150,6 +191,30 @@ STATICFILES_DIRS = [
 ]
 ORIGINALS_DIR = '/project/uploads/originals'  # originals of uploaded images (inside docker)
 RESIZES_DIR = '/project/uploads/resizes'  # resizes of uploaded images (inside docker)
+COLD_ORIGINALS_DIR = env('COLD_ORIGINALS_DIR', '/project/uploads/cold')  # cold tier of originals, may be another volume
+COLD_ORIGINALS_CODEC = env('COLD_ORIGINALS_CODEC', 'gzip')  # gzip or zstd (requires zstandard)
+COLD_ORIGINALS_DAYS = int(env('COLD_ORIGINALS_DAYS', '90'))  # originals not read for this number of days are cold
+UPLOADS_STAGING_DIR = '/project/uploads/staging'  # chunks of resumable uploads (the same volume as originals)
+DATA_UPLOAD_MAX_NUMBER_FILES = int(env('UPLOAD_MAX_FILES', '100'))  # files in one upload request
+UPLOAD_MAX_BYTES = int(env('UPLOAD_MAX_BYTES', '0'))  # default limit of one upload request of users, 0 – no limit
+UPLOAD_MAX_PIXELS = int(env('UPLOAD_MAX_PIXELS', '200000000'))  # width * height of uploaded image, 0 – no limit
+UPLOAD_SNIFF_BYTES = int(env('UPLOAD_SNIFF_BYTES', str(64 * 1024)))  # first bytes of uploaded file to identify it
+UPLOAD_WORKERS = int(env('UPLOAD_WORKERS', '4'))  # threads creating files of images uploaded by one request
+UPLOAD_SESSION_TTL = int(env('UPLOAD_SESSION_TTL', '86400'))  # seconds since the last chunk of resumable upload
+ORIGINALS_ACCEL_PREFIX = env('ORIGINALS_ACCEL_PREFIX', '')  # internal nginx location of originals, '' – sent by django
+PRESET_BACKFILL_RATE = float(env('PRESET_BACKFILL_RATE', '10'))  # images per second for backfill of presets
+RESIZES_HIGH_WATERMARK = float(env('RESIZES_HIGH_WATERMARK', '0.9'))  # used part of volume to start eviction
+RESIZES_LOW_WATERMARK = float(env('RESIZES_LOW_WATERMARK', '0.8'))  # used part of volume to stop eviction
+RESIZES_EVICTION_POLICY = env('RESIZES_EVICTION_POLICY', 'lru')  # lru or lfu
+RESIZE_ENGINE = env('RESIZE_ENGINE', 'pillow')  # pillow or vips (requires pyvips and libvips)
+DECODED_CACHE_BYTES = int(env('DECODED_CACHE_BYTES', str(256 * 1024 ** 2)))  # decoded originals in every process
+ANIMATION_MAX_FRAMES = int(env('ANIMATION_MAX_FRAMES', '500'))  # longer animations are resized to still images
+ANIMATION_MAX_PIXELS = int(env('ANIMATION_MAX_PIXELS', '200000000'))  # width * height * frames of an animation
+WEBHOOK_BATCH_SIZE = int(env('WEBHOOK_BATCH_SIZE', '100'))  # events per request to an endpoint
+WEBHOOK_MAX_ATTEMPTS = int(env('WEBHOOK_MAX_ATTEMPTS', '10'))  # failed attempts before an event becomes dead letter
+WEBHOOK_BACKOFF = float(env('WEBHOOK_BACKOFF', '5'))  # seconds before the first retry, doubled on every retry
+WEBHOOK_MAX_BACKOFF = float(env('WEBHOOK_MAX_BACKOFF', '3600'))  # max seconds between retries
+WEBHOOK_TIMEOUT = float(env('WEBHOOK_TIMEOUT', '10'))  # seconds of connection and response of an endpoint
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
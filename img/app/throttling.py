@@ -0,0 +1,51 @@
+import math
+import time
+
+from django.core.cache import cache
+
+
+class RateLimiter:
+    """Sliding window rate limiter.
+
+    Counters of the current and previous windows are kept in django cache, so the limit is shared by all processes
+    using the same cache (memcached or redis). Hits of the previous window are weighted by the part of it
+    which is still in the sliding window.
+    Zero limit turns the limiter off.
+    """
+
+    def __init__(self, prefix: str, limit: int, period: int) -> None:
+        """Init method, saves limit of hits per period (in seconds)."""
+        self.prefix = prefix
+        self.limit = limit
+        self.period = period
+
+    def hit(self, key: str, cost: int = 1) -> int:
+        """Count the hit, return zero if it's allowed or seconds to wait before retry otherwise.
+
+        Rejected hits are not counted.
+        """
+        if not self.limit:
+            return 0
+
+        now = time.time()
+        window = int(now // self.period)
+        current_key = f'{self.prefix}:{key}:{window}'
+        cache.add(current_key, 0, timeout=self.period * 2)
+        try:
+            current = cache.incr(current_key, cost)
+        except ValueError:  # expired between add and incr
+            cache.set(current_key, cost, timeout=self.period * 2)
+            current = cost
+        previous = cache.get(f'{self.prefix}:{key}:{window - 1}', 0)
+
+        elapsed = now / self.period - window  # part of current window which has passed
+        if previous * (1 - elapsed) + current <= self.limit:
+            return 0
+
+        cache.decr(current_key, cost)
+        current -= cost
+        if current + cost > self.limit:
+            wait = 1 - elapsed  # till the next window
+        else:
+            wait = 1 - (self.limit - current - cost) / previous - elapsed
+        return max(1, math.ceil(round(wait * self.period, 3)))
@@ -0,0 +1,82 @@
+"""Durations of request phases and state of caches for Server-Timing header.
+
+Phases are measured only inside of a request passed through ServerTimingMiddleware,
+otherwise timed() does nothing.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+_timings: ContextVar[Optional['Timings']] = ContextVar('timings', default=None)
+
+
+class Timings:
+    """Durations of phases of a request in milliseconds.
+
+    Durations of phases with the same name and description are summed up.
+    Metrics without duration have description only, the last one of the name is kept.
+    """
+
+    def __init__(self) -> None:
+        """Init method."""
+        self.durations: Dict[Tuple[str, str], float] = {}
+        self.descriptions: Dict[str, str] = {}
+
+    def add(self, name: str, duration: float, desc: str = '') -> None:
+        """Add duration of the phase."""
+        key = (name, desc)
+        self.durations[key] = self.durations.get(key, 0.0) + duration
+
+    def describe(self, name: str, desc: str) -> None:
+        """Set description of the metric without duration."""
+        self.descriptions[name] = desc
+
+    def header(self) -> str:
+        """Return value of Server-Timing header."""
+        metrics = []
+        for (name, desc), duration in self.durations.items():
+            desc_str = f';desc="{desc}"' if desc else ''
+            metrics.append(f'{name}{desc_str};dur={duration:.1f}')
+        metrics += [f'{name};desc="{desc}"' for name, desc in self.descriptions.items()]
+        return ', '.join(metrics)
+
+    def db_wrapper(self, execute: Callable, sql, params, many, context):
+        """Measure DB queries (for connection.execute_wrapper)."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add('db', (time.perf_counter() - started) * 1000)
+
+
+def activate(timings: Timings) -> Token:
+    """Start collecting timings of the current request."""
+    return _timings.set(timings)
+
+
+def deactivate(token: Token) -> None:
+    """Stop collecting timings of the current request."""
+    _timings.reset(token)
+
+
+@contextmanager
+def timed(name: str, desc: str = '') -> Iterator[None]:
+    """Measure duration of the phase of the current request."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - started) * 1000, desc)
+
+
+def describe(name: str, desc: str) -> None:
+    """Describe the metric of the current request without duration."""
+    timings = _timings.get()
+    if timings is not None:
+        timings.describe(name, desc)
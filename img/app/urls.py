@@ -17,7 +17,10 @@ from django.contrib import admin
 from django.urls import path
 
 from app.views import main_page_view
-from images.views import ImageCreateView, ImageResizeDeleteView
+from images.views import (
+    ExportView, ImageCreateView, ImageOriginalView, ImageResizeDeleteView, ResizeRegenerateView,
+    UploadSessionCreateView, UploadSessionView,
+)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -25,5 +28,10 @@ urlpatterns = [
     path('', main_page_view, name='home'),
 
     path('upload/', ImageCreateView.as_view(), name='upload'),
+    path('uploads/', UploadSessionCreateView.as_view(), name='upload-session'),
+    path('uploads/<uuid:session_id>', UploadSessionView.as_view(), name='upload-chunks'),
+    path('export/', ExportView.as_view(), name='export'),
     path('<str:filename>', ImageResizeDeleteView.as_view(), name='resize-n-delete'),
+    path('<str:filename>/original', ImageOriginalView.as_view(), name='original'),
+    path('<str:username>/<str:size>/<str:filename>', ResizeRegenerateView.as_view(), name='regenerate'),
 ]
@@ -1,9 +1,16 @@
-from typing import Optional
+from typing import Optional, Tuple
 
 from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db.models import Q, QuerySet
+from django.http import HttpRequest
+from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 
-from images.models import Image
+from app.changelists import EstimatedCountPaginator, PeriodsQuerySet
+from images.models import ColdOriginal, Image, PresetBackfill, ResizePreset, UploadSession
+
+MIN_SEARCH_LENGTH = 3  # trigram index doesn't help with shorter terms
 
 
 class SizesMixin:
@@ -22,6 +29,19 @@ class SizesMixin:
         return mark_safe('<br />'.join(lst))
 
 
+class ColorMixin:
+    """Mixin for dominant color of images."""
+
+    def color(self, obj: Optional[Image]) -> str:
+        """Return sample of dominant color of the image."""
+        if not obj or not obj.dominant_color:
+            return '-'
+        return format_html(
+            '<span style="display:inline-block;width:1em;height:1em;background:{0}"></span> {0}',
+            obj.dominant_color,
+        )
+
+
 class ReadOnlyMixin:
     """Makes model read only."""
 
@@ -39,11 +59,41 @@ class ReadOnlyMixin:
 
 
 @admin.register(Image)
-class ImageAdmin(ReadOnlyMixin, SizesMixin, admin.ModelAdmin):
-    """Images admin."""
-
-    list_display = ('filename', 'original_filename', 'user', 'upload_date', 'filesize', 'sizes')
-    readonly_fields = ('filename', 'original_filename', 'user', 'upload_date', 'filesize', 'sizes')
+class ImageAdmin(ReadOnlyMixin, SizesMixin, ColorMixin, admin.ModelAdmin):
+    """Images admin.
+
+    Search, date hierarchy and count of results are served by indexes, so they are fast on big tables.
+    """
+
+    list_display = ('filename', 'original_filename', 'user', 'upload_date', 'filesize', 'color', 'sizes')
+    readonly_fields = (
+        'filename', 'original_filename', 'user', 'upload_date', 'filesize', 'placeholder', 'color', 'sizes',
+    )
+    search_fields = ('filename', 'original_filename', '=user__username')
+    search_help_text = f'Part of filename or original filename ({MIN_SEARCH_LENGTH} characters at least) or username'
+    date_hierarchy = 'upload_date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request: HttpRequest) -> QuerySet:
+        """Return queryset listing periods of date hierarchy without scan of images."""
+        queryset = super().get_queryset(request)
+        return PeriodsQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+
+    def get_search_results(self, request: HttpRequest, queryset: QuerySet, search_term: str) -> Tuple[QuerySet, bool]:
+        """Search by trigram indexes of filenames and by ids of users with the username.
+
+        Users are found by a separate query, so the condition uses indexes of images only.
+        Trigram index can't find shorter parts of filenames, so they are not searched.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        user_ids = list(User.objects.filter(username__iexact=term).values_list('pk', flat=True))
+        condition = Q(user_id__in=user_ids)
+        if len(term) >= MIN_SEARCH_LENGTH:
+            condition |= Q(filename__icontains=term) | Q(original_filename__icontains=term)
+        return queryset.filter(condition), False
 
 
 class ImageInline(ReadOnlyMixin, SizesMixin, admin.TabularInline):
@@ -52,3 +102,42 @@ class ImageInline(ReadOnlyMixin, SizesMixin, admin.TabularInline):
     readonly_fields = ('filename', 'original_filename', 'upload_date', 'filesize', 'sizes')
     model = Image
     extra = 0
+
+
+class PresetBackfillInline(ReadOnlyMixin, admin.TabularInline):
+    """Inline with backfills of the preset."""
+
+    readonly_fields = ('size', 'status', 'progress', 'failed', 'created_at', 'finished_at')
+    fields = readonly_fields
+    model = PresetBackfill
+    extra = 0
+
+
+@admin.register(ResizePreset)
+class ResizePresetAdmin(admin.ModelAdmin):
+    """Resize presets admin."""
+
+    list_display = ('name', 'user', 'sizes', 'auto_apply', 'backfill')
+    list_filter = ('auto_apply',)
+    inlines = (PresetBackfillInline,)
+
+    def backfill(self, obj: ResizePreset) -> str:
+        """Return progress of the latest unfinished backfill."""
+        backfill = obj.backfills.exclude(status=PresetBackfill.DONE).first()
+        return backfill.progress if backfill else '-'
+
+
+@admin.register(UploadSession)
+class UploadSessionAdmin(ReadOnlyMixin, admin.ModelAdmin):
+    """Unfinished resumable uploads admin."""
+
+    list_display = ('key', 'user', 'original_filename', 'progress', 'created_at', 'expires_at')
+
+
+@admin.register(ColdOriginal)
+class ColdOriginalAdmin(ReadOnlyMixin, admin.ModelAdmin):
+    """Originals in the cold tier admin."""
+
+    list_display = ('image', 'codec', 'size', 'stored_size', 'saved_bytes', 'moved_at')
+    list_filter = ('codec',)
+    list_select_related = ('image', 'image__user')
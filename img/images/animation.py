@@ -0,0 +1,150 @@
+"""Resizing of animated GIF and WebP images frame by frame.
+
+Frames are decoded, resized and encoded one by one, so only one frame is kept in memory
+instead of the whole animation.
+"""
+import math
+import os
+from contextlib import suppress
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Optional, Tuple
+
+from PIL import GifImagePlugin, Image as PillowImage
+from django.conf import settings
+
+from app.helpers import Size
+
+ANIMATED_FORMATS = ('GIF', 'WEBP')
+
+
+class Frame(NamedTuple):
+    """Resized frame of an animation."""
+
+    image: PillowImage.Image
+    duration: int
+    disposal: int
+    transparency: Optional[int]
+
+
+def is_animated(img: PillowImage.Image) -> bool:
+    """Check if image is an animation, which is resized frame by frame."""
+    return img.format in ANIMATED_FORMATS and getattr(img, 'is_animated', False)
+
+
+def within_limits(img: PillowImage.Image) -> bool:
+    """Check if count of frames and pixels of the animation don't exceed limits from settings."""
+    frames = img.n_frames
+    pixels = frames * img.width * img.height
+    return frames <= settings.ANIMATION_MAX_FRAMES and pixels <= settings.ANIMATION_MAX_PIXELS
+
+
+def fit_size(source: Tuple[int, int], size: Size) -> Tuple[int, int]:
+    """Return size of the resize, keeping aspect ratio the same way as PIL.Image.thumbnail does."""
+    width, height = source
+    x, y = size.as_tuple()  # noqa: VNE001
+    if x >= width and y >= height:
+        return source
+
+    def round_aspect(number: float, key) -> int:
+        return max(min(math.floor(number), math.ceil(number), key=key), 1)
+
+    aspect = width / height
+    if x / y >= aspect:
+        x = round_aspect(y * aspect, key=lambda n: abs(aspect - n / y))  # noqa: VNE001
+    else:
+        y = round_aspect(x / aspect, key=lambda n: 0 if n == 0 else abs(aspect - x / n))  # noqa: VNE001
+    return x, y
+
+
+def iter_frames(img: PillowImage.Image, size: Size) -> Iterator[Frame]:
+    """Yield resized frames of the animation one by one.
+
+    Frames in palette mode are resized with nearest neighbour (as PIL does), so they keep their palettes.
+    """
+    target = fit_size(img.size, size)
+    for index in range(img.n_frames):
+        img.seek(index)
+        yield Frame(
+            image=img.resize(target, PillowImage.BICUBIC, reducing_gap=2.0),
+            duration=img.info.get('duration', 0),
+            disposal=getattr(img, 'disposal_method', 0),
+            transparency=img.info.get('transparency'),
+        )
+
+
+def write_gif(img: PillowImage.Image, size: Size, destination: BinaryIO) -> None:
+    """Write resized animated GIF.
+
+    Palette of the first frame becomes the global one, it is reused by the next frames with the same palette,
+    other frames are written with their own palettes.
+    """
+    palette = None
+    for frame in iter_frames(img, size):
+        image = frame.image if frame.image.mode == 'P' else frame.image.convert('P', palette=PillowImage.ADAPTIVE)
+        params = {'duration': frame.duration, 'disposal': frame.disposal}
+        if frame.transparency is not None:
+            params['transparency'] = frame.transparency
+
+        if palette is None:
+            info = {'background': img.info.get('background', 0), 'duration': frame.duration}
+            if 'loop' in img.info:
+                info['loop'] = params['loop'] = img.info['loop']
+            header, _ = GifImagePlugin.getheader(image, info=info)
+            destination.write(b''.join(header))
+            palette = image.getpalette()
+        elif image.getpalette() != palette:
+            params['include_color_table'] = True
+
+        for data in GifImagePlugin.getdata(image, **params):
+            destination.write(data)
+    destination.write(b';')
+
+
+def write_webp(img: PillowImage.Image, size: Size, destination: BinaryIO) -> None:
+    """Write resized animated WebP.
+
+    Encoder gets frames one by one and keeps only encoded ones.
+    """
+    # PIL has no public API to encode an animation from a stream of frames: save_all makes a list of append_images
+    from PIL import _webp  # type: ignore
+
+    red, green, blue, alpha = img.info.get('background', (0, 0, 0, 0))
+    width, height = fit_size(img.size, size)
+    encoder = _webp.WebPAnimEncoder(
+        width,
+        height,
+        (alpha << 24) | (red << 16) | (green << 8) | blue,
+        img.info.get('loop', 0),
+        False,  # minimize_size
+        3,  # kmin
+        5,  # kmax
+        False,  # allow_mixed
+        False,  # verbose
+    )
+
+    timestamp = 0
+    for frame in iter_frames(img, size):
+        image = frame.image if frame.image.mode == 'RGBA' else frame.image.convert('RGBA')
+        encoder.add(image.tobytes('raw', 'RGBA'), timestamp, width, height, 'RGBA', False, 80, 0)
+        timestamp += frame.duration
+    encoder.add(None, timestamp, 0, 0, '', False, 80, 0)
+
+    data = encoder.assemble(img.info.get('icc_profile') or '', '', '')
+    if data is None:
+        raise OSError('Cannot write file as WebP')
+    destination.write(data)
+
+
+def save_animation(img: PillowImage.Image, size: Size, path: Path) -> None:
+    """Save resized animation to the file, partially written file is removed on error."""
+    write = write_gif if img.format == 'GIF' else write_webp
+    position = img.tell()
+    try:
+        with open(path, 'wb') as destination:
+            write(img, size, destination)
+    except Exception:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+        raise
+    finally:
+        img.seek(position)
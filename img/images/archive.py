@@ -0,0 +1,205 @@
+"""Tar archives of the user's originals with manifest of images.
+
+Archive contains manifest.jsonl (JSON line per image) followed by originals/<filename> in the same order.
+Memory doesn't depend on count of images: manifest is spooled to a temporary file,
+files are streamed by blocks or copied in kernel. Originals in the cold tier are exported decompressed.
+"""
+import json
+import os
+import tarfile
+import time
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, IO, Iterator, NamedTuple, Union
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+from images.models import Image
+from images.storage import copy_range
+from images.tiering import PLAIN, find_cold, open_compressed
+
+MANIFEST = 'manifest.jsonl'
+ORIGINALS = 'originals'
+
+
+class Segment(NamedTuple):
+    """Content of a file in the archive, padded by zeros if the file became shorter.
+
+    File is compressed by the codec if it's in the cold tier.
+    """
+
+    path: Path
+    size: int
+    codec: str = PLAIN
+
+
+Part = Union[bytes, Segment]
+
+
+def member_header(name: str, size: int, mtime: float) -> bytes:
+    """Return tar header of a file."""
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    return info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+
+
+def padding(size: int) -> bytes:
+    """Return zeros completing the last block of a file."""
+    return b'\0' * (-size % tarfile.BLOCKSIZE)
+
+
+def write_manifest(user: settings.AUTH_USER_MODEL, out: IO[bytes], chunk_size: int = 1000) -> int:
+    """Write manifest of the user's images with sizes of their originals, return count of images."""
+    cnt = 0
+    originals_path = Path(settings.ORIGINALS_DIR) / str(user)
+    images = Image.objects.filter(user=user).select_related('cold_original').order_by('pk')
+    for image in images.iterator(chunk_size=chunk_size):
+        try:
+            stat = os.stat(originals_path / image.filename)
+            size = stat.st_size
+        except FileNotFoundError:
+            cold = find_cold(str(user), image.filename)
+            if not cold or not hasattr(image, 'cold_original'):
+                continue
+            stat, size = os.stat(cold[0]), image.cold_original.size
+        row = {
+            'filename': image.filename,
+            'original_filename': image.original_filename,
+            'upload_date': image.upload_date.isoformat(),
+            'placeholder': image.placeholder,
+            'dominant_color': image.dominant_color,
+            'size': size,
+            'mtime': stat.st_mtime,
+        }
+        out.write(json.dumps(row).encode() + b'\n')
+        cnt += 1
+    return cnt
+
+
+def iter_archive(user: settings.AUTH_USER_MODEL) -> Iterator[Part]:
+    """Yield parts of the archive: bytes of headers and manifest, segments of originals."""
+    originals_path = Path(settings.ORIGINALS_DIR) / str(user)
+    with SpooledTemporaryFile(max_size=1024 * 1024) as manifest:
+        write_manifest(user, manifest)
+        size = manifest.tell()
+        manifest.seek(0)
+        yield member_header(MANIFEST, size, time.time())
+        while block := manifest.read(64 * 1024):
+            yield block
+        yield padding(size)
+
+        manifest.seek(0)
+        for line in manifest:
+            row = json.loads(line)
+            yield member_header(f'{ORIGINALS}/{row["filename"]}', row['size'], row['mtime'])
+            path, codec = originals_path / row['filename'], PLAIN
+            if not path.exists() and (cold := find_cold(str(user), row['filename'])):
+                path, codec = cold
+            yield Segment(path, row['size'], codec)
+            yield padding(row['size'])
+    yield b'\0' * tarfile.BLOCKSIZE * 2
+
+
+def iter_bytes(parts: Iterator[Part], block_size: int = 256 * 1024) -> Iterator[bytes]:
+    """Yield the archive by blocks (for HTTP responses)."""
+    for part in parts:
+        if isinstance(part, bytes):
+            yield part
+            continue
+        sent = 0
+        try:
+            with open_compressed(part.path, part.codec, 'rb') as opened_file:
+                while sent < part.size:
+                    block = opened_file.read(min(block_size, part.size - sent))
+                    if not block:
+                        break
+                    sent += len(block)
+                    yield block
+        except FileNotFoundError:
+            pass
+        if sent < part.size:
+            yield b'\0' * (part.size - sent)
+
+
+def write_archive(parts: Iterator[Part], out: BinaryIO) -> int:
+    """Write the archive to the file, originals are copied in kernel where possible, return count of files."""
+    cnt = 0
+    for part in parts:
+        if isinstance(part, bytes):
+            out.write(part)
+            continue
+        out.flush()
+        copied = 0
+        try:
+            with open_compressed(part.path, part.codec, 'rb') as opened_file:
+                if part.codec == PLAIN:
+                    copied = copy_range(opened_file.fileno(), out.fileno(), 0, part.size)
+                else:
+                    while copied < part.size and (block := opened_file.read(min(1024 * 1024, part.size - copied))):
+                        out.write(block)
+                        copied += len(block)
+        except FileNotFoundError:
+            pass
+        out.write(b'\0' * (part.size - copied))
+        cnt += 1
+    out.flush()
+    return cnt
+
+
+def read_archive(archive: tarfile.TarFile) -> Iterator[Dict]:
+    """Yield rows of manifest with members of their originals, rows without originals are skipped.
+
+    Originals follow manifest in the same order, so the archive is read in one pass.
+    """
+    member = archive.next()
+    if member is None or member.name != MANIFEST:
+        raise ValueError(f'Archive should start with {MANIFEST}')
+    with SpooledTemporaryFile(max_size=1024 * 1024) as manifest:
+        with archive.extractfile(member) as src:  # type: ignore
+            while block := src.read(64 * 1024):
+                manifest.write(block)
+        manifest.seek(0)
+
+        rows = (json.loads(line) for line in manifest)
+        row = next(rows, None)
+        while (member := archive.next()) is not None:
+            archive.members.clear()  # type: ignore  # tarfile keeps all read members, they are not needed
+            if not member.isfile() or not member.name.startswith(f'{ORIGINALS}/'):
+                continue
+            filename = member.name[len(ORIGINALS) + 1:]
+            if '/' in filename or filename.startswith('.'):
+                continue
+            while row is not None and row['filename'] != filename:
+                row = next(rows, None)
+            if row is None:
+                return
+            yield {**row, 'member': member}
+
+
+def restore_image(archive: tarfile.TarFile, row: Dict, user: settings.AUTH_USER_MODEL, source_fd: int) -> Image:
+    """Place original of the manifest row to originals of the user, return unsaved image.
+
+    If the archive is an uncompressed file (source_fd isn't -1), data is copied in kernel by offset of the member.
+    """
+    image = Image(
+        user=user,
+        filename=row['filename'],
+        original_filename=row['original_filename'],
+        upload_date=parse_datetime(row['upload_date']),
+        placeholder=row['placeholder'],
+        dominant_color=row['dominant_color'],
+    )
+    member = row['member']
+    path = image.original_path
+    with open(path, 'wb') as dst:
+        if source_fd != -1:
+            copy_range(source_fd, dst.fileno(), member.offset_data, member.size)
+        else:
+            with archive.extractfile(member) as src:  # type: ignore
+                while block := src.read(1024 * 1024):
+                    dst.write(block)
+    os.utime(path, (row['mtime'], row['mtime']))
+    return image
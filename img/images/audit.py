@@ -0,0 +1,232 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import Executor
+from itertools import groupby
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from PIL import Image as PillowImage
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from images.models import Image
+from images.tiering import find_cold, strip_suffix
+
+ORPHAN_ORIGINAL = 'orphan_original'
+MISSING_ORIGINAL = 'missing_original'
+ORPHAN_RESIZE = 'orphan_resize'
+EMPTY_RESIZE = 'empty_resize'
+CORRUPT_RESIZE = 'corrupt_resize'
+ISSUES = (ORPHAN_ORIGINAL, MISSING_ORIGINAL, ORPHAN_RESIZE, EMPTY_RESIZE, CORRUPT_RESIZE)
+
+
+class FileEntry(NamedTuple):
+    """File found in storage."""
+
+    name: str
+    size: int
+    mtime: float
+    corrupt: bool
+
+
+class UserFiles(NamedTuple):
+    """All files of the user, each list is sorted by name."""
+
+    username: str
+    originals: List[FileEntry]
+    resizes: Dict[str, List[FileEntry]]
+
+
+class Issue(NamedTuple):
+    """Inconsistency between storage and DB."""
+
+    kind: str
+    username: str
+    filename: str
+    path: Path
+
+
+def is_corrupt(path: str) -> bool:
+    """Check that image file can't be identified."""
+    try:
+        with PillowImage.open(path) as img:
+            img.verify()
+    except Exception:
+        return True
+    return False
+
+
+def list_dir(path: Path, verify: bool = False) -> Tuple[List[str], List[FileEntry]]:
+    """Return sorted names of subdirectories and sorted files of the directory.
+
+    Hidden entries (staging files of uploads) are skipped.
+    """
+    dirs, files = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    dirs.append(entry.name)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    corrupt = verify and stat.st_size > 0 and is_corrupt(entry.path)
+                    files.append(FileEntry(entry.name, stat.st_size, stat.st_mtime, corrupt))
+    except FileNotFoundError:
+        pass
+    return sorted(dirs), sorted(files)
+
+
+def scan_user(username: str, verify: bool = False) -> UserFiles:
+    """Scan originals and resizes of the user.
+
+    Originals in the cold tier are listed by their filenames along with ones in ORIGINALS_DIR.
+    """
+    _, originals = list_dir(Path(settings.ORIGINALS_DIR) / username)
+    if settings.COLD_ORIGINALS_DIR:
+        names = {entry.name for entry in originals}
+        _, cold = list_dir(Path(settings.COLD_ORIGINALS_DIR) / username)
+        cold = [entry._replace(name=strip_suffix(entry.name)) for entry in cold]
+        originals = sorted(originals + [entry for entry in cold if entry.name not in names])
+    resizes_path = Path(settings.RESIZES_DIR) / username
+    sizes, _ = list_dir(resizes_path)
+    resizes = {size: list_dir(resizes_path / size, verify)[1] for size in sizes}
+    return UserFiles(username, originals, resizes)
+
+
+def iter_user_files(
+    usernames: Iterable[str], executor: Executor, verify: bool = False, prefetch: int = 16,
+) -> Iterator[UserFiles]:
+    """Scan users in the pool, yield results in the order of usernames.
+
+    Only `prefetch` users are scanned ahead, so memory is bounded.
+    """
+    futures: Deque = deque()
+    for username in usernames:
+        futures.append(executor.submit(scan_user, username, verify))
+        if len(futures) >= prefetch:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def binary(field: str):
+    """Return expression ordering strings by code points (as python does)."""
+    if connection.vendor == 'postgresql':
+        return Collate(F(field), 'C')
+    return F(field)
+
+
+def iter_rows(chunk_size: int = 2000, after_username: str = '') -> Iterator[Tuple[str, Iterator[str]]]:
+    """Yield usernames (after the given one) and iterators of sorted filenames of their images.
+
+    Tombstones are included: their files are removed by reaper.
+    """
+    rows = Image.all_objects.alias(username=binary('user__username')).filter(
+        username__gt=after_username,
+    ).order_by('username', binary('filename')).values_list('user__username', 'filename').iterator(
+        chunk_size=chunk_size,
+    )
+    for username, group in groupby(rows, key=lambda row: row[0]):
+        yield username, (row[1] for row in group)
+
+
+def list_usernames(after_username: str = '') -> List[str]:
+    """Return sorted usernames (after the given one) which have directories in storage."""
+    paths = [settings.ORIGINALS_DIR, settings.RESIZES_DIR, settings.COLD_ORIGINALS_DIR]
+    return sorted({
+        username for path in paths if path for username in list_dir(Path(path))[0] if username > after_username
+    })
+
+
+class Auditor:
+    """Finds inconsistencies between storage and DB by merge join of sorted files and rows.
+
+    Files modified less than `min_age` seconds ago are not reported as orphans:
+    they may belong to uploads in progress. Users up to `after_username` are skipped,
+    `user_done` is called with username when all issues of the user are yielded.
+    """
+
+    def __init__(
+        self, executor: Executor, verify: bool = False, min_age: int = 3600, chunk_size: int = 2000,
+        after_username: str = '', user_done: Optional[Callable[[str], None]] = None,
+    ) -> None:
+        """Init method."""
+        self.executor = executor
+        self.verify = verify
+        self.min_age = min_age
+        self.chunk_size = chunk_size
+        self.after_username = after_username
+        self.user_done = user_done or (lambda username: None)
+        self.files = 0
+        self.rows = 0
+
+    @staticmethod
+    def orphan(username: str, size: Optional[str], entry: FileEntry, threshold: float) -> Iterator[Issue]:
+        """Yield issue for the file without DB row."""
+        if entry.mtime > threshold:
+            return
+        if size is None:
+            path = Path(settings.ORIGINALS_DIR) / username / entry.name
+            cold = None if path.exists() else find_cold(username, entry.name)
+            yield Issue(ORPHAN_ORIGINAL, username, entry.name, cold[0] if cold else path)
+        else:
+            yield Issue(ORPHAN_RESIZE, username, entry.name, Path(settings.RESIZES_DIR) / username / size / entry.name)
+
+    def issues(self) -> Iterator[Issue]:
+        """Yield all issues of all users.
+
+        Users from storage and from DB are merged in the order of usernames.
+        """
+        threshold = time.time() - self.min_age
+        rows = iter_rows(self.chunk_size, self.after_username)
+        files = iter_user_files(list_usernames(self.after_username), self.executor, self.verify)
+        row = next(rows, None)
+        user_files = next(files, None)
+        while row or user_files:
+            if row and (not user_files or row[0] < user_files.username):
+                yield from self.audit_user(UserFiles(row[0], [], {}), row[1], threshold)
+                self.user_done(row[0])
+                row = next(rows, None)
+            elif user_files and (not row or user_files.username < row[0]):
+                yield from self.audit_user(user_files, iter(()), threshold)
+                self.user_done(user_files.username)
+                user_files = next(files, None)
+            elif row and user_files:
+                yield from self.audit_user(user_files, row[1], threshold)
+                self.user_done(row[0])
+                row = next(rows, None)
+                user_files = next(files, None)
+
+    def audit_user(self, user_files: UserFiles, filenames: Iterator[str], threshold: float) -> Iterator[Issue]:
+        """Yield issues of the user."""
+        username = user_files.username
+        originals_path = Path(settings.ORIGINALS_DIR) / username
+        resizes_path = Path(settings.RESIZES_DIR) / username
+        lists: List[Tuple[Optional[str], List[FileEntry]]] = [(None, user_files.originals)]
+        lists += list(user_files.resizes.items())
+        positions = [0] * len(lists)
+        self.files += sum(len(entries) for _, entries in lists)
+
+        for filename in filenames:
+            self.rows += 1
+            for i, (size, entries) in enumerate(lists):
+                pos = positions[i]
+                while pos < len(entries) and entries[pos].name < filename:
+                    yield from self.orphan(username, size, entries[pos], threshold)
+                    pos += 1
+                found = pos < len(entries) and entries[pos].name == filename
+                if size is None and not found:
+                    yield Issue(MISSING_ORIGINAL, username, filename, originals_path / filename)
+                elif found and size is not None and (entries[pos].size == 0 or entries[pos].corrupt):
+                    kind = EMPTY_RESIZE if entries[pos].size == 0 else CORRUPT_RESIZE
+                    yield Issue(kind, username, filename, resizes_path / size / filename)
+                positions[i] = pos + 1 if found else pos
+
+        for i, (size, entries) in enumerate(lists):
+            for entry in entries[positions[i]:]:
+                yield from self.orphan(username, size, entry, threshold)
@@ -0,0 +1,127 @@
+"""In-process cache of decoded originals.
+
+Clients often request several sizes of the same image one by one, so the original decoded for the first resize
+is kept in memory for the next ones. Cache is bounded by DECODED_CACHE_BYTES, the least recently used originals
+are evicted. Key contains mtime of the file, so a replaced original is never served from the cache.
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image as PillowImage
+from django.conf import settings
+
+Key = Tuple[str, int]
+
+# bytes per pixel of modes which are not 8 bit per band
+MODE_BYTES = {'1': 1, 'I': 4, 'F': 4, 'I;16': 2, 'I;16B': 2, 'I;16L': 2}
+
+
+def image_bytes(image: PillowImage.Image) -> int:
+    """Return approximate memory used by pixels of the decoded image."""
+    return image.width * image.height * MODE_BYTES.get(image.mode, len(image.getbands()))
+
+
+class DecodedCache:
+    """LRU cache of decoded originals bounded by bytes, safe for threads.
+
+    Images bigger than a half of the budget are not cached, they would evict everything else.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        """Init method, budget is taken from settings by default."""
+        self._max_bytes = max_bytes
+        self.entries: 'OrderedDict[Key, Tuple[PillowImage.Image, int]]' = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    @property
+    def max_bytes(self) -> int:
+        """Return budget in bytes, zero if the cache is off."""
+        return settings.DECODED_CACHE_BYTES if self._max_bytes is None else self._max_bytes
+
+    @staticmethod
+    def key(path: Path) -> Optional[Key]:
+        """Return key of the original, None if there is no file."""
+        try:
+            return str(path), os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def accepts(self, image: PillowImage.Image) -> bool:
+        """Check if the image fits into the cache."""
+        return 0 < image_bytes(image) <= self.max_bytes // 2
+
+    def get(self, path: Path) -> Optional[PillowImage.Image]:
+        """Return decoded original, None if it isn't cached. Returned image shouldn't be changed."""
+        if not self.max_bytes:
+            return None
+        key = self.key(path)
+        if key is None:
+            return None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, path: Path, image: PillowImage.Image) -> None:
+        """Cache the decoded original, the least recently used ones are evicted to fit into the budget."""
+        key = self.key(path)
+        if key is None or not self.accepts(image):
+            return
+        size = image_bytes(image)
+        with self.lock:
+            self._remove(str(path))
+            self.entries[key] = (image, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, path: Path) -> None:
+        """Remove the original from the cache."""
+        with self.lock:
+            self._remove(str(path))
+
+    def clear(self) -> None:
+        """Remove all originals and reset counters."""
+        with self.lock:
+            self.entries.clear()
+            self.size = self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters of the cache."""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'images': len(self.entries),
+                'bytes': self.size,
+            }
+
+    def summary(self) -> str:
+        """Return counters of the cache as text."""
+        stats = self.stats()
+        return (
+            f'hits {stats["hits"]}, misses {stats["misses"]}, evictions {stats["evictions"]}, '
+            f'{stats["images"]} images, {stats["bytes"] / 1024 ** 2:.1f} of {self.max_bytes / 1024 ** 2:.0f} Mb'
+        )
+
+    def _remove(self, path: str) -> None:
+        """Remove all versions of the original, lock should be held."""
+        for key in [key for key in self.entries if key[0] == path]:
+            self.size -= self.entries.pop(key)[1]
+
+
+decoded_originals = DecodedCache()
@@ -1,19 +1,30 @@
 from typing import Callable
+from uuid import UUID
 
+from django.conf import settings
 from django.core.handlers.wsgi import WSGIRequest
 from django.http import HttpResponse
+from django.utils import timezone
 from django.views.generic import View
 
+from app.db import has_written, is_user_pinned, pin_primary, pin_user, uses_replicas
 from app.helpers import Response
-from images.models import Image
+from app.throttling import RateLimiter
+from app.timing import timed
+from images.models import Image, UploadSession
 from tokens.models import Token
 
 
+rate_limiter = RateLimiter('rate', settings.RATE_LIMIT_REQUESTS, settings.RATE_LIMIT_PERIOD)
+
+
 def token_protected_method(func: Callable):
-    """Check token.
+    """Check token and rate limit of the user.
 
     Enriches request with user variable if one was found.
     If not, returns 403 (if token not passed) or 404 (if user not found by the token).
+    Returns 429 if the user sent too many requests.
+    User which wrote something is pinned to the primary database for a while, so it reads its own writes.
     """
     def wrapper(
             self: View, request: WSGIRequest, *args, **kwargs
@@ -23,33 +34,65 @@ def token_protected_method(func: Callable):
         if not token_str:
             return Response.json(Response.INVALID_REQUEST, 'Forbidden', 403)
 
-        token = Token.objects.filter(token=token_str).first()
+        with timed('auth'):
+            token = Token.objects.filter(token=token_str).first()
         if not token:
             return Response.json(
                 Response.INVALID_REQUEST, 'User not found', 404)
 
+        with timed('throttle'):
+            retry_after = rate_limiter.hit(str(token.user_id))
+        if retry_after:
+            return Response.json(
+                Response.INVALID_REQUEST, 'Too many requests', 429, headers={'Retry-After': str(retry_after)})
+
         request.user = token.user
+        if uses_replicas() and is_user_pinned(token.user_id):
+            pin_primary()
 
-        return func(self, request, *args, **kwargs)
+        response = func(self, request, *args, **kwargs)
+        if has_written():
+            pin_user(token.user_id)
+        return response
 
     return wrapper
 
 
 def image_method(func: Callable):
-    """Enriches request with image variable."""
+    """Enriches request with image variable, images and their absence are cached."""
     def wrapper(
             self: View, request: WSGIRequest, filename: str, *args, **kwargs
     ) -> HttpResponse:
         """Wrap."""
-        image: Image = Image.objects.filter(
-            user=request.user, filename=filename).first()
+        image = Image.lookup(request.user, filename)
 
         if not image:
             return Response.json(
                 Response.INVALID_REQUEST, 'Image not found', 404)
 
+        image.user = request.user
         request.image = image
 
         return func(self, request, filename, *args, **kwargs)
 
     return wrapper
+
+
+def upload_session_method(func: Callable):
+    """Enriches request with upload_session variable, expired sessions are not found."""
+    def wrapper(
+            self: View, request: WSGIRequest, session_id: UUID, *args, **kwargs
+    ) -> HttpResponse:
+        """Wrap."""
+        upload_session: UploadSession = UploadSession.objects.filter(
+            user=request.user, key=session_id, expires_at__gt=timezone.now()).first()
+
+        if not upload_session:
+            return Response.json(
+                Response.INVALID_REQUEST, 'Upload session not found', 404)
+
+        request.upload_session = upload_session
+
+        return func(self, request, session_id, *args, **kwargs)
+
+    return wrapper
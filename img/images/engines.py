@@ -0,0 +1,138 @@
+"""Engines creating resized images, engine of the deployment is selected by RESIZE_ENGINE setting."""
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Optional, Type
+
+from PIL import Image as PillowImage
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from app.helpers import Size
+from app.timing import describe, timed
+from images.animation import is_animated, save_animation, within_limits
+from images.decoded import decoded_originals
+
+
+class ResizeEngine:
+    """Base class of resize engines."""
+
+    name = ''
+
+    def resize(
+        self, source: Path, size: Size, destination: Path, image: Optional[PillowImage.Image] = None,
+        keep_decoded: bool = False,
+    ) -> None:
+        """Write resize of the source file to the destination, format is chosen by extension of the destination.
+
+        Image is the source opened by Pillow if it's already opened (while uploading),
+        engine may use it instead of the file. Keep_decoded is set if other sizes of the source follow,
+        engine may keep the decoded source for them.
+        """
+        raise NotImplementedError()
+
+
+class PillowEngine(ResizeEngine):
+    """Engine based on Pillow, decodes the whole source into memory.
+
+    Decoded sources are kept in the cache of decoded originals if other sizes follow.
+    """
+
+    name = 'pillow'
+
+    def resize(
+        self, source: Path, size: Size, destination: Path, image: Optional[PillowImage.Image] = None,
+        keep_decoded: bool = False,
+    ) -> None:
+        """Write resize of the source file to the destination."""
+        hit = False
+        if image is None:
+            image = decoded_originals.get(source)
+            hit = image is not None
+        opened = image is None
+        if image is None:
+            image = PillowImage.open(source)
+        if is_animated(image) and within_limits(image):
+            with timed('animation', str(size)):
+                save_animation(image, size, destination)
+            return
+
+        # too long animations are resized to still images of the first frame
+        cached = opened and keep_decoded and not is_animated(image) and decoded_originals.accepts(image)
+        if opened and not cached:
+            # not decoded yet, so thumbnail decodes JPEG already reduced
+            with timed('resize', str(size)):
+                img = image
+                img.thumbnail(size.as_tuple())
+        else:
+            with timed('decode', 'cached' if hit else ''):
+                image.load()
+            if cached:
+                decoded_originals.put(source, image)
+            with timed('resize', str(size)):
+                img = image.copy()
+                img.thumbnail(size.as_tuple())
+        with timed('encode', str(size)):
+            img.save(str(destination), image.format)
+        if decoded_originals.max_bytes:
+            describe('decoded-cache', decoded_originals.summary())
+
+
+class VipsEngine(ResizeEngine):
+    """Engine based on libvips (pyvips).
+
+    Source is decoded on demand with shrink-on-load (JPEG, WebP, pyramidal TIFF),
+    so big originals are resized faster and with less memory.
+    Animations and formats which libvips doesn't write are resized by Pillow.
+    """
+
+    name = 'vips'
+    formats = ('.jpeg', '.jpg', '.png', '.webp', '.tiff', '.tif')
+
+    def __init__(self) -> None:
+        """Init method, checks that pyvips is installed."""
+        try:
+            import pyvips  # type: ignore
+        except (ImportError, OSError) as e:
+            raise ImproperlyConfigured(f'Resize engine "vips" requires pyvips and libvips: {e}')
+        self.pyvips = pyvips
+        # metadata is not copied, the same as Pillow does
+        self.save_options = {'keep': 0} if pyvips.at_least_libvips(8, 15) else {'strip': True}
+        self.fallback = PillowEngine()
+
+    def resize(
+        self, source: Path, size: Size, destination: Path, image: Optional[PillowImage.Image] = None,
+        keep_decoded: bool = False,
+    ) -> None:
+        """Write resize of the source file to the destination, libvips doesn't decode the whole source."""
+        if image is None and destination.suffix.lower() == '.webp':
+            image = PillowImage.open(source)  # frames are not decoded, it's needed to find out if it's animated
+        if destination.suffix.lower() not in self.formats or (image is not None and is_animated(image)):
+            self.fallback.resize(source, size, destination, image, keep_decoded)
+            return
+
+        try:
+            with timed('resize', str(size)):
+                # EXIF orientation is ignored, the same as Pillow does
+                thumbnail = self.pyvips.Image.thumbnail(
+                    str(source), size.width, height=size.height, size='down', no_rotate=True,
+                )
+            with timed('encode', str(size)):
+                thumbnail.write_to_file(str(destination), **self.save_options)
+        except self.pyvips.Error as e:
+            raise OSError(str(e)) from e
+
+
+ENGINES: Dict[str, Type[ResizeEngine]] = {engine.name: engine for engine in (PillowEngine, VipsEngine)}
+
+
+@lru_cache(maxsize=None)
+def _create_engine(name: str) -> ResizeEngine:
+    """Create engine once per process."""
+    if name not in ENGINES:
+        raise ImproperlyConfigured(f'Unknown resize engine "{name}", use one of: {", ".join(ENGINES)}')
+    return ENGINES[name]()
+
+
+def get_engine(name: Optional[str] = None) -> ResizeEngine:
+    """Return resize engine by name, engine from settings by default."""
+    return _create_engine(name or settings.RESIZE_ENGINE)
@@ -0,0 +1,206 @@
+import heapq
+import os
+import re
+import shutil
+from collections import defaultdict
+from concurrent.futures import Executor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from images.audit import iter_user_files, list_usernames
+from images.models import AccessLogPosition, Image, ResizeAccess, StorageUsage
+
+LRU = 'lru'
+LFU = 'lfu'
+POLICIES = (LRU, LFU)
+
+LOG_LINE_RE = re.compile(
+    r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] "(?:GET|HEAD) \S*?/(?P<username>[^/\s]+)/(?P<size>[0-9]+x[0-9]+)/'
+    r'(?P<filename>[^/?\s]+)\S* [^"]*" (?P<status>200|304) '
+)
+
+
+class Access(NamedTuple):
+    """Aggregated accesses of a resize."""
+
+    hits: int
+    last_access: datetime
+
+
+class Candidate(NamedTuple):
+    """Resize which can be evicted."""
+
+    score: Tuple
+    username: str
+    size: str
+    filename: str
+    filesize: int
+
+
+def parse_log(path: str, offset: int) -> Tuple[Dict[Tuple[str, str, str], Access], int]:
+    """Aggregate successful requests of resizes in nginx access log (combined format) starting from offset.
+
+    Returns accesses by (username, size, filename) and offset of the first unprocessed line.
+    """
+    accesses: Dict[Tuple[str, str, str], Access] = {}
+    with open(path, 'rb') as log:
+        log.seek(offset)
+        for raw_line in log:
+            if not raw_line.endswith(b'\n'):
+                break  # line is being written now
+            offset += len(raw_line)
+            match = LOG_LINE_RE.match(raw_line.decode('utf-8', 'replace'))
+            if not match:
+                continue
+            key = (match['username'], match['size'], match['filename'])
+            time = datetime.strptime(match['time'], '%d/%b/%Y:%H:%M:%S %z')
+            previous = accesses.get(key)
+            if previous:
+                accesses[key] = Access(previous.hits + 1, max(previous.last_access, time))
+            else:
+                accesses[key] = Access(1, time)
+    return accesses, offset
+
+
+def save_accesses(accesses: Dict[Tuple[str, str, str], Access], batch_size: int = 1000) -> int:
+    """Add accesses to statistics, return count of updated resizes."""
+    by_user: Dict[str, Dict[str, List[Tuple[str, Access]]]] = defaultdict(lambda: defaultdict(list))
+    for (username, size, filename), access in accesses.items():
+        by_user[username][filename].append((size, access))
+
+    cnt = 0
+    for username, files in by_user.items():
+        filenames = list(files)
+        for i in range(0, len(filenames), batch_size):
+            images = Image.objects.filter(user__username=username, filename__in=filenames[i:i + batch_size])
+            ids = dict(images.values_list('filename', 'pk'))
+            existing = {
+                (row.image_id, row.size): row for row in ResizeAccess.objects.filter(image_id__in=ids.values())
+            }
+            created, updated = [], []
+            for filename, image_id in ids.items():
+                for size, access in files[filename]:
+                    row = existing.get((image_id, size))
+                    if row:
+                        row.hits += access.hits
+                        row.last_access = max(row.last_access or access.last_access, access.last_access)
+                        updated.append(row)
+                    else:
+                        created.append(ResizeAccess(
+                            image_id=image_id, size=size, hits=access.hits, last_access=access.last_access,
+                        ))
+            ResizeAccess.objects.bulk_create(created)
+            ResizeAccess.objects.bulk_update(updated, ['hits', 'last_access'])
+            cnt += len(created) + len(updated)
+    return cnt
+
+
+def ingest_access_log(path: str) -> int:
+    """Process new lines of access log, return count of updated resizes.
+
+    Rotated log (another inode or shorter file) is read from the beginning.
+    """
+    stat = os.stat(path)
+    position, _ = AccessLogPosition.objects.get_or_create(path=path)
+    if position.inode != stat.st_ino or position.offset > stat.st_size:
+        position.inode = stat.st_ino
+        position.offset = 0
+
+    accesses, position.offset = parse_log(path, position.offset)
+    cnt = save_accesses(accesses)
+    position.save()
+    return cnt
+
+
+class Evictor:
+    """Chooses cold resizes to free space of the volume with resizes.
+
+    Eviction starts when used space is above high watermark and frees space down to low watermark.
+    Resizes are ranked by last access (LRU) or by count of hits (LFU),
+    resize without statistics is treated as accessed once, at the time of its creation.
+    """
+
+    def __init__(self, executor: Executor, policy: str = LRU, high: float = 0.9, low: float = 0.8) -> None:
+        """Init method."""
+        self.executor = executor
+        self.policy = policy
+        self.high = high
+        self.low = low
+        usage = shutil.disk_usage(settings.RESIZES_DIR)
+        self.total = usage.total
+        self.used = usage.used
+        self.scanned = 0
+
+    @property
+    def bytes_to_free(self) -> int:
+        """Return count of bytes to free, zero if used space is under high watermark."""
+        if self.used <= self.total * self.high:
+            return 0
+        return int(self.used - self.total * self.low)
+
+    def score(self, access: Optional[ResizeAccess], mtime: float) -> Tuple:
+        """Return score of the resize: the lower, the colder."""
+        last_access = mtime
+        hits = 1
+        if access:
+            hits = access.hits
+            if access.last_access:
+                last_access = max(mtime, access.last_access.timestamp())
+        if self.policy == LFU:
+            return hits, last_access
+        return last_access, hits
+
+    def candidates(self) -> Iterator[Candidate]:
+        """Yield all resizes with their scores."""
+        for user_files in iter_user_files(list_usernames(), self.executor):
+            filenames = {entry.name for entries in user_files.resizes.values() for entry in entries}
+            accesses = {
+                (row.image.filename, row.size): row
+                for row in ResizeAccess.objects.filter(
+                    image__user__username=user_files.username, image__filename__in=filenames,
+                ).select_related('image')
+            } if filenames else {}
+            for size, entries in user_files.resizes.items():
+                for entry in entries:
+                    self.scanned += 1
+                    score = self.score(accesses.get((entry.name, size)), entry.mtime)
+                    yield Candidate(score, user_files.username, size, entry.name, entry.size)
+
+    def choose(self) -> List[Candidate]:
+        """Return the coldest resizes which have to be evicted, coldest first.
+
+        Only chosen resizes are kept in memory (in a heap with the hottest of them on top).
+        """
+        to_free = self.bytes_to_free
+        if not to_free:
+            return []
+
+        heap: List[Tuple] = []
+        total = 0
+        for candidate in self.candidates():
+            inverted = tuple(-value for value in candidate.score)
+            heapq.heappush(heap, (inverted, candidate))
+            total += candidate.filesize
+            while heap and total - heap[0][1].filesize >= to_free:
+                total -= heapq.heappop(heap)[1].filesize
+        return [candidate for _, candidate in sorted(heap, reverse=True)]
+
+    def evict(self, candidates: List[Candidate]) -> int:
+        """Remove the resizes and mark them as evicted, return count of freed bytes."""
+        freed = 0
+        now = timezone.now()
+        for candidate in candidates:
+            image = Image.objects.filter(user__username=candidate.username, filename=candidate.filename).first()
+            try:
+                os.remove(Path(settings.RESIZES_DIR) / candidate.username / candidate.size / candidate.filename)
+            except FileNotFoundError:
+                continue
+            freed += candidate.filesize
+            if image:
+                ResizeAccess.objects.update_or_create(image=image, size=candidate.size, defaults={'evicted_at': now})
+                StorageUsage.add(image.user_id, resizes_bytes=-candidate.filesize, resizes_count=-1)
+        return freed
@@ -1,11 +1,15 @@
-import re
+from typing import List, Optional, Tuple
 
 from PIL import Image as PillowImage, UnidentifiedImageError
 from django import forms
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
 from django.core.validators import MaxValueValidator, MinValueValidator
 
 from app.helpers import Size, Sizes
+from images.models import ResizePreset, SizePolicy
+from images.sniffing import NOT_AN_IMAGE, check_pixels
+from images.validators import validate_sizes
 
 
 class SizesField(forms.Field):
@@ -16,11 +20,7 @@ class SizesField(forms.Field):
         if not value:
             return self.to_python(value)
 
-        for size in value.split(','):
-            if not size:
-                raise ValidationError('Empty size given', params={'value': size})
-            if not re.match(r'^[0-9]+x[0-9]+$', size):
-                raise ValidationError('Value contains inappropriate symbols', params={'value': size})
+        validate_sizes(value)
 
         return self.to_python(value)
 
@@ -29,11 +29,7 @@ class SizesField(forms.Field):
         if not value:
             return None
 
-        sizes_list = []
-        for size in str(value).split(','):
-            sizes_list.append(Size.from_str(size))
-
-        return sizes_list
+        return Size.list_from_str(str(value))
 
 
 class ImageFileField(forms.FileField):
@@ -46,8 +42,9 @@ class ImageFileField(forms.FileField):
 
         try:
             img = PillowImage.open(data)
+            check_pixels(img)
         except UnidentifiedImageError:
-            raise ValidationError('File probably is not an image')
+            raise ValidationError(NOT_AN_IMAGE)
         except Exception as e:
             raise ValidationError(str(e))
 
@@ -58,15 +55,129 @@ class ImageFileField(forms.FileField):
         return value
 
 
-class UploadImageForm(forms.Form):
+class PresetsFormMixin:
+    """Resolves names of the user's resize presets and applies the user's size policy."""
+
+    def __init__(self, *args, user=None, **kwargs) -> None:
+        """Init method, saves owner of presets."""
+        super().__init__(*args, **kwargs)  # type: ignore
+        self.user = user
+
+    def get_presets(self, names: str):
+        """Return presets of the user by comma separated names."""
+        if not names:
+            return []
+
+        names_list = [name.strip() for name in names.split(',') if name.strip()]
+        presets = {preset.name: preset for preset in ResizePreset.objects.filter(user=self.user, name__in=names_list)}
+        unknown = [name for name in names_list if name not in presets]
+        if unknown:
+            raise ValidationError('Unknown preset: %(value)s', params={'value': ', '.join(unknown)})
+
+        return [presets[name] for name in names_list]
+
+    def snap_sizes(self, sizes: Sizes) -> Sizes:
+        """Replace requested sizes by sizes allowed by policy of the user."""
+        return SizePolicy.snap_sizes(self.user, sizes)
+
+
+class UploadImageForm(PresetsFormMixin, forms.Form):
     """Form for upload."""
 
     sizes = SizesField(help_text='Comma separated sizes "{WIDTH}x{HEIGHT}". Example: 700x600,1024x768')
+    presets = forms.CharField(required=False, help_text='Comma separated names of presets. Example: thumbs,gallery')
     file = ImageFileField(required=True)  # noqa: VNE002
 
-
-class ResizeImageForm(forms.Form):
-    """Form for resize."""
-
-    width = forms.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(10000)])
-    height = forms.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(10000)])
+    def clean_sizes(self):
+        """Validate sizes."""
+        return self.snap_sizes(self.cleaned_data['sizes'])
+
+    def clean_presets(self):
+        """Validate presets."""
+        return self.get_presets(self.cleaned_data['presets'])
+
+
+class UploadImagesForm(UploadImageForm):
+    """Form for upload of several files in one request.
+
+    Files are sent in repeated `file` param, sizes of a certain file are added by `sizes.{INDEX}` param.
+    Every file is validated separately, an invalid file doesn't fail the others.
+    """
+
+    file = None  # type: ignore  # noqa: VNE002
+
+    def __init__(self, *args, sniffed: List[Tuple[str, Optional[UploadedFile], Optional[str]]], **kwargs) -> None:
+        """Init method, saves sniffed files (name, file and reason of rejection) and adds fields of their sizes."""
+        super().__init__(*args, **kwargs)
+        self.sniffed = sniffed
+        for index, _ in enumerate(sniffed):
+            self.fields[f'sizes.{index}'] = SizesField(required=False)
+
+    def clean(self):
+        """Validate files, result of every file is its image or error, sizes of the file and the file.
+
+        Files which were rejected while received are errors, skipped ones are replaced by empty files with their names.
+        """
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        common_sizes = cleaned_data['sizes'] or []
+        for preset in cleaned_data['presets']:
+            common_sizes += preset.sizes_list
+        cleaned_data['uploads'] = []
+        for index, (name, uploaded_file, rejection) in enumerate(self.sniffed):
+            sizes = self.snap_sizes(cleaned_data[f'sizes.{index}']) or []
+            try:
+                if rejection:
+                    raise ValidationError(rejection)
+                img = ImageFileField().clean(uploaded_file)
+            except ValidationError as e:
+                img = e
+            uploaded_file = uploaded_file or UploadedFile(name=name)
+            cleaned_data['uploads'].append((img, Size.unique(common_sizes + sizes), uploaded_file))
+        return cleaned_data
+
+
+class UploadSessionForm(PresetsFormMixin, forms.Form):
+    """Form for creation of resumable upload."""
+
+    filename = forms.CharField(max_length=256)
+    size = forms.IntegerField(min_value=1, help_text='Bytes of the whole file')
+    sizes = SizesField(help_text='Comma separated sizes "{WIDTH}x{HEIGHT}". Example: 700x600,1024x768')
+    presets = forms.CharField(required=False, help_text='Comma separated names of presets. Example: thumbs,gallery')
+
+    def clean_sizes(self):
+        """Validate sizes."""
+        return self.snap_sizes(self.cleaned_data['sizes'])
+
+    def clean_presets(self):
+        """Validate presets."""
+        return self.get_presets(self.cleaned_data['presets'])
+
+
+class ResizeImageForm(PresetsFormMixin, forms.Form):
+    """Form for resize.
+
+    Either both width and height or name of a preset are required.
+    Size is the actual size which is created by policy of the user.
+    """
+
+    width = forms.IntegerField(required=False, validators=[MinValueValidator(1), MaxValueValidator(10000)])
+    height = forms.IntegerField(required=False, validators=[MinValueValidator(1), MaxValueValidator(10000)])
+    preset = forms.CharField(required=False)
+
+    def clean_preset(self):
+        """Validate preset."""
+        presets = self.get_presets(self.cleaned_data['preset'])
+        return presets[0] if presets else None
+
+    def clean(self):
+        """Validate form."""
+        cleaned_data = super().clean()
+        if cleaned_data.get('preset') or self.errors:
+            return cleaned_data
+        if not cleaned_data.get('width') or not cleaned_data.get('height'):
+            raise ValidationError('Width and height or preset are required')
+        cleaned_data['size'] = self.snap_sizes([Size(cleaned_data['width'], cleaned_data['height'])])[0]
+        return cleaned_data
@@ -0,0 +1,73 @@
+import os
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, List
+
+from PIL import Image as PillowImage
+from django.conf import settings
+
+from app.helpers import Size
+from images.models import Image
+from images.placeholders import compute_placeholder
+from images.storage import file_size, place_file
+
+
+def discard_files(user: settings.AUTH_USER_MODEL, stem: str) -> None:
+    """Remove the original and resizes of the image which has no row, the extension of its filename is unknown."""
+    paths = list((Path(settings.ORIGINALS_DIR) / str(user)).glob(f'{stem}.*'))
+    paths += list((Path(settings.RESIZES_DIR) / str(user)).glob(f'*/{stem}.*'))
+    for path in paths:
+        with suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def ingest_file(
+    source: str, path: Path, user: settings.AUTH_USER_MODEL, mode: str, sizes: List[Size], stem: str,
+) -> Dict:
+    """Validate and decode the file, place it to originals of the user and create resizes.
+
+    Filename of the image is the stem (written to manifest before) with extension of the format.
+    Works without DB, so it can be run in a pool of processes.
+    Returns data of unsaved Image row, or error message. Placed files are removed if the file fails.
+    """
+    try:
+        with PillowImage.open(path) as img:
+            img.load()
+            filename = f'{stem}.{img.format.lower()}'
+            placeholder, color = compute_placeholder(img)
+
+            image = Image(
+                user=user,
+                filename=filename,
+                original_filename=os.path.basename(source)[:256],
+                placeholder=placeholder,
+                dominant_color=color,
+            )
+            place_file(path, image.original_path, mode)
+            originals_bytes = file_size(image.original_path)
+
+            created = []
+            resizes_bytes = resizes_count = 0
+            for size in sizes:
+                try:
+                    added_bytes, added_count = image.write_resize(size, img)
+                except OSError:
+                    continue
+                created.append(str(size))
+                resizes_bytes += added_bytes
+                resizes_count += added_count
+    except Exception as e:
+        discard_files(user, stem)
+        return {'source': source, 'error': str(e) or e.__class__.__name__}
+
+    return {
+        'source': source,
+        'filename': filename,
+        'original_filename': image.original_filename,
+        'placeholder': placeholder,
+        'dominant_color': color,
+        'sizes': created,
+        'originals_bytes': originals_bytes,
+        'resizes_bytes': resizes_bytes,
+        'resizes_count': resizes_count,
+    }
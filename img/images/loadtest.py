@@ -0,0 +1,263 @@
+"""Helpers of loadtest command: synthetic images, HTTP client of the API and statistics."""
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from io import BytesIO
+from itertools import count
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode, urlsplit
+from uuid import uuid4
+
+import numpy as np
+from PIL import Image as PillowImage
+
+from app.helpers import Size
+from app.memory import read_rss
+
+UPLOAD = 'upload'
+RESIZE = 'resize'
+DELETE = 'delete'
+OPERATIONS = (UPLOAD, RESIZE, DELETE)
+
+
+class Result(NamedTuple):
+    """Result of a request."""
+
+    status: int  # 0 if request failed without response
+    latency: float  # seconds
+    message: Optional[object] = None
+
+
+def synthetic_images(cnt: int, size: Tuple[int, int], fmt: str, seed: int = 0) -> List[bytes]:
+    """Return encoded images with gradients and noise, so they are not compressed too well."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    gradient = np.linspace(0, 255, width)[np.newaxis, :, np.newaxis]
+    images = []
+    for _ in range(cnt):
+        colors = rng.uniform(0.2, 1.0, size=(1, 1, 3))
+        noise = rng.normal(0, 20, size=(height, width, 3))
+        pixels = np.clip(gradient * colors + noise, 0, 255).astype(np.uint8)
+        content = BytesIO()
+        PillowImage.fromarray(pixels, 'RGB').save(content, fmt)
+        images.append(content.getvalue())
+    return images
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Return percentile of sorted values (nearest rank)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(percent / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class ApiClient:
+    """Client of the API keeping one connection (one per worker thread)."""
+
+    def __init__(self, url: str, host: Optional[str], timeout: float = 60) -> None:
+        """Init method."""
+        parts = urlsplit(url)
+        self.connection = http.client.HTTPConnection(parts.hostname or 'localhost', parts.port or 80, timeout=timeout)
+        self.headers = {'Host': host or parts.netloc}
+
+    @classmethod
+    def factory(cls, url: str, host: Optional[str]) -> Callable[[], 'ApiClient']:
+        """Return function creating clients of the server."""
+        return lambda: cls(url, host)
+
+    def request(self, method: str, path: str, token: str, body: bytes = b'', content_type: str = '') -> Result:
+        """Send request, return its result."""
+        headers = dict(self.headers, **{'X-Auth-Token': token})
+        if content_type:
+            headers['Content-Type'] = content_type
+        started = time.perf_counter()
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()
+            return Result(0, time.perf_counter() - started)
+        latency = time.perf_counter() - started
+
+        try:
+            message = json.loads(content)['message']
+        except (ValueError, KeyError, TypeError):
+            message = None
+        return Result(response.status, latency, message)
+
+    def upload(self, token: str, content: bytes, sizes: str) -> Result:
+        """Upload image."""
+        boundary = uuid4().hex
+        body = b''.join([
+            f'--{boundary}\r\nContent-Disposition: form-data; name="sizes"\r\n\r\n{sizes}\r\n'.encode(),
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="load.img"\r\n'.encode(),
+            b'Content-Type: application/octet-stream\r\n\r\n',
+            content,
+            f'\r\n--{boundary}--\r\n'.encode(),
+        ])
+        return self.request('POST', '/upload/', token, body, f'multipart/form-data; boundary={boundary}')
+
+    def resize(self, token: str, filename: str, width: int, height: int) -> Result:
+        """Resize image."""
+        body = urlencode({'width': width, 'height': height}).encode()
+        return self.request('POST', f'/{filename}', token, body, 'application/x-www-form-urlencoded')
+
+    def delete(self, token: str, filename: str) -> Result:
+        """Delete image."""
+        return self.request('DELETE', f'/{filename}', token)
+
+    def close(self) -> None:
+        """Close connection."""
+        self.connection.close()
+
+
+class Stats:
+    """Latencies and errors of requests by operations, shared by worker threads."""
+
+    def __init__(self) -> None:
+        """Init method."""
+        self.lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {operation: [] for operation in OPERATIONS}
+        self.errors: Dict[str, int] = {operation: 0 for operation in OPERATIONS}
+
+    @property
+    def total(self) -> int:
+        """Count of all requests."""
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    def add(self, operation: str, result: Result) -> None:
+        """Add result of the request."""
+        with self.lock:
+            self.latencies[operation].append(result.latency)
+            if not 200 <= result.status < 300:
+                self.errors[operation] += 1
+
+    def report(self) -> List[str]:
+        """Return lines of report by operations."""
+        lines = [f'{"endpoint":<10}{"requests":>10}{"errors":>8}{"rate":>8}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}']
+        for operation in OPERATIONS:
+            latencies = sorted(self.latencies[operation])
+            if not latencies:
+                continue
+            cnt = len(latencies)
+            errors = self.errors[operation]
+            p50, p95, p99 = (percentile(latencies, percent) * 1000 for percent in (50, 95, 99))
+            lines.append(
+                f'{operation:<10}{cnt:>10}{errors:>8}{errors / cnt:>8.1%}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}'
+            )
+        return lines
+
+
+class RssMonitor(threading.Thread):
+    """Thread which periodically reads RSS of the server process."""
+
+    def __init__(self, pid: int, interval: float = 0.5) -> None:
+        """Init method."""
+        super().__init__(name='rss-monitor', daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.max_rss: Optional[int] = None
+        self.last_rss: Optional[int] = None
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        """Read RSS until stopped."""
+        while not self.stopped.is_set():
+            rss = read_rss(self.pid)
+            if rss is not None:
+                self.last_rss = rss
+                self.max_rss = max(self.max_rss or 0, rss)
+            self.stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        """Stop reading and wait for the thread."""
+        self.stopped.set()
+        self.join()
+
+
+class LoadRunner:
+    """Sends a mix of requests by concurrent workers until count of requests or duration is reached.
+
+    Resizes and deletes use images uploaded during the test, uploads are sent until there are such images.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], ApiClient],
+        tokens: List[str],
+        corpus: List[bytes],
+        sizes: List[Size],
+        weights: Dict[str, float],
+        requests: int,
+        duration: float = 0,
+    ) -> None:
+        """Init method."""
+        self.client_factory = client_factory
+        self.tokens = tokens
+        self.corpus = corpus
+        self.sizes = sizes
+        self.sizes_str = ','.join(str(size) for size in sizes)
+        self.operations, self.weights = list(weights), list(weights.values())
+        self.requests = requests
+        self.deadline = time.monotonic() + duration if duration else None
+        self.counter = count()
+        self.lock = threading.Lock()
+        self.uploaded: Dict[str, List[str]] = {token: [] for token in tokens}
+        self.stats = Stats()
+
+    def has_next(self) -> bool:
+        """Check if one more request should be sent."""
+        if self.deadline is not None:
+            return time.monotonic() < self.deadline
+        return next(self.counter) < self.requests
+
+    def take_filename(self, token: str, remove: bool) -> Optional[str]:
+        """Return random filename uploaded by the token."""
+        with self.lock:
+            filenames = self.uploaded[token]
+            if not filenames:
+                return None
+            index = random.randrange(len(filenames))
+            return filenames.pop(index) if remove else filenames[index]
+
+    def send(self, client: ApiClient) -> None:
+        """Send a random request."""
+        token = random.choice(self.tokens)
+        operation = random.choices(self.operations, self.weights)[0]
+        filename = self.take_filename(token, operation == DELETE) if operation != UPLOAD else None
+
+        if operation == RESIZE and filename:
+            size = random.choice(self.sizes)
+            result = client.resize(token, filename, size.width, size.height)
+        elif operation == DELETE and filename:
+            result = client.delete(token, filename)
+        else:
+            operation = UPLOAD
+            result = client.upload(token, random.choice(self.corpus), self.sizes_str)
+            if result.status == 200 and isinstance(result.message, dict):
+                with self.lock:
+                    self.uploaded[token].append(result.message['filename'])
+        self.stats.add(operation, result)
+
+    def work(self) -> None:
+        """Send requests by one connection."""
+        client = self.client_factory()
+        try:
+            while self.has_next():
+                self.send(client)
+        finally:
+            client.close()
+
+    def run(self, concurrency: int) -> Stats:
+        """Run workers and wait for them."""
+        threads = [threading.Thread(target=self.work, name=f'loadtest-{index}') for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.stats
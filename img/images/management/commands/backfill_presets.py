@@ -0,0 +1,66 @@
+import time
+from typing import Dict, List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.memory import CommandWatchdog
+from images.models import PresetBackfill
+
+
+class Command(BaseCommand):
+    """Creates gained sizes of presets for already uploaded images.
+
+    Users are processed in turns by batches (the oldest backfill of each user per turn),
+    so one big user with many presets doesn't block the others.
+    Progress of backfills is saved after each batch, if RSS crosses MEMORY_SOFT_LIMIT_MB the command is restarted
+    and continues from it.
+    Sample how to run: python manage.py backfill_presets --rate=20 --loop
+    """
+
+    @staticmethod
+    def fair_turn(backfills: List[PresetBackfill]) -> List[PresetBackfill]:
+        """Return the oldest backfill of each user."""
+        turn: Dict[int, PresetBackfill] = {}
+        for backfill in backfills:
+            turn.setdefault(backfill.preset.user_id, backfill)
+        return list(turn.values())
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--rate', type=float, default=settings.PRESET_BACKFILL_RATE, help='Images per second')
+        parser.add_argument('--batch', type=int, default=50)
+        parser.add_argument('--loop', action='store_true', help='Wait for new backfills instead of exit')
+        parser.add_argument('--interval', type=int, default=10, help='Seconds between checks in loop mode')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['rate'] <= 0:
+            raise CommandError('Rate should be greater than 0')
+        if options['batch'] < 1:
+            raise CommandError('Batch should be greater than 1')
+
+        cnt = 0
+        watchdog = CommandWatchdog(self, options)
+        while True:
+            backfills = list(
+                PresetBackfill.objects.exclude(status=PresetBackfill.DONE).select_related('preset', 'preset__user')
+            )
+            if not backfills:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+                continue
+
+            for backfill in self.fair_turn(backfills):
+                started = time.monotonic()
+                processed = backfill.process(options['batch'])
+                cnt += processed
+                self.stdout.write(f'{backfill}: {backfill.progress}')
+                time.sleep(max(0.0, processed / options['rate'] - (time.monotonic() - started)))
+                watchdog.check()
+
+        if cnt > 0:
+            self.stdout.write(self.style.SUCCESS(f'Processed {cnt} images'))
+        else:
+            self.stdout.write('Nothing to backfill')
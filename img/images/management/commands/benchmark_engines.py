@@ -0,0 +1,83 @@
+import os
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from statistics import mean
+from tempfile import TemporaryDirectory
+from typing import Dict, List
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from app.helpers import Size
+from app.memory import read_rss
+from images.engines import ENGINES, get_engine
+from images.loadtest import synthetic_images
+
+
+def measure(engine_name: str, sources: List[str], sizes: List[Size], repeat: int, tmp_dir: str) -> Dict:
+    """Resize the sources by the engine, return durations of resizes by sizes and peak growth of memory."""
+    engine = get_engine(engine_name)
+    started_rss = read_rss(os.getpid()) or 0
+    durations: Dict[str, List[float]] = {str(size): [] for size in sizes}
+    for source in sources:
+        for size in sizes:
+            destination = Path(tmp_dir) / f'{engine_name}-{size}-{os.path.basename(source)}'
+            for _ in range(repeat):
+                started = time.perf_counter()
+                engine.resize(Path(source), size, destination)
+                durations[str(size)].append(time.perf_counter() - started)
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {'durations': durations, 'memory': max(peak_rss - started_rss, 0)}
+
+
+class Command(BaseCommand):
+    """Compares speed and memory of resize engines.
+
+    Every engine works in its own process, so peak memory of engines doesn't mix.
+    Synthetic JPEG is resized if no source files are given.
+    Sample how to run: python manage.py benchmark_engines --image-size=6000x4000 --sizes=200x200,1024x768
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('sources', nargs='*', help='Image files to resize')
+        parser.add_argument('--engines', default=','.join(ENGINES), help='Comma separated engines')
+        parser.add_argument('--sizes', default='200x200,1024x768')
+        parser.add_argument('--image-size', default='6000x4000', help='Size of synthetic image')
+        parser.add_argument('--repeat', type=int, default=3, help='Resizes of every source to every size')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        sizes = Size.list_from_str(options['sizes'])
+        if not sizes:
+            raise CommandError('At least one size is required')
+        if options['repeat'] < 1:
+            raise CommandError('Repeat should be greater than 0')
+
+        with TemporaryDirectory() as tmp_dir:
+            sources = options['sources']
+            if not sources:
+                source = Path(tmp_dir) / 'synthetic.jpeg'
+                source.write_bytes(synthetic_images(1, Size.from_str(options['image_size']).as_tuple(), 'JPEG')[0])
+                sources = [str(source)]
+
+            self.stdout.write(f'{"engine":<10}{"size":>12}{"mean ms":>10}{"min ms":>10}{"memory Mb":>12}')
+            for engine_name in options['engines'].split(','):
+                try:
+                    get_engine(engine_name)
+                except ImproperlyConfigured as e:
+                    self.stdout.write(self.style.WARNING(f'{engine_name:<10}skipped: {e}'))
+                    continue
+
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    result = executor.submit(
+                        measure, engine_name, sources, sizes, options['repeat'], tmp_dir,
+                    ).result()
+                memory = result['memory'] / 1024 / 1024
+                for size_str, durations in result['durations'].items():
+                    self.stdout.write(
+                        f'{engine_name:<10}{size_str:>12}{mean(durations) * 1000:>10.1f}'
+                        f'{min(durations) * 1000:>10.1f}{memory:>12.1f}'
+                    )
@@ -0,0 +1,263 @@
+import json
+import os
+import shutil
+import tarfile
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import suppress
+from pathlib import Path
+from typing import Dict, Iterator, List, Set, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from app.helpers import Size
+from app.memory import CommandWatchdog
+from images.forms import SizesField
+from images.ingest import discard_files, ingest_file
+from images.models import Image, StorageUsage
+from images.storage import LINK, MOVE, PLACE_MODES
+
+
+class Command(BaseCommand):
+    """Imports a directory tree or a tar archive of images for the user.
+
+    Files are decoded in a pool of processes, DB rows are inserted by batches.
+    Manifest (JSON lines) maps source paths to filenames of images, it's written after each batch,
+    so the command continues from the last batch if it's run again with the same manifest.
+    Filename of every file is written to manifest before the file is placed, so files placed by an interrupted run
+    are either recorded (if their rows were committed) or removed on the next run. Failed files are retried.
+    Files of a directory are moved (--mode=move) only after their rows are committed.
+    If RSS crosses MEMORY_SOFT_LIMIT_MB, files in processing are saved and the command is restarted,
+    the new process continues by the manifest.
+    Sample how to run: python manage.py bulk_ingest /path/to/photos --username=test --sizes=200x200
+    """
+
+    @staticmethod
+    def read_manifest(path: Path) -> Tuple[Set[str], Dict[str, str]]:
+        """Return sources which are already imported and stems of filenames of sources which were not finished.
+
+        Line broken by interruption is cut off.
+        """
+        done: Set[str] = set()
+        intents: Dict[str, str] = {}
+        if not path.exists():
+            return done, intents
+        valid_length = 0
+        with open(path, 'rb') as manifest:
+            for raw_line in manifest:
+                try:
+                    line = json.loads(raw_line)
+                    source = line['source']
+                except (ValueError, KeyError):
+                    break
+                valid_length += len(raw_line)
+                if 'intent' in line:
+                    intents[source] = line['intent']
+                    continue
+                intents.pop(source, None)
+                if 'filename' in line:
+                    done.add(source)
+        os.truncate(path, valid_length)
+        return done, intents
+
+    @staticmethod
+    def walk(source: Path, done: Set[str]) -> Iterator[Tuple[str, Path]]:
+        """Yield all files of the directory tree."""
+        dirs = [source]
+        while dirs:
+            with os.scandir(dirs.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(Path(entry.path))
+                    elif entry.is_file(follow_symlinks=False) and entry.path not in done:
+                        yield entry.path, Path(entry.path)
+
+    @staticmethod
+    def extract(source: Path, done: Set[str], user: User) -> Iterator[Tuple[str, Path]]:
+        """Extract files of the archive one by one next to originals of the user."""
+        staging_dir = Path(settings.ORIGINALS_DIR) / str(user) / '.ingest'
+        os.makedirs(staging_dir, exist_ok=True)
+        with tarfile.open(source, 'r|*') as archive:
+            for member in archive:
+                key = f'{source}:{member.name}'
+                if not member.isfile() or key in done:
+                    continue
+                path = staging_dir / uuid4().hex
+                with archive.extractfile(member) as src, open(path, 'wb') as dst:  # type: ignore
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                yield key, path
+
+    @staticmethod
+    def collect(in_flight: Dict[Future, Path], extracted: bool, return_when: str) -> List[Dict]:
+        """Wait for files in processing, return results of finished ones.
+
+        Extracted files of the archive are removed if they were not imported.
+        """
+        finished, _ = wait(in_flight, return_when=return_when)
+        results = []
+        for future in finished:
+            path = in_flight.pop(future)
+            result = future.result()
+            if 'error' in result and extracted and path.exists():
+                os.remove(path)
+            results.append(result)
+        return results
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('source', type=str, help='Directory or tar archive')
+        parser.add_argument('--username', type=str, required=True)
+        parser.add_argument('--sizes', type=str, help='Comma separated sizes. Example: 700x600,1024x768')
+        parser.add_argument('--mode', choices=PLACE_MODES, default=LINK, help='How to place files of a directory')
+        parser.add_argument('--manifest', type=str, help='Path to manifest, default: <source>.manifest.jsonl')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        source = Path(options['source'])
+        if not source.exists():
+            raise CommandError(f'{source} does not exist')
+        if options['workers'] < 1:
+            raise CommandError('Workers should be greater than 1')
+        if options['batch'] < 1:
+            raise CommandError('Batch should be greater than 1')
+        user = User.objects.filter(username=options['username']).first()
+        if not user:
+            raise CommandError('User not found')
+        try:
+            sizes = SizesField().clean(options['sizes']) or []
+        except ValidationError as e:
+            raise CommandError(f'Incorrect sizes: {e.message}')
+
+        manifest_path = Path(options['manifest'] or f'{source}.manifest.jsonl')
+        done, intents = self.read_manifest(manifest_path)
+        os.makedirs(Path(settings.ORIGINALS_DIR) / str(user), exist_ok=True)
+        extracted = not source.is_dir()
+        remove_sources = not extracted and options['mode'] == MOVE
+
+        with open(manifest_path, 'a') as manifest:
+            done |= self.reconcile(intents, user, manifest, remove_sources)
+            if done:
+                self.stdout.write(f'{len(done)} files are already in manifest, skipping them')
+
+            if extracted:
+                files = self.extract(source, done, user)
+            else:
+                files = self.walk(source, done)
+            started = time.monotonic()
+            watchdog = CommandWatchdog(self, options)
+            cnt, failed = self.ingest(files, extracted, user, sizes, manifest, options, watchdog)
+
+        if cnt > 0 or failed > 0:
+            rate = cnt / (time.monotonic() - started)
+            self.stdout.write('')
+            self.stdout.write(self.style.SUCCESS(f'Imported {cnt} images ({rate:.1f} per second), failed {failed}'))
+            self.stdout.write(f'Manifest: {manifest_path}')
+        else:
+            self.stdout.write('Nothing to import')
+
+    def reconcile(self, intents: Dict[str, str], user: User, manifest, remove_sources: bool) -> Set[str]:
+        """Finish files of the interrupted run, return sources whose rows were committed.
+
+        Committed sources are written to manifest (and removed in move mode), files of others are removed.
+        """
+        imported = set()
+        for source, stem in intents.items():
+            image = Image.all_objects.filter(user=user, filename__startswith=f'{stem}.').first()
+            if image is None:
+                discard_files(user, stem)
+                continue
+            imported.add(source)
+            manifest.write(json.dumps({'source': source, 'filename': image.filename}) + '\n')
+            if remove_sources:
+                with suppress(FileNotFoundError):
+                    os.remove(source)
+        manifest.flush()
+        os.fsync(manifest.fileno())
+        return imported
+
+    def ingest(
+        self, files: Iterator[Tuple[str, Path]], extracted: bool, user: User, sizes: List[Size], manifest, options,
+        watchdog: CommandWatchdog,
+    ) -> Tuple[int, int]:
+        """Ingest files in a pool of processes, return count of created and failed images.
+
+        If RSS is over the soft limit, files in processing are saved and the command is restarted.
+        """
+        # files of a directory are removed after their rows are committed in move mode
+        remove_sources = not extracted and options['mode'] == MOVE
+        mode = MOVE if extracted else (LINK if remove_sources else options['mode'])
+        cnt = failed = 0
+        batch: List[Dict] = []
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            in_flight: Dict[Future, Path] = {}
+            for key, path in files:
+                stem = uuid4().hex
+                manifest.write(json.dumps({'source': key, 'intent': stem}) + '\n')
+                manifest.flush()
+                in_flight[executor.submit(ingest_file, key, path, user, mode, sizes, stem)] = path
+                if len(in_flight) < options['workers'] * 4:
+                    continue
+                batch += self.collect(in_flight, extracted, FIRST_COMPLETED)
+                if len(batch) >= options['batch']:
+                    created = self.save(batch, user, manifest, remove_sources)
+                    cnt, failed, batch = cnt + created, failed + len(batch) - created, []
+                    if watchdog.over_limit():
+                        break
+
+            batch += self.collect(in_flight, extracted, ALL_COMPLETED)
+            created = self.save(batch, user, manifest, remove_sources)
+
+        if watchdog.exceeded:
+            watchdog.restart()
+
+        return cnt + created, failed + len(batch) - created
+
+    def save(self, batch: List[Dict], user: User, manifest, remove_sources: bool) -> int:
+        """Insert rows of the batch into DB and write the batch to manifest, return count of created rows.
+
+        Sources of created rows are removed after the commit in move mode.
+        """
+        if not batch:
+            return 0
+
+        images = [
+            Image(
+                user=user,
+                filename=data['filename'],
+                original_filename=data['original_filename'],
+                placeholder=data['placeholder'],
+                dominant_color=data['dominant_color'],
+            )
+            for data in batch if 'filename' in data
+        ]
+        with transaction.atomic():
+            Image.objects.bulk_create(images)
+            StorageUsage.add(
+                user.pk,
+                originals_bytes=sum(data['originals_bytes'] for data in batch if 'filename' in data),
+                originals_count=len(images),
+                resizes_bytes=sum(data['resizes_bytes'] for data in batch if 'filename' in data),
+                resizes_count=sum(data['resizes_count'] for data in batch if 'filename' in data),
+            )
+        Image.forget(user.pk, [image.filename for image in images])
+
+        for data in batch:
+            if remove_sources and 'filename' in data:
+                with suppress(FileNotFoundError):
+                    os.remove(data['source'])
+            if 'error' in data:
+                self.stderr.write(f'{data["source"]}: {data["error"]}')
+            line = {key: data[key] for key in ('source', 'filename', 'sizes', 'error') if key in data}
+            manifest.write(json.dumps(line) + '\n')
+        manifest.flush()
+        os.fsync(manifest.fileno())
+        self.stdout.write('.', ending='')
+
+        return len(images)
@@ -0,0 +1,63 @@
+import os
+import time
+from contextlib import suppress
+from pathlib import Path
+from uuid import UUID
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from images.models import UploadSession
+
+
+class Command(BaseCommand):
+    """Removes expired resumable uploads and staging files without sessions.
+
+    Sample how to run: python manage.py cleanup_uploads --loop
+    """
+
+    @staticmethod
+    def cleanup() -> tuple:
+        """Remove expired sessions and orphan staging files once, return count of both."""
+        expired = 0
+        for upload_session in UploadSession.objects.filter(expires_at__lte=timezone.now()).iterator():
+            upload_session.remove()
+            expired += 1
+
+        # files of sessions removed by cascade (with their users) or created by interrupted requests
+        orphans = 0
+        staging_dir = Path(settings.UPLOADS_STAGING_DIR)
+        with suppress(FileNotFoundError):
+            names = set(os.listdir(staging_dir))
+            keys = []
+            for name in names:
+                with suppress(ValueError):
+                    keys.append(UUID(name))
+            names -= {key.hex for key in UploadSession.objects.filter(key__in=keys).values_list('key', flat=True)}
+            deadline = time.time() - settings.UPLOAD_SESSION_TTL
+            for name in names:
+                with suppress(FileNotFoundError):
+                    # fresh files may belong to sessions created after listing
+                    if os.stat(staging_dir / name).st_mtime < deadline:
+                        os.remove(staging_dir / name)
+                        orphans += 1
+
+        return expired, orphans
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--loop', action='store_true', help='Wait for expired uploads instead of exit')
+        parser.add_argument('--interval', type=int, default=600, help='Seconds between runs in loop mode')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        while True:
+            expired, orphans = self.cleanup()
+            if expired or orphans:
+                self.stdout.write(self.style.SUCCESS(f'Removed {expired} expired uploads, {orphans} orphan files'))
+            elif not options['loop']:
+                self.stdout.write('Nothing to remove')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
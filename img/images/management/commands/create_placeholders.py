@@ -0,0 +1,92 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.memory import CommandWatchdog
+from images.models import Image
+from images.placeholders import placeholder_from_path
+from images.tiering import find_cold, open_compressed
+
+
+def placeholder_of_original(path: Path, username: str, filename: str) -> Optional[Tuple[str, str]]:
+    """Return placeholder of the original, the original in the cold tier is read without its restoring."""
+    if path.exists():
+        return placeholder_from_path(path)
+    cold = find_cold(username, filename)
+    if not cold:
+        return None
+    try:
+        with open_compressed(*cold, 'rb') as src:
+            return placeholder_from_path(BytesIO(src.read()))
+    except OSError:
+        return None
+
+
+class Command(BaseCommand):
+    """Computes placeholders and dominant colors of images uploaded before they appeared.
+
+    Images are decoded in a pool of processes, originals in the cold tier are read without restoring.
+    If RSS crosses MEMORY_SOFT_LIMIT_MB the command is restarted with --after-id of the last processed image.
+    Sample how to run: python manage.py create_placeholders --username=test --workers=4
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--username', type=str, help='Process images of the user only')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument('--after-id', type=int, default=0, help='Continue after the image with this id')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['workers'] < 1:
+            raise CommandError('Workers should be greater than 1')
+        if options['batch'] < 1:
+            raise CommandError('Batch should be greater than 1')
+
+        images = Image.objects.filter(placeholder='').select_related('user').order_by('pk')
+        if options['username']:
+            images = images.filter(user__username=options['username'])
+
+        cnt = 0
+        failed = 0
+        last_pk = options['after_id']
+        watchdog = CommandWatchdog(self, options, '--after-id')
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            while not watchdog.exceeded:
+                batch = list(images.filter(pk__gt=last_pk)[:options['batch']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                results = executor.map(
+                    placeholder_of_original,
+                    [image.original_path for image in batch],
+                    [str(image.user) for image in batch],
+                    [image.filename for image in batch],
+                    chunksize=16,
+                )
+                updated = []
+                for image, result in zip(batch, results):
+                    if not result or not result[0]:
+                        failed += 1
+                        continue
+                    image.placeholder, image.dominant_color = result
+                    updated.append(image)
+
+                Image.objects.bulk_update(updated, ['placeholder', 'dominant_color'])
+                cnt += len(updated)
+                self.stdout.write('.', ending='')
+                watchdog.over_limit()
+
+        if cnt > 0 or failed > 0:
+            self.stdout.write('')
+            self.stdout.write(self.style.SUCCESS(f'Created {cnt} placeholders, failed {failed}'))
+        else:
+            self.stdout.write('Nothing to create')
+        if watchdog.exceeded:
+            watchdog.restart(last_pk)
@@ -1,12 +1,15 @@
 from django.core.management.base import BaseCommand, CommandError
 
 from app.helpers import Size
+from app.memory import CommandWatchdog
 from images.models import Image
 
 
 class Command(BaseCommand):
     """Creates resizes for all images for user.
 
+    Images are processed by primary key, if RSS crosses MEMORY_SOFT_LIMIT_MB the command is restarted
+    with --after-id of the last processed image.
     Sample how to run: python manage.py create_resizes --width=700 --height=700 --username=test
     """
 
@@ -15,6 +18,7 @@ class Command(BaseCommand):
         parser.add_argument('--width', type=int)
         parser.add_argument('--height', type=int)
         parser.add_argument('--username', type=str)
+        parser.add_argument('--after-id', type=int, default=0, help='Continue after the image with this id')
 
     def handle(self, *args, **options) -> None:
         """Run the command."""
@@ -25,10 +29,13 @@ class Command(BaseCommand):
 
         cnt = 0
         size = Size(options['width'], options['height'])
-        for image in Image.objects.filter(user__username=options['username']):
+        watchdog = CommandWatchdog(self, options, '--after-id')
+        images = Image.objects.filter(user__username=options['username'], pk__gt=options['after_id']).order_by('pk')
+        for image in images.iterator():
             image.resize(size)
             cnt += 1
             self.stdout.write('.', ending='')
+            watchdog.check(image.pk)
 
         if cnt > 0:
             self.stdout.write('')
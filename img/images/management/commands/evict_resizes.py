@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from images.eviction import Evictor, POLICIES, ingest_access_log
+
+
+class Command(BaseCommand):
+    """Removes rarely used resizes when volume with resizes is full.
+
+    Access statistics are collected from nginx access logs (combined format) passed with --log.
+    Evicted resizes are recreated on demand when nginx passes missing files to the project.
+    Sample how to run: python manage.py evict_resizes --log=/var/log/nginx/access.log --dry-run
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--log', action='append', default=[], help='Access log, can be passed several times')
+        parser.add_argument('--policy', choices=POLICIES, default=settings.RESIZES_EVICTION_POLICY)
+        parser.add_argument('--high', type=float, default=settings.RESIZES_HIGH_WATERMARK, help='Used space, 0–1')
+        parser.add_argument('--low', type=float, default=settings.RESIZES_LOW_WATERMARK, help='Used space, 0–1')
+        parser.add_argument('--workers', type=int, default=16, help='Threads scanning directories')
+        parser.add_argument('--dry-run', action='store_true', help='Report resizes to evict without removing them')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if not 0 < options['low'] <= options['high'] <= 1:
+            raise CommandError('Watermarks should be: 0 < low <= high <= 1')
+
+        for log in options['log']:
+            cnt = ingest_access_log(log)
+            self.stdout.write(f'{log}: statistics of {cnt} resizes updated')
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            evictor = Evictor(executor, options['policy'], options['high'], options['low'])
+            usage = evictor.used / evictor.total
+            self.stdout.write(f'Used {usage:.1%} of {evictor.total / 1024 ** 3:.1f} Gb')
+            if not evictor.bytes_to_free:
+                self.stdout.write(self.style.SUCCESS('Used space is under high watermark, nothing to evict'))
+                return
+
+            candidates = evictor.choose()
+
+        total = sum(candidate.filesize for candidate in candidates)
+        if options['verbosity'] > 1 or options['dry_run']:
+            for candidate in candidates:
+                path = f'{candidate.username}/{candidate.size}/{candidate.filename}'
+                self.stdout.write(f'{path} ({candidate.filesize} b)')
+        self.stdout.write(f'Scanned {evictor.scanned} resizes')
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Would evict {len(candidates)} resizes, {total / 1024 ** 2:.1f} Mb'))
+            return
+
+        freed = evictor.evict(candidates)
+        self.stdout.write(self.style.SUCCESS(f'Evicted {len(candidates)} resizes, {freed / 1024 ** 2:.1f} Mb'))
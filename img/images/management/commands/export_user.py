@@ -0,0 +1,36 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from images.archive import iter_archive, write_archive
+
+
+class Command(BaseCommand):
+    """Exports originals of the user with manifest of images to a tar archive.
+
+    Originals are copied to the archive in kernel where possible, the archive is restored by import_user command.
+    Sample how to run: python manage.py export_user --username=test --output=/project/uploads/test.tar
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--username', type=str, required=True)
+        parser.add_argument('--output', type=str, required=True, help='Path to the archive, "-" – stdout')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        user = User.objects.filter(username=options['username']).first()
+        if not user:
+            raise CommandError('User not found')
+
+        started = time.monotonic()
+        if options['output'] == '-':
+            write_archive(iter_archive(user), sys.stdout.buffer)
+            return
+        with open(options['output'], 'wb') as out:
+            cnt = write_archive(iter_archive(user), out)
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {cnt} images to {options["output"]} in {time.monotonic() - started:.1f}s'
+        ))
@@ -0,0 +1,93 @@
+import os
+import sys
+import tarfile
+import time
+from pathlib import Path
+from typing import List
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from images.archive import read_archive, restore_image
+from images.models import Image, StorageUsage
+
+
+class Command(BaseCommand):
+    """Imports originals and images of the user from archive created by export_user command.
+
+    Filenames are kept, so URLs of images don't change. Images which already exist are skipped,
+    so an interrupted import can be run again. Resizes are not imported, create them by create_resizes command.
+    Sample how to run: python manage.py import_user /project/uploads/test.tar --username=test
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('archive', type=str, help='Path to the archive, "-" – stdin')
+        parser.add_argument('--username', type=str, required=True)
+        parser.add_argument('--create-user', action='store_true', help='Create the user if it does not exist')
+        parser.add_argument('--batch', type=int, default=500)
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['batch'] < 1:
+            raise CommandError('Batch should be greater than 1')
+        user = User.objects.filter(username=options['username']).first()
+        if not user and options['create_user']:
+            user = User.objects.create_user(username=options['username'])
+        if not user:
+            raise CommandError('User not found')
+
+        started = time.monotonic()
+        try:
+            if options['archive'] == '-':
+                with tarfile.open(fileobj=sys.stdin.buffer, mode='r|*') as archive:
+                    cnt, skipped = self.restore(archive, user, -1, options['batch'])
+            else:
+                cnt, skipped = self.restore_file(Path(options['archive']), user, options['batch'])
+        except (OSError, tarfile.TarError, ValueError) as e:
+            raise CommandError(f'Incorrect archive: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {cnt} images, skipped {skipped} existing in {time.monotonic() - started:.1f}s'
+        ))
+
+    def restore_file(self, path: Path, user: User, batch_size: int) -> tuple:
+        """Restore archive from file, data of uncompressed archive is copied in kernel."""
+        try:
+            with tarfile.open(path, 'r:') as archive:
+                return self.restore(archive, user, archive.fileobj.fileno(), batch_size)  # type: ignore
+        except tarfile.ReadError:
+            pass
+        with tarfile.open(path, 'r|*') as archive:
+            return self.restore(archive, user, -1, batch_size)
+
+    def restore(self, archive: tarfile.TarFile, user: User, source_fd: int, batch_size: int) -> tuple:
+        """Restore images of the archive, return count of imported and skipped images."""
+        os.makedirs(Path(settings.ORIGINALS_DIR) / str(user), exist_ok=True)
+        existing = set(Image.all_objects.filter(user=user).values_list('filename', flat=True))
+        cnt = skipped = 0
+        batch: List[Image] = []
+        for row in read_archive(archive):
+            if row['filename'] in existing:
+                skipped += 1
+                continue
+            batch.append(restore_image(archive, row, user, source_fd))
+            if len(batch) >= batch_size:
+                cnt += self.save(batch, user)
+                batch = []
+        return cnt + self.save(batch, user), skipped
+
+    def save(self, batch: List[Image], user: User) -> int:
+        """Insert images of the batch, return their count."""
+        if not batch:
+            return 0
+        Image.objects.bulk_create(batch)
+        Image.forget(user.pk, [image.filename for image in batch])
+        StorageUsage.add(
+            user.pk,
+            originals_bytes=sum(os.path.getsize(image.original_path) for image in batch),
+            originals_count=len(batch),
+        )
+        self.stdout.write('.', ending='')
+        return len(batch)
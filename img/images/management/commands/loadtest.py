@@ -0,0 +1,157 @@
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from app.helpers import Size
+from images.loadtest import ApiClient, LoadRunner, OPERATIONS, RssMonitor, UPLOAD, synthetic_images
+from images.models import Image, StorageUsage
+from tokens.models import Token
+
+
+class Command(BaseCommand):
+    """Load test of the API: a mix of uploads, resizes and deletes at target concurrency.
+
+    Test users with tokens are created in DB, they are removed with their images after the test.
+    Without --url the command starts local server (runserver) and reports its RSS,
+    to measure another server pass --url and --server-pid.
+    Sample how to run: python manage.py loadtest --requests=1000 --concurrency=16 --mix=upload:5,resize:4,delete:1
+    """
+
+    @staticmethod
+    def parse_mix(mix: str) -> Dict[str, float]:
+        """Parse weights of operations."""
+        weights = {}
+        for item in mix.split(','):
+            operation, _, weight = item.partition(':')
+            if operation not in OPERATIONS:
+                raise CommandError(f'Unknown operation {operation}, use {", ".join(OPERATIONS)}')
+            try:
+                weights[operation] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Incorrect weight of {operation}')
+        if not weights.get(UPLOAD):
+            raise CommandError('Uploads are required, other operations use uploaded images')
+        return weights
+
+    @staticmethod
+    def start_server() -> Tuple[str, subprocess.Popen]:
+        """Start local server on a free port, return its URL and process."""
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        process = subprocess.Popen(
+            [sys.executable, 'manage.py', 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            cwd=settings.BASE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError('Server has not started')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return f'http://127.0.0.1:{port}', process
+            except OSError:
+                time.sleep(0.1)
+        process.terminate()
+        raise CommandError('Server has not started in 30 seconds')
+
+    @staticmethod
+    def create_users(cnt: int) -> List[Token]:
+        """Create test users with tokens."""
+        tokens = []
+        for _ in range(cnt):
+            user = User.objects.create_user(username=f'loadtest-{uuid4().hex[:12]}', password=uuid4().hex)
+            tokens.append(Token.objects.create(user=user, token=uuid4().hex))
+        return tokens
+
+    @staticmethod
+    def remove_users(tokens: List[Token]) -> None:
+        """Remove test users, their tokens and images."""
+        users = [token.user for token in tokens]
+        for image in Image.all_objects.filter(user__in=users).select_related('user'):
+            image.delete()
+        Token.objects.filter(user__in=users).delete()
+        StorageUsage.objects.filter(user__in=users).delete()
+        User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--url', help='URL of the server, local server is started if not set')
+        parser.add_argument('--server-pid', type=int, help='PID of the server to report its RSS')
+        parser.add_argument('--host', help='Host header (the first of ALLOWED_HOSTS by default)')
+        parser.add_argument('--users', type=int, default=4)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=500, help='Count of requests')
+        parser.add_argument('--duration', type=float, default=0, help='Seconds to run (instead of count of requests)')
+        parser.add_argument('--mix', default='upload:5,resize:4,delete:1', help='Weights of operations')
+        parser.add_argument('--sizes', default='200x200,800x600', help='Sizes of uploads and resizes')
+        parser.add_argument('--corpus', type=int, default=10, help='Count of synthetic images')
+        parser.add_argument('--image-size', default='1920x1080', help='Size of synthetic images')
+        parser.add_argument('--format', default='JPEG', help='Format of synthetic images')  # noqa: A003
+        parser.add_argument('--keep', action='store_true', help="Don't remove test users and their images")
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        weights = self.parse_mix(options['mix'])
+        sizes = Size.list_from_str(options['sizes'])
+        if not sizes:
+            raise CommandError('At least one size is required')
+        if options['users'] < 1 or options['concurrency'] < 1:
+            raise CommandError('Users and concurrency should be greater than 0')
+
+        self.stdout.write(f'Creating {options["corpus"]} synthetic images {options["image_size"]}')
+        corpus = synthetic_images(
+            options['corpus'], Size.from_str(options['image_size']).as_tuple(), options['format'],
+        )
+
+        process = None
+        url = options['url']
+        pid = options['server_pid']
+        if not url:
+            url, process = self.start_server()
+            pid = process.pid
+        host = options['host'] or next((host for host in settings.ALLOWED_HOSTS if '*' not in host), None)
+
+        tokens = self.create_users(options['users'])
+        monitor = RssMonitor(pid) if pid else None
+        try:
+            if monitor:
+                monitor.start()
+            runner = LoadRunner(
+                ApiClient.factory(url, host),
+                [token.token for token in tokens],
+                corpus,
+                sizes,
+                weights,
+                options['requests'],
+                options['duration'],
+            )
+            self.stdout.write(f'Running {url} with concurrency {options["concurrency"]}')
+            started = time.monotonic()
+            stats = runner.run(options['concurrency'])
+            elapsed = time.monotonic() - started
+        finally:
+            if monitor:
+                monitor.stop()
+            if process:
+                process.terminate()
+                process.wait()
+            if not options['keep']:
+                self.remove_users(tokens)
+
+        for line in stats.report():
+            self.stdout.write(line)
+        self.stdout.write(f'Throughput: {stats.total / elapsed:.1f} requests/s ({stats.total} in {elapsed:.1f} s)')
+        if monitor and monitor.max_rss and monitor.last_rss:
+            self.stdout.write(
+                f'Server RSS: max {monitor.max_rss / 1024 / 1024:.1f} Mb, last {monitor.last_rss / 1024 / 1024:.1f} Mb'
+            )
+        else:
+            self.stdout.write('Server RSS: unknown')
@@ -0,0 +1,71 @@
+import os
+import pstats
+import sys
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.profiling import PROFILE_EXT, list_profiles
+
+
+class Command(BaseCommand):
+    """Lists, shows and removes saved profiles of requests.
+
+    Sample how to run: python manage.py profiles
+    Show the profile: python manage.py profiles 20240101-120000-000000-POST-upload-8012ms.prof
+    Download the profile: python manage.py profiles 20240101-120000-000000-POST-upload-8012ms.prof --raw > upload.prof
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('name', nargs='?', help='Name of the profile to show')
+        parser.add_argument('--raw', action='store_true', help='Write the profile file as is to stdout')
+        parser.add_argument('--sort', default='cumulative', help='Sort key of cProfile stats')
+        parser.add_argument('--limit', type=int, default=30, help='Lines of the profile to show')
+        parser.add_argument('--delete-older', type=int, metavar='DAYS', help='Remove profiles older than DAYS')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['delete_older'] is not None:
+            self.delete_older(options['delete_older'])
+        elif options['name']:
+            self.show(options['name'], options['raw'], options['sort'], options['limit'])
+        else:
+            self.show_list()
+
+    def show_list(self) -> None:
+        """List saved profiles."""
+        profiles = list_profiles()
+        for path in profiles:
+            self.stdout.write(f'{path.name}\t{path.stat().st_size}')
+        if not profiles:
+            self.stdout.write('No profiles')
+
+    def show(self, name: str, raw: bool, sort: str, limit: int) -> None:
+        """Show the profile."""
+        path = next((path for path in list_profiles() if path.name == name), None)
+        if not path:
+            raise CommandError(f'Profile {name} not found in {settings.PROFILES_DIR}')
+
+        if raw:
+            sys.stdout.buffer.write(path.read_bytes())
+        elif path.suffix == PROFILE_EXT:
+            stats = StringIO()
+            pstats.Stats(str(path), stream=stats).sort_stats(sort).print_stats(limit)
+            self.stdout.write(stats.getvalue())
+        else:
+            with open(path) as profile:
+                for line in list(profile)[:limit]:
+                    self.stdout.write(line.rstrip('\n'))
+
+    def delete_older(self, days: int) -> None:
+        """Remove old profiles."""
+        deadline = time.time() - days * 24 * 60 * 60
+        cnt = 0
+        for path in list_profiles():
+            if path.stat().st_mtime < deadline:
+                os.remove(path)
+                cnt += 1
+        self.stdout.write(self.style.SUCCESS(f'Removed {cnt} profiles'))
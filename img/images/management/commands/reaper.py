@@ -0,0 +1,90 @@
+import os
+import time
+from contextlib import suppress
+from itertools import groupby
+from pathlib import Path
+from typing import List
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from app.memory import CommandWatchdog
+from images.models import Image
+from webhooks.models import WebhookEndpoint, WebhookEvent
+
+
+class Command(BaseCommand):
+    """Removes files of deleted images and their tombstones.
+
+    Images are processed by batches, directories of user's resizes are listed once per batch.
+    If files of an image can't be removed, it's retried on the next run up to --max-attempts times.
+    If RSS crosses MEMORY_SOFT_LIMIT_MB the command is restarted with --after-id of the last processed image.
+    Sample how to run: python manage.py reaper --loop
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument('--max-attempts', type=int, default=5)
+        parser.add_argument('--loop', action='store_true', help='Wait for new tombstones instead of exit')
+        parser.add_argument('--interval', type=int, default=10, help='Seconds between runs in loop mode')
+        parser.add_argument('--after-id', type=int, default=0, help='Continue after the image with this id')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['batch'] < 1:
+            raise CommandError('Batch should be greater than 1')
+
+        watchdog = CommandWatchdog(self, options, '--after-id')
+        after_id = options['after_id']
+        while True:
+            reaped, failed = self.reap(options['batch'], options['max_attempts'], after_id, watchdog)
+            after_id = 0
+            if reaped or failed:
+                self.stdout.write(self.style.SUCCESS(f'Reaped {reaped} images, failed {failed}'))
+            elif not options['loop']:
+                self.stdout.write('Nothing to reap')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def reap(self, batch_size: int, max_attempts: int, after_id: int, watchdog: CommandWatchdog) -> tuple:
+        """Process tombstones after the id once, return count of reaped and failed images."""
+        reaped = failed = 0
+        last_pk = after_id
+        while True:
+            batch = list(
+                Image.all_objects.filter(
+                    deleted_at__isnull=False, reap_attempts__lt=max_attempts, pk__gt=last_pk,
+                ).select_related('user').order_by('pk')[:batch_size]
+            )
+            if not batch:
+                return reaped, failed
+            last_pk = batch[-1].pk
+
+            done: List[int] = []
+            errors: List[int] = []
+            for _, group in groupby(sorted(batch, key=lambda image: image.user_id), key=lambda image: image.user_id):
+                images = list(group)
+                sizes: List[str] = []
+                with suppress(FileNotFoundError):
+                    sizes = os.listdir(Path(settings.RESIZES_DIR) / str(images[0].user))
+                for image in images:
+                    try:
+                        image.remove_files(sizes)
+                        done.append(image.pk)
+                    except OSError as e:
+                        self.stderr.write(f'{image}: {e}')
+                        errors.append(image.pk)
+
+            Image.all_objects.filter(pk__in=done).delete()
+            done_ids = set(done)
+            WebhookEvent.notify_many(
+                (image.user_id, WebhookEndpoint.DELETE, {'filename': image.filename})
+                for image in batch if image.pk in done_ids
+            )
+            Image.all_objects.filter(pk__in=errors).update(reap_attempts=F('reap_attempts') + 1)
+            reaped += len(done)
+            failed += len(errors)
+            watchdog.check(last_pk)
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from images.audit import iter_user_files, list_usernames
+from images.models import ColdOriginal, StorageUsage
+
+
+class Command(BaseCommand):
+    """Recounts storage usage of users from files on disk.
+
+    Directories are scanned in a pool of threads.
+    Sample how to run: python manage.py reconcile_usage --username=test
+    """
+
+    @staticmethod
+    def save(user_id: int, originals_bytes: int, originals_count: int, resizes_bytes: int, resizes_count: int) -> None:
+        """Set counters of the user."""
+        StorageUsage.objects.update_or_create(user_id=user_id, defaults={
+            'originals_bytes': originals_bytes,
+            'originals_count': originals_count,
+            'resizes_bytes': resizes_bytes,
+            'resizes_count': resizes_count,
+            'reconciled_at': timezone.now(),
+        })
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--username', type=str, help='Recount usage of the user only')
+        parser.add_argument('--workers', type=int, default=16, help='Threads scanning directories')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['workers'] < 1:
+            raise CommandError('Workers should be greater than 1')
+
+        users = User.objects.all()
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user_ids = dict(users.values_list('username', 'pk'))
+        usernames = sorted(set(list_usernames()) & set(user_ids))
+        if options['username'] and not user_ids:
+            raise CommandError('User not found')
+
+        # users without files
+        for username in set(user_ids) - set(usernames):
+            self.save(user_ids[username], 0, 0, 0, 0)
+
+        cnt = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for user_files in iter_user_files(usernames, executor):
+                resizes = [entry for entries in user_files.resizes.values() for entry in entries]
+                # originals in the cold tier are counted by their sizes before compression
+                cold_sizes = dict(ColdOriginal.objects.filter(
+                    image__user_id=user_ids[user_files.username],
+                ).values_list('image__filename', 'size'))
+                self.save(
+                    user_ids[user_files.username],
+                    sum(cold_sizes.get(entry.name, entry.size) for entry in user_files.originals),
+                    len(user_files.originals),
+                    sum(entry.size for entry in resizes),
+                    len(resizes),
+                )
+                cnt += 1
+                self.stdout.write('.', ending='')
+
+        if cnt > 0:
+            self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f'Recounted usage of {len(user_ids)} users'))
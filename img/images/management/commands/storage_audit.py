@@ -0,0 +1,99 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.helpers import Size
+from app.memory import CommandWatchdog
+from images.audit import (
+    Auditor, CORRUPT_RESIZE, EMPTY_RESIZE, ISSUES, Issue, MISSING_ORIGINAL, ORPHAN_ORIGINAL, ORPHAN_RESIZE,
+)
+from images.models import Image
+
+
+class Command(BaseCommand):
+    """Finds inconsistencies between files in storage and images in DB.
+
+    Reports orphaned originals and resizes, images without originals, empty and corrupt resizes.
+    Directories are scanned in a pool of threads, rows are streamed from DB by chunks.
+    Users are audited in the order of usernames, if RSS crosses MEMORY_SOFT_LIMIT_MB the command is restarted
+    with --after-user of the last audited user (counts of the report are of the new process).
+    Sample how to run: python manage.py storage_audit --verify --repair --cleanup
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--workers', type=int, default=16, help='Threads scanning directories')
+        parser.add_argument('--chunk', type=int, default=2000, help='Rows fetched from DB at once')
+        parser.add_argument('--verify', action='store_true', help='Check that resizes can be read as images')
+        parser.add_argument('--min-age', type=int, default=3600, help='Ignore orphans modified in last seconds')
+        parser.add_argument('--repair', action='store_true', help='Recreate empty and corrupt resizes')
+        parser.add_argument('--cleanup', action='store_true', help='Remove orphaned files')
+        parser.add_argument('--delete-missing', action='store_true', help='Delete images without originals')
+        parser.add_argument('--after-user', type=str, default='', help='Continue after the user with this username')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['workers'] < 1:
+            raise CommandError('Workers should be greater than 1')
+        if options['chunk'] < 1:
+            raise CommandError('Chunk should be greater than 1')
+
+        started = time.monotonic()
+        counts: Counter = Counter()
+        watchdog = CommandWatchdog(self, options, '--after-user')
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            auditor = Auditor(
+                executor, options['verify'], options['min_age'], options['chunk'],
+                after_username=options['after_user'], user_done=watchdog.check,
+            )
+            for issue in auditor.issues():
+                counts[issue.kind] += 1
+                action = self.fix(issue, options)
+                self.stdout.write(f'{issue.kind}: {issue.path}' + (f' ({action})' if action else ''))
+
+        elapsed = max(time.monotonic() - started, 0.001)
+        self.stdout.write('')
+        self.stdout.write(
+            f'Scanned {auditor.files} files and {auditor.rows} rows in {elapsed:.1f} s '
+            f'({auditor.files / elapsed:.0f} files per second)'
+        )
+        for kind in ISSUES:
+            self.stdout.write(f'{kind}: {counts[kind]}')
+        if counts:
+            self.stdout.write(self.style.WARNING(f'Found {sum(counts.values())} issues'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No issues found'))
+
+    def fix(self, issue: Issue, options) -> str:
+        """Repair or clean up the issue if it's asked, return description of the action."""
+        if issue.kind in (ORPHAN_ORIGINAL, ORPHAN_RESIZE) and options['cleanup']:
+            # the file may be removed since the scan, e.g. by deletion of the image
+            with suppress(FileNotFoundError):
+                os.remove(issue.path)
+            return 'removed'
+
+        if issue.kind in (EMPTY_RESIZE, CORRUPT_RESIZE) and (options['repair'] or options['cleanup']):
+            image = Image.objects.select_related('user').filter(
+                user__username=issue.username, filename=issue.filename,
+            ).first()
+            if options['repair'] and image:
+                try:
+                    image.resize(Size.from_str(issue.path.parent.name), notify=False)
+                    return 'repaired'
+                except (ValueError, OSError) as e:
+                    self.stderr.write(f'Can not repair {issue.path}: {e}')
+            if options['cleanup']:
+                with suppress(FileNotFoundError):
+                    os.remove(issue.path)
+                return 'removed'
+
+        if issue.kind == MISSING_ORIGINAL and options['delete_missing']:
+            for image in Image.objects.filter(user__username=issue.username, filename=issue.filename):
+                image.delete()
+            return 'deleted'
+
+        return ''
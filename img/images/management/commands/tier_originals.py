@@ -0,0 +1,140 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import QuerySet
+
+from app.memory import CommandWatchdog
+from images.models import ColdOriginal, Image
+from images.storage import file_size
+from images.tiering import CODECS, compress, find_cold
+
+
+class Command(BaseCommand):
+    """Moves originals which weren't read for a number of days to the cold tier.
+
+    Originals are compressed in a pool of threads (compressors release GIL), they are restored on the first read.
+    If RSS crosses MEMORY_SOFT_LIMIT_MB the command is restarted with --after-id of the last processed image.
+    Sample how to run: python manage.py tier_originals --days=90 --codec=zstd --dry-run
+    """
+
+    @staticmethod
+    def last_access(image: Image) -> float:
+        """Return time of the last read of the original, zero if there is no file."""
+        try:
+            stat = os.stat(image.original_path)  # type: ignore
+        except FileNotFoundError:
+            return 0
+        return max(stat.st_atime, stat.st_mtime)
+
+    @staticmethod
+    def mb(size: int) -> str:
+        """Return size in Mb."""
+        return f'{size / 1024 ** 2:.1f} Mb'
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--days', type=int, default=settings.COLD_ORIGINALS_DAYS, help='Days without reads')
+        parser.add_argument('--codec', choices=CODECS, default=settings.COLD_ORIGINALS_CODEC)
+        parser.add_argument('--min-saving', type=float, default=0.1, help='Less compressed originals are moved as is')
+        parser.add_argument('--username', type=str, help='Move originals of the user only')
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument('--batch', type=int, default=500)
+        parser.add_argument('--after-id', type=int, default=0, help='Continue after the image with this id')
+        parser.add_argument('--dry-run', action='store_true', help='Report originals to move without moving them')
+        parser.add_argument('--stats', action='store_true', help='Only report space saved by the cold tier')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if not settings.COLD_ORIGINALS_DIR:
+            raise CommandError('COLD_ORIGINALS_DIR is not set')
+        if options['workers'] < 1:
+            raise CommandError('Workers should be greater than 1')
+        if options['batch'] < 1:
+            raise CommandError('Batch should be greater than 1')
+        if options['stats']:
+            self.write_stats()
+            return
+
+        images = Image.objects.filter(cold_original__isnull=True).select_related('user').order_by('pk')
+        if options['username']:
+            images = images.filter(user__username=options['username'])
+
+        watchdog = CommandWatchdog(self, options, '--after-id')
+        moved = self.tier(images, time.time() - options['days'] * 86400, options, watchdog)
+        size = sum(row.size for row in moved)
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Would move {len(moved)} originals, {self.mb(size)}'))
+            return
+        stored_size = sum(row.stored_size for row in moved)
+        self.stdout.write(self.style.SUCCESS(
+            f'Moved {len(moved)} originals, {self.mb(size)} stored in {self.mb(stored_size)}',
+        ))
+        self.write_stats()
+
+    def tier(self, images: QuerySet, threshold: float, options, watchdog: CommandWatchdog) -> List[ColdOriginal]:
+        """Move idle originals by batches, return rows of moved ones (unsaved in dry run)."""
+        moved: List[ColdOriginal] = []
+        last_pk = options['after_id']
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = list(images.filter(pk__gt=last_pk)[:options['batch']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                idle = [image for image in batch if 0 < self.last_access(image) < threshold]
+                if options['dry_run']:
+                    moved += [ColdOriginal(image=image, size=file_size(image.original_path)) for image in idle]
+                    watchdog.check(last_pk)
+                    continue
+
+                rows = [row for row in executor.map(lambda image: self.move(image, options), idle) if row]
+                rows = self.skip_accessed(rows, threshold)
+                ColdOriginal.objects.bulk_create(rows)
+                for row in rows:
+                    with suppress(FileNotFoundError):
+                        os.remove(row.image.original_path)  # type: ignore
+                moved += rows
+                watchdog.check(last_pk)
+        return moved
+
+    def move(self, image: Image, options) -> Optional[ColdOriginal]:
+        """Write the original to the cold tier, return unsaved row."""
+        try:
+            size = file_size(image.original_path)
+            path, codec = compress(
+                image.original_path, str(image.user), image.filename, options['codec'], options['min_saving'],
+            )
+        except OSError as e:
+            self.stderr.write(f'Can not move {image.original_path}: {e}')
+            return None
+        return ColdOriginal(image=image, codec=codec, size=size, stored_size=file_size(path))
+
+    def skip_accessed(self, rows: List[ColdOriginal], threshold: float) -> List[ColdOriginal]:
+        """Return rows of originals which weren't read while they were compressed.
+
+        Copies of originals read meanwhile are removed from the cold tier, the originals stay.
+        """
+        result = []
+        for row in rows:
+            if self.last_access(row.image) < threshold:
+                result.append(row)
+                continue
+            cold = find_cold(str(row.image.user), row.image.filename)
+            if cold:
+                os.remove(cold[0])
+        return result
+
+    def write_stats(self) -> None:
+        """Write space saved by the cold tier."""
+        stats = ColdOriginal.stats()
+        saved = stats['size'] - stats['stored_size']
+        ratio = saved / stats['size'] if stats['size'] else 0
+        self.stdout.write(
+            f'Cold tier: {stats["count"]} originals, {self.mb(stats["size"])} stored in '
+            f'{self.mb(stats["stored_size"])}, saved {self.mb(saved)} ({ratio:.0%})'
+        )
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:14
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import images.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('images', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResizePreset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField()),
+                ('sizes', models.CharField(help_text='Comma separated sizes "{WIDTH}x{HEIGHT}". Example: 700x600,1024x768', max_length=1024, validators=[images.validators.validate_sizes])),
+                ('auto_apply', models.BooleanField(default=True, help_text='Create sizes of the preset on every upload')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='resize_presets', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['user_id', 'name'],
+                'unique_together': {('user', 'name')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PresetBackfill',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done')], default='pending', max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('last_image_id', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('preset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backfills', to='images.resizepreset')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
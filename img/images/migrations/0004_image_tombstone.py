@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0003_image_placeholder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='reap_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
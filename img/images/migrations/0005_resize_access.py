@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0004_image_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccessLogPosition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(max_length=1024, unique=True)),
+                ('inode', models.BigIntegerField(default=0)),
+                ('offset', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['path'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResizeAccess',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('size', models.CharField(max_length=20)),
+                ('hits', models.PositiveBigIntegerField(default=0)),
+                ('last_access', models.DateTimeField(blank=True, null=True)),
+                ('evicted_at', models.DateTimeField(blank=True, null=True)),
+                ('image', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accesses', to='images.image')),
+            ],
+            options={
+                'ordering': ['image_id', 'size'],
+                'unique_together': {('image', 'size')},
+            },
+        ),
+    ]
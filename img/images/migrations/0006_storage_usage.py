@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('images', '0005_resize_access'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageUsage',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.PROTECT, primary_key=True, related_name='storage_usage', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('originals_bytes', models.PositiveBigIntegerField(default=0)),
+                ('originals_count', models.PositiveBigIntegerField(default=0)),
+                ('resizes_bytes', models.PositiveBigIntegerField(default=0)),
+                ('resizes_count', models.PositiveBigIntegerField(default=0)),
+                ('max_bytes', models.PositiveBigIntegerField(blank=True, help_text='Empty value – no limit', null=True)),
+                ('max_files', models.PositiveBigIntegerField(blank=True, help_text='Empty value – no limit', null=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['user_id'],
+            },
+        ),
+    ]
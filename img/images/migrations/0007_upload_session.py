@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import images.validators
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('images', '0006_storage_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('original_filename', models.CharField(max_length=256)),
+                ('size', models.PositiveBigIntegerField(help_text='Bytes of the whole file')),
+                ('offset', models.PositiveBigIntegerField(default=0, help_text='Bytes already received')),
+                ('sizes', models.CharField(blank=True, max_length=1024, validators=[images.validators.validate_sizes])),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 11:48
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import images.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('images', '0007_upload_session'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SizePolicy',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='size_policy', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('mode', models.CharField(choices=[('any', 'Any size'), ('allow_list', 'Only allowed sizes'), ('step', 'Sides rounded up to the step'), ('presets', 'Snapped up to the nearest size of presets')], default='any', max_length=10)),
+                ('allowed_sizes', models.CharField(blank=True, help_text='Allowed sizes in "allow list" mode. Example: 700x600,1024x768', max_length=1024, validators=[images.validators.validate_sizes])),
+                ('step', models.PositiveIntegerField(default=100, help_text='Step in pixels', validators=[django.core.validators.MinValueValidator(1)])),
+            ],
+            options={
+                'verbose_name_plural': 'size policies',
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0008_size_policy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColdOriginal',
+            fields=[
+                ('image', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='cold_original', serialize=False, to='images.image')),
+                ('codec', models.CharField(blank=True, help_text='Empty value – stored uncompressed', max_length=10)),
+                ('size', models.PositiveBigIntegerField(help_text='Bytes of the original')),
+                ('stored_size', models.PositiveBigIntegerField(help_text='Bytes in the cold tier')),
+                ('moved_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-moved_at'],
+            },
+        ),
+    ]
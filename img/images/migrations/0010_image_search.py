@@ -0,0 +1,48 @@
+from django.db import migrations, models
+
+UPLOAD_DATE_INDEX = models.Index(fields=['upload_date', 'id'], name='image_upload_date_idx')
+TRIGRAM_INDEXES = {
+    'image_filename_trgm_idx': 'filename',
+    'image_original_filename_trgm_idx': 'original_filename',
+}
+
+
+def create_indexes(apps, schema_editor):
+    """Create indexes without lock of writes, trigram indexes (for icontains) only on PostgreSQL."""
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.add_index(apps.get_model('images', 'Image'), UPLOAD_DATE_INDEX)
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS image_upload_date_idx ON images_image (upload_date, id)'
+    )
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON images_image '
+            f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    """Drop indexes."""
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.remove_index(apps.get_model('images', 'Image'), UPLOAD_DATE_INDEX)
+        return
+    for name in ['image_upload_date_idx', *TRIGRAM_INDEXES]:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('images', '0009_cold_original'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+            state_operations=[migrations.AddIndex(model_name='image', index=UPLOAD_DATE_INDEX)],
+        ),
+    ]
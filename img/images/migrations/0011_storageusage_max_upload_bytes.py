@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 12:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0010_image_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storageusage',
+            name='max_upload_bytes',
+            field=models.PositiveBigIntegerField(blank=True, help_text='Max size of one upload request, empty value – UPLOAD_MAX_BYTES setting', null=True),
+        ),
+    ]
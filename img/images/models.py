@@ -1,147 +1,798 @@
+import logging
 import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import suppress
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 from urllib.parse import urljoin
 from uuid import uuid4
 
 from PIL import Image as PillowImage
 from django.conf import settings
-from django.core.files.uploadedfile import InMemoryUploadedFile
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.utils.functional import cached_property
 
 from app.helpers import Size, Sizes
+from app.lookups import CachedLookup
 from app.settings import env
+from app.timing import timed
+from images.decoded import decoded_originals
+from images.engines import get_engine
+from images.placeholders import compute_placeholder
+from images.storage import MOVE, file_size, place_file
+from images.tiering import decompress, find_cold, mark_accessed
+from images.validators import validate_sizes
+from webhooks.models import WebhookEndpoint, WebhookEvent
+
+
+logger = logging.getLogger(__name__)
+image_lookup = CachedLookup('image', settings.IMAGE_CACHE_TTL, settings.IMAGE_CACHE_MISS_TTL)
+
+
+class ImageManager(models.Manager):
+    """Manager of images which are not deleted."""
+
+    def get_queryset(self) -> models.QuerySet:
+        """Exclude tombstones."""
+        return super().get_queryset().filter(deleted_at__isnull=True)
 
 
 class Image(models.Model):
-    """Image model."""
+    """Image model.
+
+    Deleted image stays in DB as a tombstone until its files are removed by reaper command,
+    so its filename can't be reused before that.
+    """
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='images')
     filename = models.CharField(max_length=50)
     original_filename = models.CharField(max_length=256)
     upload_date = models.DateTimeField(blank=False, default=timezone.now)
+    placeholder = models.CharField(max_length=64, blank=True, help_text='BlurHash of the image')
+    dominant_color = models.CharField(max_length=7, blank=True, help_text='Color in hex notation: #rrggbb')
+    deleted_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    reap_attempts = models.PositiveSmallIntegerField(default=0)
 
-    objects = models.Manager()
+    objects = ImageManager()
+    all_objects = models.Manager()
 
     class Meta:
         """Meta class."""
 
         unique_together = [('user', 'filename')]
         ordering = ['-upload_date']
+        # trigram indexes of search in admin are created by migration on PostgreSQL only
+        indexes = [models.Index(fields=['upload_date', 'id'], name='image_upload_date_idx')]
 
     def __str__(self) -> str:
         """Model as string."""
         return f'Image {self.user}/{self.filename}'
 
-    @cached_property
-    def __walk_resizes_dir(self) -> List:
-        """Walk all resizes dir for the user."""
-        path = Path(settings.RESIZES_DIR) / str(self.user)
-        walk = list(os.walk(path))
-        return walk[1:]
-
     @property
     def resizes_data(self) -> List[Tuple[Size, str, str]]:
-        """Return list of tuples containing all data of resized images.
+        """Return list of tuples containing all data of resized images which exist on disk.
 
         Each tuple contains:
         1. Size of the image,
         2. path to local file,
         3. url to resized image.
         """
+        path = Path(settings.RESIZES_DIR) / str(self.user)
+        try:
+            sizes = [entry.name for entry in os.scandir(path) if entry.is_dir() and Size.is_valid(entry.name)]
+        except FileNotFoundError:
+            return []
+
         result = []
-        for data in self.__walk_resizes_dir:
-            if self.filename in data[2]:
-                path = Path(data[0])
-                size = Size.from_str(path.name)
-                result.append((
-                    size,
-                    str(path / str(self.filename)),
-                    self.get_url(size),
-                ))
+        for size_str in sizes:
+            resize_path = path / size_str / str(self.filename)
+            if resize_path.exists():
+                size = Size.from_str(size_str)
+                result.append((size, str(resize_path), self.get_url(size)))
         return sorted(result, key=lambda x: x[0].as_tuple())
 
     @cached_property
-    def path_to_original(self) -> Optional[Path]:
-        """Path to original image file."""
+    def original_path(self) -> Optional[Path]:
+        """Path to original image file in ORIGINALS_DIR, the original may be in the cold tier instead."""
         if not self.filename:
             return None
         return Path(settings.ORIGINALS_DIR) / str(self.user) / str(self.filename)
 
+    @cached_property
+    def path_to_original(self) -> Optional[Path]:
+        """Path to original image file, the original is restored from the cold tier if it's there."""
+        path = self.original_path
+        if path and self.pk and not path.exists():
+            self.rehydrate()
+        return path
+
     @property
     def filesize(self) -> str:
         """File size in Mb (for admin)."""
-        if not self.path_to_original:
+        if not self.original_path:
             return '–'
         try:
-            size = os.path.getsize(self.path_to_original) / 1024 / 1024
+            size = os.path.getsize(self.original_path) / 1024 / 1024
             return '{:.2f} Mb'.format(size)
         except FileNotFoundError:
-            return '–'
+            cold = ColdOriginal.objects.filter(image_id=self.pk).first()
+            return '{:.2f} Mb (cold)'.format(cold.size / 1024 / 1024) if cold else '–'
 
     @staticmethod
     def upload(
         img: PillowImage,
         sizes: Sizes,
-        uploaded_file: InMemoryUploadedFile,
+        uploaded_file: UploadedFile,
         user: settings.AUTH_USER_MODEL
     ) -> Dict:
-        """Create files in FS and creates record in DB."""
+        """Create files in FS and creates record in DB.
+
+        Sizes of the user's auto applied presets are created along with the requested ones.
+        """
+        sizes = Size.unique((sizes or []) + ResizePreset.auto_sizes(user))
+        db_image, result, usage = Image.store_upload(img, sizes, uploaded_file, user)
+        try:
+            db_image.save()
+        except Exception:
+            db_image.discard(sizes)
+            raise
+        Image.forget(user.pk, [db_image.filename])
+        StorageUsage.add(user.pk, **usage)
+
+        WebhookEvent.notify(user.pk, WebhookEndpoint.UPLOAD, {**result, 'original_filename': uploaded_file.name})
+        return result
+
+    @staticmethod
+    def upload_many(
+        uploads: List[Tuple[PillowImage, Sizes, UploadedFile]],
+        user: settings.AUTH_USER_MODEL
+    ) -> List[Union[Dict, Exception]]:
+        """Create files of several uploaded images in parallel and their records in DB by one query.
+
+        Returns results of uploads in the same order, failed upload is an exception instead of a result,
+        it doesn't affect the others.
+        """
+        auto_sizes = ResizePreset.auto_sizes(user)
+
+        def store(upload: Tuple[PillowImage, Sizes, UploadedFile]):
+            """Store files of the upload, return the exception if it fails."""
+            img, sizes, uploaded_file = upload
+            try:
+                return Image.store_upload(img, Size.unique((sizes or []) + auto_sizes), uploaded_file, user)
+            except Exception as e:
+                return e
+
+        with timed('files'):
+            with ThreadPoolExecutor(max_workers=settings.UPLOAD_WORKERS) as executor:
+                stored = list(executor.map(store, uploads))
+        succeeded = [upload for upload in stored if not isinstance(upload, Exception)]
+
+        try:
+            Image.objects.bulk_create([db_image for db_image, _, _ in succeeded])
+        except Exception:
+            for db_image, result, _ in succeeded:
+                db_image.discard(result['sizes'] or {})
+            raise
+        Image.forget(user.pk, [db_image.filename for db_image, _, _ in succeeded])
+        StorageUsage.add(user.pk, **sum((Counter(usage) for _, _, usage in succeeded), Counter()))
+
+        WebhookEvent.notify_many(
+            (user.pk, WebhookEndpoint.UPLOAD, {**upload[1], 'original_filename': uploaded_file.name})
+            for (_, _, uploaded_file), upload in zip(uploads, stored) if not isinstance(upload, Exception)
+        )
+        return [upload if isinstance(upload, Exception) else upload[1] for upload in stored]
+
+    @staticmethod
+    def store_upload(
+        img: PillowImage,
+        sizes: Sizes,
+        uploaded_file: UploadedFile,
+        user: settings.AUTH_USER_MODEL
+    ) -> Tuple['Image', Dict, Dict[str, int]]:
+        """Write the original and resizes of uploaded image without DB queries.
+
+        Returns unsaved image, result of the upload and changes of the user's storage usage.
+        Written files are removed if something fails.
+        """
         # save original file
         ext = img.format.lower()
         filename = f'{uuid4().hex}.{ext}'
-        originals_path = Path(settings.ORIGINALS_DIR) / str(user)
-        os.makedirs(originals_path, exist_ok=True)
-        with open(originals_path / filename, 'wb+') as destination:
-            for chunk in uploaded_file.chunks():
-                destination.write(chunk)
-
-        # save info in DB
-        db_image: Image = Image.objects.create(user=user, filename=filename, original_filename=uploaded_file.name)
-
-        # creating resizes
-        sizes_urls = {}
-        if sizes:
-            for size in sizes:
+        db_image = Image(user=user, filename=filename, original_filename=uploaded_file.name)
+        os.makedirs(db_image.original_path.parent, exist_ok=True)
+        written = 0
+        try:
+            with timed('write'):
+                if hasattr(uploaded_file, 'temporary_file_path'):
+                    # big uploads are already on disk, they are moved instead of copying
+                    place_file(Path(uploaded_file.temporary_file_path()), db_image.original_path, MOVE)
+                    os.chmod(db_image.original_path, settings.FILE_UPLOAD_PERMISSIONS or 0o644)
+                    written = file_size(db_image.original_path)
+                else:
+                    with open(db_image.original_path, 'wb+') as destination:
+                        for chunk in uploaded_file.chunks():
+                            destination.write(chunk)
+                            written += len(chunk)
+
+            with timed('placeholder'):
+                db_image.placeholder, db_image.dominant_color = compute_placeholder(img)
+
+            # creating resizes
+            sizes_urls = {}
+            resizes_bytes = resizes_count = 0
+            for size in sizes or []:
                 size_str = str(size)
                 try:
-                    sizes_urls[size_str] = db_image.resize(size, img)
+                    size_bytes, size_count = db_image.write_resize(size, img)
+                    resizes_bytes += size_bytes
+                    resizes_count += size_count
+                    sizes_urls[size_str] = db_image.get_url(size)
                 except OSError as e:
                     sizes_urls[size_str] = str(e)
+        except Exception:
+            db_image.discard(sizes or [])
+            raise
 
-        return {
+        result = {
             'filename': filename,
             'sizes': sizes_urls if sizes_urls else None,
+            'placeholder': db_image.placeholder,
+            'dominant_color': db_image.dominant_color,
         }
+        usage = {
+            'originals_bytes': written,
+            'originals_count': 1,
+            'resizes_bytes': resizes_bytes,
+            'resizes_count': resizes_count,
+        }
+        return db_image, result, usage
+
+    @staticmethod
+    def lookup(user: settings.AUTH_USER_MODEL, filename: str) -> Optional['Image']:
+        """Return image of the user by filename, images are cached."""
+        return image_lookup.get(
+            f'{user.pk}:{filename}', lambda: Image.objects.filter(user=user, filename=filename).first(),
+        )
+
+    @staticmethod
+    def forget(user_id: int, filenames: Iterable[str]) -> None:
+        """Remove images from the cache of lookups, it's called when images are created or deleted."""
+        image_lookup.forget(*[f'{user_id}:{filename}' for filename in filenames])
 
     def get_url(self, size: Size) -> str:
         """Return absolute URL to resized image."""
         base_url = env('BASE_URL', '')
         return urljoin(base_url, f'{self.user}/{size}/{self.filename}')
 
-    def resize(self, size: Size, image=None) -> str:
-        """Resize original image to certain size."""
-        size_path = Path(settings.RESIZES_DIR) / str(self.user) / str(size)
-        os.makedirs(size_path, exist_ok=True)
-        if not image:
-            img = PillowImage.open(self.path_to_original)
-        else:
-            img = image.copy()
-        img.thumbnail(size.as_tuple())
-        img.save(str(size_path / str(self.filename)), img.format)
-        return self.get_url(size)
+    def path_to_resize(self, size: Size) -> Path:
+        """Path to resized image file."""
+        return Path(settings.RESIZES_DIR) / str(self.user) / str(size) / str(self.filename)
+
+    def resize(self, size: Size, image=None, notify: bool = True, keep_decoded: bool = False) -> str:
+        """Resize original image to certain size, webhooks of the user are notified unless it's a part of upload.
+
+        Keep_decoded is set if other sizes of the image follow, so the original isn't decoded again.
+        """
+        resizes_bytes, resizes_count = self.write_resize(size, image, keep_decoded)
+        StorageUsage.add(self.user_id, resizes_bytes=resizes_bytes, resizes_count=resizes_count)
+        url = self.get_url(size)
+        if notify:
+            WebhookEvent.notify(
+                self.user_id, WebhookEndpoint.RESIZE, {'filename': self.filename, 'size': str(size), 'url': url},
+            )
+        return url
+
+    def write_resize(self, size: Size, image=None, keep_decoded: bool = False) -> Tuple[int, int]:
+        """Create resized image file without DB queries, return changes of bytes and count of user's resizes."""
+        path = self.path_to_resize(size)
+        os.makedirs(path.parent, exist_ok=True)
+        old_size = file_size(path)
+        if image is None:
+            mark_accessed(self.path_to_original)
+        get_engine().resize(self.path_to_original, size, path, image, keep_decoded)
+
+        new_size = file_size(path)
+        return new_size - old_size, bool(new_size) - bool(old_size)
+
+    def remove_files(self, sizes: Optional[List[str]] = None) -> None:
+        """Remove original and resized images from FS.
+
+        Sizes are names of directories with resizes of the user, they are listed if not given.
+        """
+        originals_bytes = originals_count = resizes_bytes = resizes_count = 0
+        decoded_originals.invalidate(self.original_path)
+        with suppress(FileNotFoundError):
+            removed = file_size(self.original_path)
+            os.remove(self.original_path)
+            originals_bytes, originals_count = removed, 1
+        cold = find_cold(str(self.user), self.filename)
+        if cold:
+            cold_original = ColdOriginal.objects.filter(image_id=self.pk).first()
+            with suppress(FileNotFoundError):
+                removed = cold_original.size if cold_original else file_size(cold[0])
+                os.remove(cold[0])
+                originals_bytes, originals_count = removed, 1
+
+        resizes_path = Path(settings.RESIZES_DIR) / str(self.user)
+        if sizes is None:
+            with suppress(FileNotFoundError):
+                sizes = os.listdir(resizes_path)
+        for size in sizes or []:
+            with suppress(FileNotFoundError):
+                removed = file_size(resizes_path / size / str(self.filename))
+                os.remove(resizes_path / size / str(self.filename))
+                resizes_bytes += removed
+                resizes_count += 1
+
+        StorageUsage.add(
+            self.user_id,
+            originals_bytes=-originals_bytes,
+            originals_count=-originals_count,
+            resizes_bytes=-resizes_bytes,
+            resizes_count=-resizes_count,
+        )
+
+    def discard(self, sizes: Iterable) -> None:
+        """Remove files of the image which isn't saved yet, without DB queries."""
+        for path in [self.original_path] + [self.path_to_resize(size) for size in sizes]:
+            with suppress(FileNotFoundError):
+                os.remove(path)
+
+    def rehydrate(self) -> bool:
+        """Restore the original from the cold tier, return False if it isn't there."""
+        cold = find_cold(str(self.user), self.filename)
+        if not cold:
+            return False
+        try:
+            decompress(*cold, self.original_path)
+        except FileNotFoundError:
+            # restored by a concurrent request
+            return self.original_path.exists()
+        ColdOriginal.objects.filter(image_id=self.pk).delete()
+        with suppress(FileNotFoundError):
+            os.remove(cold[0])
+        return True
+
+    def tombstone(self) -> None:
+        """Mark image as deleted, its files are removed later by reaper command."""
+        self.deleted_at = timezone.now()
+        Image.all_objects.filter(pk=self.pk).update(deleted_at=self.deleted_at)
+        Image.forget(self.user_id, [self.filename])
 
     def delete(self, using=None, keep_parents: bool = False):
         """Delete image from FS and DB."""
-        with suppress(FileNotFoundError):
-            # deleting original file
-            os.remove(self.path_to_original)
-            # deleting resized images
-            for data in self.resizes_data:
-                os.remove(data[1])
+        self.remove_files()
 
         # after that delete record in DB
-        return super().delete(using, keep_parents)
+        result = super().delete(using, keep_parents)
+        Image.forget(self.user_id, [self.filename])
+        return result
+
+
+class ResizePreset(models.Model):
+    """Named list of sizes of the user.
+
+    Sizes of auto applied presets are created on every upload,
+    when such preset gains a size, it is backfilled for already uploaded images.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='resize_presets')
+    name = models.SlugField(max_length=50)
+    sizes = models.CharField(
+        max_length=1024,
+        validators=[validate_sizes],
+        help_text='Comma separated sizes "{WIDTH}x{HEIGHT}". Example: 700x600,1024x768',
+    )
+    auto_apply = models.BooleanField(default=True, help_text='Create sizes of the preset on every upload')
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        unique_together = [('user', 'name')]
+        ordering = ['user_id', 'name']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Preset {self.user}/{self.name}'
+
+    @property
+    def sizes_list(self) -> List[Size]:
+        """Return sizes of the preset."""
+        return Size.list_from_str(self.sizes)
+
+    @classmethod
+    def all_sizes(cls, user_id: int) -> List[Size]:
+        """Return sizes of all presets of the user."""
+        sizes: List[Size] = []
+        for preset in cls.objects.filter(user_id=user_id):
+            sizes += preset.sizes_list
+        return Size.unique(sizes)
+
+    @classmethod
+    def auto_sizes(cls, user: settings.AUTH_USER_MODEL) -> List[Size]:
+        """Return sizes of all auto applied presets of the user."""
+        sizes: List[Size] = []
+        for preset in cls.objects.filter(user=user, auto_apply=True):
+            sizes += preset.sizes_list
+        return Size.unique(sizes)
+
+    def save(self, *args, **kwargs) -> None:
+        """Save preset and schedule backfill of gained sizes."""
+        old_sizes = set()
+        if self.pk:
+            old = ResizePreset.objects.filter(pk=self.pk).values('sizes', 'auto_apply').first()
+            if old and old['auto_apply']:
+                old_sizes = {str(size) for size in Size.list_from_str(old['sizes'])}
+
+        super().save(*args, **kwargs)
+
+        if not self.auto_apply:
+            return
+        gained = [size for size in Size.unique(self.sizes_list) if str(size) not in old_sizes]
+        total = Image.objects.filter(user_id=self.user_id).count()
+        if gained and total:
+            PresetBackfill.objects.bulk_create([
+                PresetBackfill(preset=self, size=str(size), total=total) for size in gained
+            ])
+
+
+class PresetBackfill(models.Model):
+    """Creation of a gained preset size for already uploaded images.
+
+    Processed by management command backfill_presets.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+    )
+
+    preset = models.ForeignKey(ResizePreset, on_delete=models.CASCADE, related_name='backfills')
+    size = models.CharField(max_length=20)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    last_image_id = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        ordering = ['created_at']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Backfill {self.preset.user}/{self.preset.name}/{self.size}'
+
+    @property
+    def progress(self) -> str:
+        """Progress in percents (for admin)."""
+        if not self.total:
+            return '–'
+        percents = min(self.processed, self.total) / self.total * 100
+        return f'{self.processed}/{self.total} ({percents:.0f}%)'
+
+    def process(self, limit: int) -> int:
+        """Create the size for next images of the user, return count of processed images.
+
+        Image which can't be resized (e.g. its original is corrupt) is counted as failed and skipped.
+        """
+        size = Size.from_str(self.size)
+        images = Image.objects.filter(
+            user_id=self.preset.user_id, pk__gt=self.last_image_id,
+        ).select_related('user').order_by('pk')[:limit]
+
+        cnt = 0
+        for image in images:
+            try:
+                if not os.path.exists(image.path_to_resize(size)):
+                    image.resize(size)
+            except Exception:
+                logger.exception('Backfill of %s for image %s failed', self.size, image.pk)
+                self.failed += 1
+            self.processed += 1
+            self.last_image_id = image.pk
+            cnt += 1
+
+        if cnt < limit:
+            self.status = self.DONE
+            self.finished_at = timezone.now()
+        else:
+            self.status = self.RUNNING
+        self.save()
+
+        return cnt
+
+
+class ResizeAccess(models.Model):
+    """Access statistics of a resized image, collected from access logs.
+
+    Resize evicted from disk is kept here to be recreated on demand.
+    """
+
+    image = models.ForeignKey(Image, on_delete=models.CASCADE, related_name='accesses')
+    size = models.CharField(max_length=20)
+    hits = models.PositiveBigIntegerField(default=0)
+    last_access = models.DateTimeField(null=True, blank=True)
+    evicted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        unique_together = [('image', 'size')]
+        ordering = ['image_id', 'size']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Access {self.image_id}/{self.size}'
+
+
+class AccessLogPosition(models.Model):
+    """Position of already processed part of an access log."""
+
+    path = models.CharField(max_length=1024, unique=True)
+    inode = models.BigIntegerField(default=0)
+    offset = models.BigIntegerField(default=0)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        ordering = ['path']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'{self.path}:{self.offset}'
+
+
+class StorageUsage(models.Model):
+    """Storage used by the user and its limits.
+
+    Counters are changed along with files, reconcile_usage command recounts them from disk.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.PROTECT, primary_key=True, related_name='storage_usage',
+    )
+    originals_bytes = models.PositiveBigIntegerField(default=0)
+    originals_count = models.PositiveBigIntegerField(default=0)
+    resizes_bytes = models.PositiveBigIntegerField(default=0)
+    resizes_count = models.PositiveBigIntegerField(default=0)
+    max_bytes = models.PositiveBigIntegerField(null=True, blank=True, help_text='Empty value – no limit')
+    max_files = models.PositiveBigIntegerField(null=True, blank=True, help_text='Empty value – no limit')
+    max_upload_bytes = models.PositiveBigIntegerField(
+        null=True, blank=True, help_text='Max size of one upload request, empty value – UPLOAD_MAX_BYTES setting',
+    )
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        ordering = ['user_id']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Storage of {self.user}'
+
+    @property
+    def used_bytes(self) -> int:
+        """Bytes used by originals and resizes."""
+        return self.originals_bytes + self.resizes_bytes
+
+    @property
+    def used_files(self) -> int:
+        """Count of originals and resizes."""
+        return self.originals_count + self.resizes_count
+
+    @property
+    def max_upload(self) -> int:
+        """Max bytes of one upload request, zero if there is no limit."""
+        return settings.UPLOAD_MAX_BYTES if self.max_upload_bytes is None else self.max_upload_bytes
+
+    @classmethod
+    def add(cls, user_id: int, **deltas: int) -> None:
+        """Change counters of the user atomically, counters can't be less than zero."""
+        changes = {name: Greatest(F(name) + delta, Value(0)) for name, delta in deltas.items() if delta}
+        if not changes:
+            return
+        if not cls.objects.filter(user_id=user_id).update(**changes):
+            cls.objects.get_or_create(user_id=user_id)
+            cls.objects.filter(user_id=user_id).update(**changes)
+
+    def allows(self, upload_size: int) -> bool:
+        """Check that upload of certain size fits into limits."""
+        if self.max_bytes is not None and self.used_bytes + upload_size > self.max_bytes:
+            return False
+        if self.max_files is not None and self.used_files + 1 > self.max_files:
+            return False
+        return True
+
+
+class SizePolicy(models.Model):
+    """Sizes which the user can request, limits count of resize variants.
+
+    Requested sizes are replaced by allowed ones, API returns the actual sizes.
+    Sizes of presets are never changed.
+    """
+
+    ANY = 'any'
+    ALLOW_LIST = 'allow_list'
+    STEP = 'step'
+    PRESETS = 'presets'
+    MODES = (
+        (ANY, 'Any size'),
+        (ALLOW_LIST, 'Only allowed sizes'),
+        (STEP, 'Sides rounded up to the step'),
+        (PRESETS, 'Snapped up to the nearest size of presets'),
+    )
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='size_policy',
+    )
+    mode = models.CharField(max_length=10, choices=MODES, default=ANY)
+    allowed_sizes = models.CharField(
+        max_length=1024,
+        blank=True,
+        validators=[validate_sizes],
+        help_text='Allowed sizes in "allow list" mode. Example: 700x600,1024x768',
+    )
+    step = models.PositiveIntegerField(default=100, validators=[MinValueValidator(1)], help_text='Step in pixels')
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        verbose_name_plural = 'size policies'
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Size policy {self.user}'
+
+    @classmethod
+    def snap_sizes(cls, user: settings.AUTH_USER_MODEL, sizes: Sizes) -> Sizes:
+        """Apply policy of the user to the sizes, duplicates are removed.
+
+        Raises ValidationError if a size is not allowed.
+        """
+        policy = cls.objects.filter(user=user).first()
+        if not policy or not sizes:
+            return sizes
+        return Size.unique([policy.snap(size) for size in sizes])
+
+    def clean(self) -> None:
+        """Validate the policy."""
+        if self.mode == self.ALLOW_LIST and not self.allowed_sizes:
+            raise ValidationError({'allowed_sizes': 'At least one size is required'})
+
+    def snap(self, size: Size) -> Size:
+        """Return size which is served instead of the requested one.
+
+        Raises ValidationError if the size is not allowed.
+        """
+        if self.mode == self.ALLOW_LIST:
+            if str(size) not in self.allowed_sizes.split(','):
+                raise ValidationError(
+                    'Size %(value)s is not allowed, allowed sizes: %(allowed)s',
+                    params={'value': size, 'allowed': self.allowed_sizes},
+                )
+        elif self.mode == self.STEP:
+            return size.round_up(self.step)
+        elif self.mode == self.PRESETS:
+            return size.snap_up(ResizePreset.all_sizes(self.user_id)) or size
+        return size
+
+
+class UploadSession(models.Model):
+    """Resumable upload of a big original.
+
+    Chunks are appended to a staging file, image is created from the file when the upload is finalized.
+    Expired sessions are removed by cleanup_uploads command.
+    """
+
+    key = models.UUIDField(default=uuid4, unique=True, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='upload_sessions')
+    original_filename = models.CharField(max_length=256)
+    size = models.PositiveBigIntegerField(help_text='Bytes of the whole file')
+    offset = models.PositiveBigIntegerField(default=0, help_text='Bytes already received')
+    sizes = models.CharField(max_length=1024, blank=True, validators=[validate_sizes])
+    created_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        ordering = ['created_at']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Upload {self.user}/{self.key}'
+
+    @property
+    def path(self) -> Path:
+        """Path to the staging file."""
+        return Path(settings.UPLOADS_STAGING_DIR) / self.key.hex
+
+    @property
+    def progress(self) -> str:
+        """Progress in percents (for admin)."""
+        return f'{self.offset}/{self.size} ({self.offset / self.size * 100:.0f}%)'
+
+    @staticmethod
+    def expiration() -> datetime:
+        """Return expiration time of a session active now."""
+        return timezone.now() + timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+
+    def as_dict(self) -> Dict:
+        """Return state of the upload for API."""
+        return {
+            'session': self.key.hex,
+            'offset': self.offset,
+            'size': self.size,
+            'expires_at': self.expires_at.isoformat(),
+        }
+
+    def remove(self) -> None:
+        """Remove the session and its staging file."""
+        with suppress(FileNotFoundError):
+            os.remove(self.path)
+        self.delete()
+
+
+class ColdOriginal(models.Model):
+    """Original moved to the cold tier by tier_originals command.
+
+    Row is removed when the original is restored, sizes are kept for statistics of saved space.
+    """
+
+    image = models.OneToOneField(Image, on_delete=models.CASCADE, primary_key=True, related_name='cold_original')
+    codec = models.CharField(max_length=10, blank=True, help_text='Empty value – stored uncompressed')
+    size = models.PositiveBigIntegerField(help_text='Bytes of the original')
+    stored_size = models.PositiveBigIntegerField(help_text='Bytes in the cold tier')
+    moved_at = models.DateTimeField(default=timezone.now)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        ordering = ['-moved_at']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Cold original {self.image_id}'
+
+    @property
+    def saved_bytes(self) -> int:
+        """Bytes saved by compression."""
+        return self.size - self.stored_size
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        """Return count of cold originals, their bytes and bytes in the cold tier."""
+        totals = cls.objects.aggregate(count=Count('pk'), size=Sum('size'), stored_size=Sum('stored_size'))
+        return {name: value or 0 for name, value in totals.items()}
@@ -0,0 +1,104 @@
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image as PillowImage
+
+BLURHASH_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~'
+BLURHASH_COMPONENTS = (4, 3)  # components by x and y
+SAMPLE_SIDE = 64  # placeholder data is computed on the image downsampled to this size
+
+
+def _base83(value: int, length: int) -> str:
+    """Encode int to base83 string of certain length."""
+    return ''.join(BLURHASH_CHARS[value // 83 ** (length - i - 1) % 83] for i in range(length))
+
+
+def _srgb_to_linear(pixels: np.ndarray) -> np.ndarray:
+    """Convert sRGB values (0–255) to linear (0–1)."""
+    values = pixels / 255
+    return np.where(values <= 0.04045, values / 12.92, ((values + 0.055) / 1.055) ** 2.4)
+
+
+def _linear_to_srgb(value: float) -> int:
+    """Convert linear value (0–1) to sRGB one (0–255)."""
+    value = min(max(value, 0.0), 1.0)
+    if value <= 0.0031308:
+        return int(value * 12.92 * 255 + 0.5)
+    return int((1.055 * value ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sample(img: PillowImage) -> np.ndarray:
+    """Return heavily downsampled RGB copy of the image as array height x width x 3."""
+    small = img.copy()
+    small.thumbnail((SAMPLE_SIDE, SAMPLE_SIDE), reducing_gap=2.0)
+    if small.mode in ('RGBA', 'LA', 'PA') or (small.mode == 'P' and 'transparency' in small.info):
+        small = small.convert('RGBA')
+        background = PillowImage.new('RGBA', small.size, (255, 255, 255, 255))
+        small = PillowImage.alpha_composite(background, small)
+    return np.asarray(small.convert('RGB'), dtype=np.float64)
+
+
+def blurhash(pixels: np.ndarray) -> str:
+    """Return BlurHash of the pixels (https://blurha.sh)."""
+    height, width, _ = pixels.shape
+    components_x, components_y = BLURHASH_COMPONENTS
+    linear = _srgb_to_linear(pixels)
+
+    basis_x = np.cos(np.pi * np.outer(np.arange(components_x), np.arange(width)) / width)
+    basis_y = np.cos(np.pi * np.outer(np.arange(components_y), np.arange(height)) / height)
+    factors = np.einsum('jy,ix,yxc->jic', basis_y, basis_x, linear) / (width * height)
+    factors *= 2
+    factors[0, 0] /= 2
+    factors = factors.reshape(-1, 3)  # y components are the outer ones
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83(components_x - 1 + (components_y - 1) * 9, 1)
+
+    quantised_max = int(np.clip(np.abs(ac).max() * 166 - 0.5, 0, 82))
+    maximum = (quantised_max + 1) / 166
+    result += _base83(quantised_max, 1)
+
+    red, green, blue = (_linear_to_srgb(value) for value in dc)
+    result += _base83((red << 16) + (green << 8) + blue, 4)
+
+    quantised = np.clip(np.floor(np.sign(ac) * np.abs(ac / maximum) ** 0.5 * 9 + 9.5), 0, 18).astype(int)
+    for qr, qg, qb in quantised:
+        result += _base83(qr * 19 * 19 + qg * 19 + qb, 2)
+
+    return result
+
+
+def dominant_color(pixels: np.ndarray) -> str:
+    """Return dominant color of the pixels in hex notation.
+
+    Colors are grouped in 4096 buckets (4 bits per channel),
+    result is average color of the most populated bucket.
+    """
+    flat = pixels.reshape(-1, 3)
+    quantised = flat.astype(np.uint16) >> 4
+    buckets = (quantised[:, 0] << 8) | (quantised[:, 1] << 4) | quantised[:, 2]
+    top = np.bincount(buckets, minlength=4096).argmax()
+    red, green, blue = np.rint(flat[buckets == top].mean(axis=0)).astype(int)
+    return f'#{red:02x}{green:02x}{blue:02x}'
+
+
+def compute_placeholder(img: PillowImage) -> Tuple[str, str]:
+    """Return BlurHash and dominant color of the image.
+
+    Empty strings are returned if image mode can't be converted to RGB.
+    """
+    try:
+        pixels = _sample(img)
+    except ValueError:
+        return '', ''
+    return blurhash(pixels), dominant_color(pixels)
+
+
+def placeholder_from_path(path: Union[Path, BinaryIO]) -> Optional[Tuple[str, str]]:
+    """Return BlurHash and dominant color of the image file (None if file can't be read)."""
+    try:
+        with PillowImage.open(path) as img:
+            return compute_placeholder(img)
+    except OSError:
+        return None
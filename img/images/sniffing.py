@@ -0,0 +1,113 @@
+"""Early rejection of uploaded files by their first bytes.
+
+Files are checked while the body of the request is received: file which is not an image or has too many pixels
+(decompression bomb) is skipped, the rest of it is not buffered, written to disk or decoded.
+"""
+import warnings
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+from PIL import Image as PillowImage
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.core.handlers.wsgi import WSGIRequest
+
+NOT_AN_IMAGE = 'File probably is not an image'
+
+
+class UploadRejected(Exception):
+    """Uploaded file is not acceptable, message is the reason."""
+
+
+def has_image_magic(head: bytes) -> bool:
+    """Check that the beginning of the file is recognized by one of Pillow formats."""
+    PillowImage.init()
+    return any(accept and accept(head) for _, accept in PillowImage.OPEN.values())
+
+
+def sniff(head: bytes, complete: bool) -> bool:
+    """Check the image by the beginning of the file, return False if more bytes are needed to decide.
+
+    Headers of some formats can be longer than UPLOAD_SNIFF_BYTES (e.g. JPEG with big metadata),
+    such files are accepted by magic bytes and validated completely later.
+    Raises UploadRejected if the file is not an image or it has too many pixels.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', PillowImage.DecompressionBombWarning)
+            img = PillowImage.open(BytesIO(head))
+    except PillowImage.DecompressionBombError:
+        raise UploadRejected('Image has too many pixels')
+    except Exception:
+        if not complete and len(head) < settings.UPLOAD_SNIFF_BYTES:
+            return False
+        if complete or not has_image_magic(head):
+            raise UploadRejected(NOT_AN_IMAGE)
+        return True
+
+    check_pixels(img)
+    return True
+
+
+def check_pixels(img: PillowImage.Image) -> None:
+    """Raise UploadRejected if the image has more pixels than UPLOAD_MAX_PIXELS."""
+    if settings.UPLOAD_MAX_PIXELS and img.width * img.height > settings.UPLOAD_MAX_PIXELS:
+        raise UploadRejected(f'Image has too many pixels: {img.width}x{img.height}')
+
+
+class SniffingUploadHandler(FileUploadHandler):
+    """Checks the first UPLOAD_SNIFF_BYTES of every uploaded file, skips the file if it is not acceptable.
+
+    It should be the first handler of the request. Name, reason of rejection and whether the file was skipped
+    are saved to `sniffed_files` attribute of the request for every file of `file` param.
+    Rest of the skipped file is read, but it is not passed to the next handlers (buffered or written to disk).
+    Small files are rejected when they are received completely, they are created by the next handlers.
+    """
+
+    def __init__(self, request=None) -> None:
+        """Init method."""
+        super().__init__(request)
+        self.head = b''
+        self.checked = False
+        request.sniffed_files = []
+
+    def new_file(self, *args, **kwargs) -> None:
+        """Start checking of the next file."""
+        super().new_file(*args, **kwargs)
+        self.head = b''
+        self.checked = self.field_name != 'file'
+        if not self.checked:
+            self.request.sniffed_files.append((self.file_name, None, False))
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> bytes:
+        """Check the file by received bytes until it is decided, the data is passed to the next handlers."""
+        if not self.checked:
+            self.head += raw_data[:settings.UPLOAD_SNIFF_BYTES - len(self.head)]
+            if not self.check(complete=False):
+                raise SkipFile()
+        return raw_data
+
+    def file_complete(self, file_size: int) -> None:
+        """Check the small file which was received completely, the file is created by the next handlers."""
+        if not self.checked:
+            self.check(complete=True)
+
+    def check(self, complete: bool) -> bool:
+        """Check the received beginning of the file, return False if it's rejected."""
+        try:
+            self.checked = sniff(self.head, complete)
+        except UploadRejected as e:
+            self.checked = True
+            self.request.sniffed_files[-1] = (self.file_name, str(e), not complete)
+            return False
+        return True
+
+
+def sniffed_files(request: WSGIRequest) -> List[Tuple[str, Optional[UploadedFile], Optional[str]]]:
+    """Return name, received file (None if it was skipped) and reason of rejection of every file of `file` param."""
+    files = iter(request.FILES.getlist('file'))
+    return [
+        (name, None if skipped else next(files), rejection)
+        for name, rejection, skipped in getattr(request, 'sniffed_files', [])
+    ]
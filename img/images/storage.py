@@ -0,0 +1,107 @@
+import errno
+import os
+import shutil
+from pathlib import Path
+
+LINK = 'link'
+COPY = 'copy'
+MOVE = 'move'
+PLACE_MODES = (LINK, COPY, MOVE)
+
+
+def file_size(path: Path) -> int:
+    """Return size of the file, zero if it doesn't exist."""
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def copy_file(source: Path, destination: Path) -> str:
+    """Copy file in kernel (copy_file_range) where possible, return used method."""
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    if copy_file_range:
+        try:
+            with open(source, 'rb') as src, open(destination, 'wb') as dst:
+                size = os.fstat(src.fileno()).st_size
+                copied = 0
+                while copied < size:
+                    sent = copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                    if not sent:
+                        break
+                    copied += sent
+            return 'copy_file_range'
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+
+    shutil.copyfile(source, destination)
+    return 'copy'
+
+
+def place_file(source: Path, destination: Path, mode: str = COPY) -> str:
+    """Place file to destination without copying of data where possible, return used method.
+
+    Modes:
+    - link – hardlink, copy if source is on another filesystem,
+    - copy – copy (in kernel where possible),
+    - move – rename, copy and delete if source is on another filesystem.
+    """
+    if mode == MOVE:
+        try:
+            os.rename(source, destination)
+            return 'rename'
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        method = copy_file(source, destination)
+        os.remove(source)
+        return method
+
+    if mode == LINK:
+        try:
+            os.link(source, destination)
+            return 'hardlink'
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+
+    return copy_file(source, destination)
+
+
+def read_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """Copy count bytes from offset of the source through user space, return copied bytes."""
+    copied = 0
+    while copied < count:
+        block = memoryview(os.pread(src_fd, min(1024 * 1024, count - copied), offset + copied))
+        if not block:
+            break
+        copied += len(block)
+        while block:
+            block = block[os.write(dst_fd, block):]
+    return copied
+
+
+def copy_range(src_fd: int, dst_fd: int, offset: int, count: int) -> int:
+    """Copy count bytes from offset of the source to the current position of the destination, return copied bytes.
+
+    Data is copied in kernel (copy_file_range between files, sendfile to pipes and sockets) where possible.
+    Less bytes are copied if the source is shorter.
+    """
+    kernel_methods = [
+        lambda done: os.sendfile(dst_fd, src_fd, offset + done, count - done),
+    ]
+    if hasattr(os, 'copy_file_range'):
+        kernel_methods.insert(0, lambda done: os.copy_file_range(src_fd, dst_fd, count - done, offset + done))
+
+    copied = 0
+    for method in kernel_methods:
+        try:
+            while copied < count and (sent := method(copied)):
+                copied += sent
+            return copied
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+                raise
+
+    return copied + read_range(src_fd, dst_fd, offset + copied, count - copied)
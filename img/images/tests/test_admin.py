@@ -0,0 +1,64 @@
+from datetime import datetime
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from images.models import Image
+
+
+class ImageAdminTestCase(TestCase):
+    """Tests for search and date hierarchy of images in admin."""
+
+    def setUp(self) -> None:
+        """Create images of two users."""
+        self.admin = User.objects.create_superuser(username=uuid4().hex, password=uuid4().hex)
+        self.client.force_login(self.admin)
+        self.user = User.objects.create_user(username='Photographer')
+        other = User.objects.create_user(username=uuid4().hex)
+        self.images = {}
+        for name, user, date in (
+            ('holiday-2020.jpg', self.user, datetime(2020, 12, 31, 23, 0)),
+            ('report.png', other, datetime(2021, 3, 1, 12, 0)),
+            ('Holiday-sea.jpg', other, datetime(2021, 5, 2, 12, 0)),
+        ):
+            image = Image.objects.create(
+                user=user, filename=f'{uuid4().hex}.jpeg', original_filename=name,
+                upload_date=timezone.make_aware(date),
+            )
+            self.images[name] = image.filename
+
+    def changelist(self, **params: str) -> list:
+        """Return original filenames of listed images."""
+        resp = self.client.get(reverse('admin:images_image_changelist'), params)
+        self.assertEqual(resp.status_code, 200)
+        return sorted(image.original_filename for image in resp.context['cl'].result_list)
+
+    def test_search(self) -> None:
+        """Images are found by part of filenames and by exact username."""
+        self.assertEqual(self.changelist(q='HOLIDAY'), ['Holiday-sea.jpg', 'holiday-2020.jpg'])
+        self.assertEqual(self.changelist(q=self.images['report.png'][:8]), ['report.png'])
+        self.assertEqual(self.changelist(q='photographer'), ['holiday-2020.jpg'])
+        self.assertEqual(self.changelist(q='Photo'), [])
+        self.assertEqual(self.changelist(q='re'), [])
+        self.assertEqual(len(self.changelist()), 3)
+
+    def test_date_hierarchy(self) -> None:
+        """Periods are listed between the first and the last images."""
+        resp = self.client.get(reverse('admin:images_image_changelist'))
+        self.assertContains(resp, 'upload_date__year=2020')
+        self.assertContains(resp, 'upload_date__year=2021')
+
+        resp = self.client.get(reverse('admin:images_image_changelist'), {'upload_date__year': '2021'})
+        self.assertEqual(resp.context['cl'].result_count, 2)
+        for month in range(3, 6):
+            self.assertContains(resp, f'upload_date__month={month}&amp;')
+        self.assertNotContains(resp, 'upload_date__month=6&amp;')
+
+        resp = self.client.get(
+            reverse('admin:images_image_changelist'), {'upload_date__year': '2021', 'upload_date__month': '5'},
+        )
+        self.assertContains(resp, 'upload_date__day=2&amp;')
+        self.assertNotContains(resp, 'upload_date__day=3&amp;')
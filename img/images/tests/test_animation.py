@@ -0,0 +1,129 @@
+import os
+import weakref
+from io import BytesIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest import mock, skipUnless
+from uuid import uuid4
+
+from PIL import Image as PillowImage, features
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from app.helpers import Size
+from images import animation as animation_module
+from images.animation import fit_size, iter_frames
+from images.models import Image
+
+COLORS = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0)]
+
+
+def animation(fmt: str, **params) -> bytes:
+    """Return animation of 4 frames 200x100 with different colors."""
+    frames = [PillowImage.new('RGB', (200, 100), color) for color in COLORS]
+    if fmt == 'GIF':
+        frames = [frame.convert('P', palette=PillowImage.ADAPTIVE) for frame in frames]
+    result = BytesIO()
+    frames[0].save(result, fmt, save_all=True, append_images=frames[1:], duration=[100, 200, 300, 400], **params)
+    return result.getvalue()
+
+
+class AnimationTestCase(TestCase):
+    """Tests for resizing of animated images."""
+
+    def setUp(self) -> None:
+        """Create user and temporary directories."""
+        self.user = User.objects.create_user(username=uuid4().hex, password=uuid4().hex)
+        self.tmp_dir = TemporaryDirectory()
+        originals, resizes = os.path.join(self.tmp_dir.name, 'o'), os.path.join(self.tmp_dir.name, 'r')
+        self.settings = override_settings(ORIGINALS_DIR=originals, RESIZES_DIR=resizes)
+        self.settings.enable()
+        os.makedirs(os.path.join(originals, str(self.user)))
+
+    def tearDown(self) -> None:
+        """Remove temporary directories."""
+        self.settings.disable()
+        self.tmp_dir.cleanup()
+
+    def create_image(self, fmt: str, **params) -> Image:
+        """Create image with an animated original."""
+        image = Image.objects.create(user=self.user, filename=f'{uuid4().hex}.{fmt.lower()}', original_filename='a')
+        with open(image.path_to_original, 'wb') as original:
+            original.write(animation(fmt, **params))
+        return image
+
+    def assert_frames(self, path: Path, size: tuple) -> None:
+        """Check that all frames are resized and keep their durations and colors (WebP is encoded lossy)."""
+        with PillowImage.open(path) as img:
+            self.assertEqual(img.n_frames, len(COLORS))
+            self.assertEqual(img.size, size)
+            for index, color in enumerate(COLORS):
+                img.seek(index)
+                img.load()
+                self.assertEqual(img.info['duration'], (index + 1) * 100)
+                pixel = img.convert('RGB').getpixel((10, 10))
+                self.assertTrue(all(abs(channel - expected) <= 8 for channel, expected in zip(pixel, color)))
+
+    def test_fit_size(self) -> None:
+        """Sizes are the same as thumbnail creates."""
+        for source in [(200, 100), (333, 777), (1024, 768), (50, 40)]:
+            img = PillowImage.new('1', source)
+            img.thumbnail((120, 90))
+            self.assertEqual(fit_size(source, Size(120, 90)), img.size)
+
+    def test_gif(self) -> None:
+        """All frames of GIF are resized, loop and disposal are kept."""
+        image = self.create_image('GIF', loop=3, disposal=2)
+        image.resize(Size(100, 100))
+
+        path = image.path_to_resize(Size(100, 100))
+        self.assert_frames(path, (100, 50))
+        with PillowImage.open(path) as img:
+            self.assertEqual(img.info['loop'], 3)
+            img.seek(2)
+            self.assertEqual(img.disposal_method, 2)
+
+    def test_upload(self) -> None:
+        """Uploaded animation is resized."""
+        uploaded_file = SimpleUploadedFile('a.gif', animation('GIF', loop=0))
+        upload = Image.upload(PillowImage.open(uploaded_file), [Size(50, 50)], uploaded_file, self.user)
+
+        image = Image.objects.get(filename=upload['filename'])
+        self.assert_frames(image.path_to_resize(Size(50, 50)), (50, 25))
+
+    @override_settings(ANIMATION_MAX_FRAMES=3)
+    def test_limit(self) -> None:
+        """Too long animation is resized to a still image."""
+        image = self.create_image('GIF')
+        image.resize(Size(100, 100))
+
+        with PillowImage.open(image.path_to_resize(Size(100, 100))) as img:
+            self.assertEqual(img.size, (100, 50))
+            self.assertFalse(getattr(img, 'is_animated', False))
+
+    @skipUnless(features.check('webp_anim'), 'Pillow is built without animated WebP')
+    def test_webp(self) -> None:
+        """All frames of WebP are resized."""
+        image = self.create_image('WEBP', lossless=True)
+        image.resize(Size(100, 100))
+
+        self.assert_frames(image.path_to_resize(Size(100, 100)), (100, 50))
+
+    def test_frames_lazily(self) -> None:
+        """Frames are resized and encoded one by one, not more than the previous frame is kept in memory."""
+        formats = ['GIF'] + (['WEBP'] if features.check('webp_anim') else [])
+        for fmt in formats:
+            alive: List[weakref.ref] = []
+
+            def tracked_frames(img: PillowImage.Image, size: Size):
+                for frame in iter_frames(img, size):
+                    self.assertLessEqual(sum(ref() is not None for ref in alive), 1)
+                    alive.append(weakref.ref(frame.image))
+                    yield frame
+
+            with self.subTest(fmt=fmt), mock.patch.object(animation_module, 'iter_frames', tracked_frames):
+                image = self.create_image(fmt, lossless=True) if fmt == 'WEBP' else self.create_image(fmt)
+                image.resize(Size(100, 100))
+                self.assertEqual(len(alive), len(COLORS))
@@ -0,0 +1,137 @@
+import gzip
+import json
+import os
+import tarfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from images.models import Image, StorageUsage
+from images.storage import copy_range
+from images.tests.mixins import TestImageViewBase
+
+
+class ArchiveTestCase(TestImageViewBase, TestCase):
+    """Tests for export and import of the user's originals."""
+
+    @property
+    def url(self) -> str:
+        """Return url for export."""
+        return reverse('export')
+
+    def setUp(self) -> None:
+        """Create images of the user."""
+        self.user, self.token = self.create_user_with_token()
+        self.tmp_dir = TemporaryDirectory()
+        self.settings = override_settings(ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'))
+        self.settings.enable()
+
+        self.contents = {}
+        for index, size in enumerate((700, 512, 0)):
+            image = Image.objects.create(
+                user=self.user,
+                filename=f'{uuid4().hex}.png',
+                original_filename=f'Фото {index}.png',
+                upload_date=timezone.now().replace(year=2020 + index, microsecond=0),
+                placeholder='LfTI:j',
+                dominant_color='#ff0000',
+            )
+            os.makedirs(image.path_to_original.parent, exist_ok=True)
+            image.path_to_original.write_bytes(os.urandom(size))
+            self.contents[image.filename] = image.path_to_original.read_bytes()
+        # images without files and deleted ones are not exported
+        Image.objects.create(user=self.user, filename=f'{uuid4().hex}.png')
+        deleted = Image.objects.create(user=self.user, filename=f'{uuid4().hex}.png')
+        deleted.path_to_original.write_bytes(b'deleted')
+        deleted.tombstone()
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.settings.disable()
+        self.tmp_dir.cleanup()
+
+    def check_archive(self, archive: tarfile.TarFile) -> None:
+        """Check manifest and originals in the archive."""
+        members = archive.getmembers()
+        self.assertEqual(members[0].name, 'manifest.jsonl')
+        manifest = [json.loads(line) for line in archive.extractfile(members[0])]  # type: ignore
+        self.assertEqual([row['filename'] for row in manifest], list(self.contents))
+        self.assertEqual(manifest[0]['original_filename'], 'Фото 0.png')
+        self.assertEqual([member.name for member in members[1:]], [f'originals/{name}' for name in self.contents])
+        for member in members[1:]:
+            self.assertEqual(archive.extractfile(member).read(), self.contents[member.name[10:]])  # type: ignore
+
+    def test_export_command(self) -> None:
+        """Command writes the archive to a file."""
+        path = Path(self.tmp_dir.name) / 'export.tar'
+        call_command('export_user', username=self.user.username, output=str(path), stdout=StringIO())
+
+        with tarfile.open(path) as archive:
+            self.check_archive(archive)
+
+    def test_export_view(self) -> None:
+        """Archive is streamed to the owner."""
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'application/x-tar')
+        self.assertEqual(resp['Content-Disposition'], f'attachment; filename="{self.user.username}.tar"')
+        with tarfile.open(fileobj=BytesIO(b''.join(resp.streaming_content))) as archive:
+            self.check_archive(archive)
+
+    def test_import(self) -> None:
+        """Images are restored with filenames and dates, existing ones are skipped."""
+        path = Path(self.tmp_dir.name) / 'export.tar'
+        call_command('export_user', username=self.user.username, output=str(path), stdout=StringIO())
+        compressed = Path(self.tmp_dir.name) / 'export.tar.gz'
+        compressed.write_bytes(gzip.compress(path.read_bytes()))
+        expected = list(
+            Image.objects.filter(filename__in=self.contents).values_list('filename', 'original_filename', 'upload_date')
+        )
+
+        with override_settings(ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'restored')):
+            for archive_path in (path, compressed):
+                username = uuid4().hex
+                out = StringIO()
+                call_command('import_user', str(archive_path), username=username, create_user=True, stdout=out)
+                self.assertIn('Imported 3 images', out.getvalue())
+
+                images = Image.objects.filter(user__username=username)
+                self.assertEqual(
+                    sorted(images.values_list('filename', 'original_filename', 'upload_date')), sorted(expected),
+                )
+                for image in images:
+                    self.assertEqual(image.path_to_original.read_bytes(), self.contents[image.filename])
+                self.assertEqual(StorageUsage.objects.get(user__username=username).originals_bytes, 700 + 512)
+
+            out = StringIO()
+            call_command('import_user', str(path), username=username, stdout=out)
+            self.assertIn('Imported 0 images, skipped 3', out.getvalue())
+
+    def test_copy_range(self) -> None:
+        """Range is copied to files and pipes, shorter source is copied as is."""
+        source = Path(self.tmp_dir.name) / 'source'
+        source.write_bytes(b'0123456789')
+        with open(source, 'rb') as src:
+            destination = Path(self.tmp_dir.name) / 'destination'
+            with open(destination, 'wb') as dst:
+                dst.write(b'>')
+                dst.flush()
+                self.assertEqual(copy_range(src.fileno(), dst.fileno(), 2, 5), 5)
+                self.assertEqual(copy_range(src.fileno(), dst.fileno(), 8, 5), 2)
+            self.assertEqual(destination.read_bytes(), b'>2345689')
+
+            read_fd, write_fd = os.pipe()
+            try:
+                self.assertEqual(copy_range(src.fileno(), write_fd, 1, 3), 3)
+                self.assertEqual(os.read(read_fd, 10), b'123')
+            finally:
+                os.close(read_fd)
+                os.close(write_fd)
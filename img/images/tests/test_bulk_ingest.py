@@ -0,0 +1,124 @@
+import json
+import os
+import tarfile
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from app.helpers import Size
+from images.management.commands.bulk_ingest import Command
+from images.models import Image
+
+
+class BulkIngestTestCase(TestCase):
+    """Tests for bulk_ingest command."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.user = User.objects.create_user(username=uuid4().hex, password=uuid4().hex)
+        self.tmp_dir = TemporaryDirectory()
+        self.source = Path(self.tmp_dir.name) / 'source'
+        os.makedirs(self.source / 'nested')
+        PillowImage.new('RGB', (40, 30)).save(self.source / 'one.jpg')
+        PillowImage.new('RGB', (30, 40)).save(self.source / 'nested' / 'two.png')
+        (self.source / 'broken.jpg').write_bytes(b'not an image')
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def ingest(self, source: Path, **options) -> str:
+        """Run the command, return its output."""
+        out = StringIO()
+        call_command(
+            'bulk_ingest', str(source), username=self.user.username, workers=2, batch=1,
+            stdout=out, stderr=StringIO(), **options,
+        )
+        return out.getvalue()
+
+    def test_directory(self) -> None:
+        """All images of the tree are imported, manifest maps sources to filenames."""
+        output = self.ingest(self.source, sizes='20x20')
+        self.assertIn('Imported 2 images', output)
+        self.assertIn('failed 1', output)
+
+        images = {image.original_filename: image for image in Image.objects.all()}
+        self.assertEqual(sorted(images), ['one.jpg', 'two.png'])
+        for image in images.values():
+            self.assertTrue(image.path_to_original.exists())
+            self.assertTrue(image.path_to_resize(Size(20, 20)).exists())
+            self.assertTrue(image.placeholder)
+        self.assertTrue((self.source / 'one.jpg').exists())
+
+        with open(f'{self.source}.manifest.jsonl') as manifest:
+            lines = {line['source']: line for line in map(json.loads, manifest)}
+        self.assertEqual(lines[str(self.source / 'one.jpg')]['filename'], images['one.jpg'].filename)
+        self.assertEqual(lines[str(self.source / 'one.jpg')]['sizes'], ['20x20'])
+        self.assertIn('error', lines[str(self.source / 'broken.jpg')])
+
+    def test_resume(self) -> None:
+        """Files from manifest are skipped."""
+        manifest = Path(self.tmp_dir.name) / 'manifest.jsonl'
+        manifest.write_text(json.dumps({'source': str(self.source / 'one.jpg'), 'filename': 'x.jpeg'}) + '\n{"sou')
+
+        self.ingest(self.source, manifest=str(manifest))
+        self.assertEqual(list(Image.objects.values_list('original_filename', flat=True)), ['two.png'])
+
+        output = self.ingest(self.source, manifest=str(manifest))
+        self.assertIn('Imported 0 images', output)
+        self.assertIn('failed 1', output)
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_interrupted(self) -> None:
+        """Files placed by interrupted run are recorded if their rows were saved and removed otherwise."""
+        manifest = Path(self.tmp_dir.name) / 'manifest.jsonl'
+        saved = Image.objects.create(user=self.user, filename='a' * 32 + '.jpeg', original_filename='one.jpg')
+        lost = Path(self.tmp_dir.name) / 'originals' / str(self.user) / ('b' * 32 + '.png')
+        lost_resize = Path(self.tmp_dir.name) / 'resizes' / str(self.user) / '20x20' / lost.name
+        for path in (lost, lost_resize):
+            os.makedirs(path.parent)
+            path.write_bytes(b'placed')
+        lines = [
+            {'source': str(self.source / 'one.jpg'), 'intent': 'a' * 32},
+            {'source': str(self.source / 'nested' / 'two.png'), 'intent': 'b' * 32},
+        ]
+        manifest.write_text(''.join(json.dumps(line) + '\n' for line in lines))
+
+        output = self.ingest(self.source, manifest=str(manifest), mode='move')
+        self.assertIn('Imported 1 images', output)
+        self.assertFalse(lost.exists())
+        self.assertFalse(lost_resize.exists())
+        self.assertFalse((self.source / 'one.jpg').exists())
+        self.assertFalse((self.source / 'nested' / 'two.png').exists())
+        self.assertTrue((self.source / 'broken.jpg').exists())
+        images = Image.objects.exclude(pk=saved.pk)
+        self.assertEqual([image.original_filename for image in images], ['two.png'])
+        self.assertTrue(images[0].path_to_original.exists())
+
+        _, intents = Command.read_manifest(manifest)
+        self.assertEqual(intents, {})
+
+    def test_archive(self) -> None:
+        """Images of tar archive are imported."""
+        archive = Path(self.tmp_dir.name) / 'images.tar.gz'
+        with tarfile.open(archive, 'w:gz') as tar:
+            tar.add(self.source, arcname='photos')
+
+        output = self.ingest(archive)
+        self.assertIn('Imported 2 images', output)
+        for image in Image.objects.all():
+            self.assertTrue(image.path_to_original.exists())
+        staging_dir = Path(self.tmp_dir.name) / 'originals' / str(self.user) / '.ingest'
+        self.assertEqual(os.listdir(staging_dir), [])
@@ -0,0 +1,104 @@
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from app.helpers import Size
+from app.timing import Timings, activate, deactivate
+from images.decoded import DecodedCache, decoded_originals
+from images.models import Image
+
+
+class DecodedCacheTestCase(TestCase):
+    """Tests for the cache of decoded originals."""
+
+    def setUp(self) -> None:
+        """Create originals of 100x100 pixels, 30000 bytes decoded."""
+        self.tmp_dir = TemporaryDirectory()
+        self.paths = []
+        for index in range(3):
+            path = Path(self.tmp_dir.name) / f'{index}.png'
+            PillowImage.new('RGB', (100, 100)).save(path)
+            self.paths.append(path)
+        decoded_originals.clear()
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.tmp_dir.cleanup()
+        decoded_originals.clear()
+
+    def decode(self, path: Path) -> PillowImage.Image:
+        """Return decoded image."""
+        image = PillowImage.open(path)
+        image.load()
+        return image
+
+    def test_lru(self) -> None:
+        """The least recently used originals are evicted to fit into the budget."""
+        cache = DecodedCache(max_bytes=70000)
+        self.assertIsNone(cache.get(self.paths[0]))
+        cache.put(self.paths[0], self.decode(self.paths[0]))
+        cache.put(self.paths[1], self.decode(self.paths[1]))
+        self.assertIsNotNone(cache.get(self.paths[0]))
+
+        cache.put(self.paths[2], self.decode(self.paths[2]))
+        self.assertIsNone(cache.get(self.paths[1]))
+        self.assertIsNotNone(cache.get(self.paths[2]))
+        self.assertEqual(cache.stats(), {'hits': 2, 'misses': 2, 'evictions': 1, 'images': 2, 'bytes': 60000})
+
+        cache.invalidate(self.paths[0])
+        self.assertIsNone(cache.get(self.paths[0]))
+
+    def test_limits(self) -> None:
+        """Changed originals are not served, too big ones and ones of disabled cache are not cached."""
+        cache = DecodedCache(max_bytes=200000)
+        cache.put(self.paths[0], self.decode(self.paths[0]))
+        os.utime(self.paths[0], ns=(0, 0))
+        self.assertIsNone(cache.get(self.paths[0]))
+
+        cache = DecodedCache(max_bytes=50000)
+        cache.put(self.paths[0], self.decode(self.paths[0]))
+        self.assertIsNone(cache.get(self.paths[0]))
+
+        cache = DecodedCache(max_bytes=0)
+        cache.put(self.paths[0], self.decode(self.paths[0]))
+        self.assertIsNone(cache.get(self.paths[0]))
+        self.assertEqual(cache.misses, 0)
+
+    def test_resize(self) -> None:
+        """Original is kept decoded only if other sizes follow, deleted one is removed from the cache."""
+        user = User.objects.create_user(username=uuid4().hex)
+        image = Image.objects.create(user=user, filename=f'{uuid4().hex}.png')
+        with override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        ):
+            os.makedirs(image.original_path.parent)
+            PillowImage.new('RGB', (300, 200), '#00ff00').save(image.original_path)
+            image.resize(Size(200, 200), notify=False)
+            self.assertEqual(decoded_originals.stats()['images'], 0)
+
+            timings = Timings()
+            token = activate(timings)
+            try:
+                image.resize(Size(100, 100), notify=False, keep_decoded=True)
+                image.resize(Size(50, 50), notify=False)
+                with PillowImage.open(image.original_path) as uploaded:
+                    image.write_resize(Size(20, 20), uploaded)
+            finally:
+                deactivate(token)
+
+            with PillowImage.open(image.path_to_resize(Size(50, 50))) as resized:
+                self.assertEqual(resized.size, (50, 33))
+                self.assertEqual(resized.getpixel((0, 0)), (0, 255, 0))
+            self.assertEqual(decoded_originals.stats()['hits'], 1)
+            # decodes of the original and of the uploaded image are not cached ones
+            decodes = [desc for name, desc in timings.durations if name == 'decode']
+            self.assertEqual(sorted(decodes), ['', 'cached'])
+
+            image.delete()
+            self.assertEqual(decoded_originals.stats()['images'], 0)
@@ -0,0 +1,61 @@
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import skipUnless
+
+import numpy as np
+from PIL import Image as PillowImage
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from app.helpers import Size
+from images.engines import PillowEngine, get_engine
+from images.loadtest import synthetic_images
+
+
+def vips_available() -> bool:
+    """Check if pyvips and libvips are installed."""
+    try:
+        get_engine('vips')
+    except ImproperlyConfigured:
+        return False
+    return True
+
+
+class EnginesTestCase(TestCase):
+    """Tests for resize engines."""
+
+    def test_get_engine(self) -> None:
+        """Engine is selected by settings."""
+        self.assertIsInstance(get_engine(), PillowEngine)
+        with override_settings(RESIZE_ENGINE='unknown'), self.assertRaises(ImproperlyConfigured):
+            get_engine()
+
+    @skipUnless(vips_available(), 'pyvips is not installed')
+    def test_vips_equivalence(self) -> None:
+        """Resizes of vips have the same sizes and almost the same pixels as resizes of Pillow."""
+        with TemporaryDirectory() as tmp_dir:
+            for fmt, source_size, size in [('PNG', (400, 300), Size(100, 100)), ('JPEG', (333, 500), Size(90, 60))]:
+                source = Path(tmp_dir) / f'source.{fmt.lower()}'
+                source.write_bytes(synthetic_images(1, source_size, fmt)[0])
+                results = []
+                for engine in ('pillow', 'vips'):
+                    destination = Path(tmp_dir) / f'{engine}.{fmt.lower()}'
+                    get_engine(engine).resize(source, size, destination)
+                    with PillowImage.open(destination) as img:
+                        self.assertEqual(img.format, fmt)
+                        results.append(np.asarray(img.convert('RGB'), dtype=np.float64))
+
+                pillow, vips = results
+                self.assertEqual(pillow.shape, vips.shape)
+                self.assertLess(np.abs(pillow - vips).mean(), 10)
+
+    def test_benchmark(self) -> None:
+        """Engines are compared by the command."""
+        out = StringIO()
+        call_command('benchmark_engines', engines='pillow', image_size='300x200', sizes='50x50', repeat=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(lines[1].split()[:2], ['pillow', '50x50'])
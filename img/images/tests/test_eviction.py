@@ -0,0 +1,134 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Size
+from images.eviction import Evictor, LFU, ingest_access_log, parse_log
+from images.models import Image, ResizeAccess
+
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+class EvictionTestCase(TestCase):
+    """Tests for eviction of resizes."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.tmp_dir = TemporaryDirectory()
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+
+        self.user = User.objects.create_user(username=uuid4().hex, password=uuid4().hex)
+        self.images = []
+        for i in range(3):
+            image = Image.objects.create(user=self.user, filename=f'{i}{uuid4().hex}.png', original_filename='1.png')
+            os.makedirs(image.path_to_original.parent, exist_ok=True)
+            PillowImage.new('RGB', (20, 20)).save(image.path_to_original)
+            image.resize(Size(10, 10))
+            os.utime(image.path_to_resize(Size(10, 10)), (1000 + i, 1000 + i))
+            self.images.append(image)
+        self.log = os.path.join(self.tmp_dir.name, 'access.log')
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def log_line(self, image: Image, status: int = 200, day: int = 10) -> str:
+        """Return line of access log."""
+        return (
+            f'127.0.0.1 - - [{day:02}/Oct/2026:13:55:36 +0000] "GET /{self.user}/10x10/{image.filename} HTTP/1.1" '
+            f'{status} 2326 "-" "curl/7.0"\n'
+        )
+
+    def test_parse_log(self) -> None:
+        """Successful requests of resizes are aggregated, incomplete line is skipped."""
+        with open(self.log, 'w') as log:
+            log.write(self.log_line(self.images[0], day=1))
+            log.write(self.log_line(self.images[0], status=304, day=3))
+            log.write(self.log_line(self.images[1], status=404))
+            log.write('127.0.0.1 - - [10/Oct/2026:13:55:36 +0000] "GET /favicon.ico HTTP/1.1" 200 5 "-" "-"\n')
+            complete = log.tell()
+            log.write(self.log_line(self.images[1])[:20])
+
+        accesses, offset = parse_log(self.log, 0)
+        self.assertEqual(offset, complete)
+        self.assertEqual(list(accesses), [(str(self.user), '10x10', self.images[0].filename)])
+        access = accesses[(str(self.user), '10x10', self.images[0].filename)]
+        self.assertEqual(access.hits, 2)
+        self.assertEqual(access.last_access, datetime(2026, 10, 3, 13, 55, 36, tzinfo=timezone.utc))
+
+    def test_ingest(self) -> None:
+        """Only new lines of the log are processed."""
+        with open(self.log, 'w') as log:
+            log.write(self.log_line(self.images[0]))
+        self.assertEqual(ingest_access_log(self.log), 1)
+        with open(self.log, 'a') as log:
+            log.write(self.log_line(self.images[0]))
+            log.write(self.log_line(self.images[1]))
+        self.assertEqual(ingest_access_log(self.log), 2)
+        self.assertEqual(
+            list(ResizeAccess.objects.order_by('hits').values_list('image_id', 'hits')),
+            [(self.images[1].pk, 1), (self.images[0].pk, 2)],
+        )
+
+    @mock.patch('shutil.disk_usage', return_value=DiskUsage(1000, 950, 50))
+    def test_choose(self, disk_usage) -> None:
+        """The coldest resizes are chosen until low watermark is reached."""
+        size = os.path.getsize(self.images[0].path_to_resize(Size(10, 10)))
+        disk_usage.return_value = DiskUsage(size * 10, size * 9.5, size * 0.5)
+        ResizeAccess.objects.create(
+            image=self.images[0], size='10x10', hits=5, last_access=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        )
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            lru = Evictor(executor)
+            self.assertEqual([c.filename for c in lru.choose()], [self.images[1].filename, self.images[2].filename])
+            lfu = Evictor(executor, LFU)
+            self.assertEqual([c.filename for c in lfu.choose()], [self.images[1].filename, self.images[2].filename])
+            lfu.low = 0.65
+            self.assertEqual(len(lfu.choose()), 3)
+
+        disk_usage.return_value = DiskUsage(size * 10, size * 8.9, size * 1.1)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(Evictor(executor).choose(), [])
+
+    @mock.patch('shutil.disk_usage')
+    def test_evict_and_regenerate(self, disk_usage) -> None:
+        """Evicted resize is recreated on request."""
+        size = os.path.getsize(self.images[0].path_to_resize(Size(10, 10)))
+        disk_usage.return_value = DiskUsage(size * 10, size * 9.5, size * 0.5)
+
+        out = StringIO()
+        call_command('evict_resizes', dry_run=True, stdout=out)
+        self.assertIn('Would evict 2 resizes', out.getvalue())
+        self.assertTrue(self.images[0].path_to_resize(Size(10, 10)).exists())
+
+        call_command('evict_resizes', stdout=out)
+        self.assertFalse(self.images[0].path_to_resize(Size(10, 10)).exists())
+        self.assertTrue(self.images[2].path_to_resize(Size(10, 10)).exists())
+        self.assertEqual(self.images[0].resizes_data, [])
+
+        url = reverse('regenerate', args=[str(self.user), '10x10', self.images[0].filename])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertGreater(len(b''.join(resp.streaming_content)), 0)
+        self.assertTrue(self.images[0].path_to_resize(Size(10, 10)).exists())
+        self.assertFalse(ResizeAccess.objects.filter(evicted_at__isnull=False, image=self.images[0]).exists())
+
+        url = reverse('regenerate', args=[str(self.user), '20x20', self.images[0].filename])
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -2,7 +2,7 @@ import json
 
 from django.test import TestCase
 
-from app.helpers import Response, Size
+from app.helpers import Response, Size, parse_range
 
 
 class SizeTestCase(TestCase):
@@ -18,6 +18,34 @@ class SizeTestCase(TestCase):
         self.assertEqual(width, size.width)
         self.assertEqual(height, size.height)
 
+    def test_snapping(self) -> None:
+        """Tests covers, round_up and snap_up."""
+        size = Size(801, 600)
+        self.assertTrue(Size(801, 600).covers(size))
+        self.assertFalse(Size(800, 1000).covers(size))
+        self.assertEqual(str(size.round_up(100)), '900x600')
+        sizes = Size.list_from_str('200x200,1024x768,1920x1080')
+        self.assertEqual(str(size.snap_up(sizes)), '1024x768')
+        self.assertEqual(str(Size(4000, 10).snap_up(sizes)), '1920x1080')
+        self.assertIsNone(size.snap_up([]))
+
+
+class RangeTestCase(TestCase):
+    """Tests for parsing of Range header."""
+
+    def test_parse_range(self) -> None:
+        """Single ranges are parsed, others are ignored."""
+        self.assertEqual(parse_range('bytes=0-9', 100), (0, 9))
+        self.assertEqual(parse_range('bytes=90-', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=90-200', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-10', 100), (90, 99))
+        self.assertEqual(parse_range('bytes=-200', 100), (0, 99))
+        for header in ['', 'bytes=-', 'bytes=5-1', 'bytes=0-1,5-6', 'items=0-1']:
+            self.assertIsNone(parse_range(header, 100))
+        for header in ['bytes=100-', 'bytes=-0']:
+            with self.assertRaises(ValueError):
+                parse_range(header, 100)
+
 
 class ResponseTestCase(TestCase):
     """Tests for Response helper."""
@@ -0,0 +1,74 @@
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
+
+from app.memory import read_rss
+from images.loadtest import percentile, synthetic_images
+from images.models import Image
+
+
+class LoadTestHelpersTestCase(TestCase):
+    """Tests for helpers of loadtest command."""
+
+    def test_percentile(self) -> None:
+        """Nearest rank percentiles."""
+        values = [float(value) for value in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([3.0], 95), 3)
+        self.assertEqual(percentile([], 95), 0)
+
+    def test_synthetic_images(self) -> None:
+        """Images are different."""
+        images = synthetic_images(3, (64, 48), 'PNG')
+        self.assertEqual(len(set(images)), 3)
+
+    def test_rss(self) -> None:
+        """RSS of the current process is known on linux."""
+        if os.path.exists('/proc/self/status'):
+            self.assertGreater(read_rss(os.getpid()), 0)
+        self.assertIsNone(read_rss(0))
+
+    def test_mix(self) -> None:
+        """Uploads are required."""
+        with self.assertRaises(CommandError):
+            call_command('loadtest', mix='resize:1', stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('loadtest', mix='upload:1,get:1', stdout=StringIO())
+
+
+class LoadTestTestCase(LiveServerTestCase):
+    """Tests for loadtest command against live server."""
+
+    def test_command(self) -> None:
+        """Requests are sent and reported, test users are removed."""
+        out = StringIO()
+        with TemporaryDirectory() as originals, TemporaryDirectory() as resizes, \
+                override_settings(ORIGINALS_DIR=originals, RESIZES_DIR=resizes):
+            call_command(
+                'loadtest',
+                url=self.live_server_url,
+                server_pid=os.getpid(),
+                requests=30,
+                concurrency=3,
+                users=2,
+                corpus=2,
+                image_size='120x90',
+                sizes='50x50',
+                stdout=out,
+            )
+            self.assertEqual([files for _, _, files in os.walk(originals) if files], [])
+            self.assertEqual([files for _, _, files in os.walk(resizes) if files], [])
+
+        lines = out.getvalue().splitlines()
+        upload = next(line.split() for line in lines if line.startswith('upload'))
+        self.assertEqual(upload[2], '0')  # no errors
+        total = sum(int(line.split()[1]) for line in lines if line.split()[0] in ('upload', 'resize', 'delete'))
+        self.assertEqual(total, 30)
+        self.assertIn('Throughput:', out.getvalue())
+        self.assertEqual(User.objects.count(), 0)
+        self.assertEqual(Image.all_objects.count(), 0)
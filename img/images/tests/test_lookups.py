@@ -0,0 +1,107 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from typing import List
+from unittest import mock
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.lookups import CachedLookup
+from images.models import Image
+from images.tests.mixins import TestImageViewBase
+
+
+FILE_CACHE = 'django.core.cache.backends.filebased.FileBasedCache'
+LOCAL_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+class LookupTestCase(TestImageViewBase, TestCase):
+    """Tests for cached lookups of images."""
+
+    @property
+    def url(self) -> str:
+        """Return url for resize and delete of the image."""
+        return reverse('resize-n-delete', args=[self.filename])
+
+    def setUp(self) -> None:
+        """Create user, rows are cached in files shared by processes."""
+        self.cache_dir = TemporaryDirectory()
+        self.settings = override_settings(CACHES={
+            'default': {'BACKEND': FILE_CACHE, 'LOCATION': self.cache_dir.name},
+            'other': {'BACKEND': FILE_CACHE, 'LOCATION': self.cache_dir.name},
+            'local': {'BACKEND': LOCAL_CACHE, 'LOCATION': 'local'},
+            'other-local': {'BACKEND': LOCAL_CACHE, 'LOCATION': 'other-local'},
+        })
+        self.settings.enable()
+        cache.clear()
+        self.user, self.token = self.create_user_with_token()
+        self.filename = f'{uuid4().hex}.png'
+
+    def tearDown(self) -> None:
+        """Remove cached files."""
+        self.settings.disable()
+        self.cache_dir.cleanup()
+
+    def test_other_process(self) -> None:
+        """Row deleted by another process isn't returned, caches of processes are not used."""
+        for alias, other_alias in (('default', 'other'), ('local', 'other-local')):
+            with self.subTest(alias=alias):
+                prefix = uuid4().hex
+                lookup = CachedLookup(prefix, 60, 5, alias=alias)
+                other_lookup = CachedLookup(prefix, 60, 5, alias=other_alias)
+                rows = {'key': 'row'}
+                self.assertEqual(lookup.get('key', lambda: rows.get('key')), 'row')
+
+                del rows['key']
+                other_lookup.forget('key')
+                self.assertIsNone(lookup.get('key', lambda: rows.get('key')))
+                self.assertEqual(lookup.enabled, alias == 'default')
+
+    def test_cached(self) -> None:
+        """Images and their absence are cached until images are created or deleted."""
+        with self.assertNumQueries(1):
+            self.assertIsNone(Image.lookup(self.user, self.filename))
+        with self.assertNumQueries(0):
+            self.assertIsNone(Image.lookup(self.user, self.filename))
+
+        image = Image.objects.create(user=self.user, filename=self.filename)
+        Image.forget(self.user.pk, [self.filename])
+        with self.assertNumQueries(1):
+            self.assertEqual(Image.lookup(self.user, self.filename), image)
+        with self.assertNumQueries(0):
+            self.assertEqual(Image.lookup(self.user, self.filename), image)
+
+        resp = self.client.delete(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.delete(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(self.load(resp)['message'], 'Image not found')
+
+    def test_coalesced(self) -> None:
+        """Concurrent misses of the same key load the row once."""
+        # local memory stands for memcached here: it's the only cache with atomic add in tests
+        lookup = CachedLookup(uuid4().hex, ttl=60, miss_ttl=5, wait=5, alias='local')
+        shared = mock.patch('app.lookups.PROCESS_CACHES', ())
+        shared.start()
+        self.addCleanup(shared.stop)
+        calls: List[int] = []
+        lock = threading.Lock()
+
+        def load() -> str:
+            """Slow load of a row."""
+            with lock:
+                calls.append(1)
+            time.sleep(0.2)
+            return 'row'
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(lambda _: lookup.get('key', load), range(8)))
+        self.assertEqual(results, ['row'] * 8)
+        self.assertEqual(len(calls), 1)
+
+        lookup.forget('key')
+        self.assertEqual(lookup.get('key', lambda: None), None)
+        self.assertEqual(lookup.get('key', load), None)
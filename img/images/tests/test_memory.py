@@ -0,0 +1,119 @@
+import os
+import signal
+import sys
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Iterator
+from unittest import mock
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command, load_command_class
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from app.memory import MB, MemoryWatermark, command_argv, rss_bytes
+from app.middleware import MemoryWatermarkMiddleware
+from images.models import Image
+
+MANAGE_PY = str(Path(settings.BASE_DIR) / 'manage.py')
+
+
+class Restarted(SystemExit):
+    """Raised instead of replacing the process, nothing runs after exec."""
+
+
+class MemoryWatermarkTestCase(TestCase):
+    """Tests for memory watermarks of workers and batch commands."""
+
+    @contextmanager
+    def restarting(self) -> Iterator[mock.Mock]:
+        """Expect restart of the command: it ends as after exec, DB connections of the test are kept open."""
+        with self.assertRaises(Restarted), mock.patch.object(connections, 'close_all'), \
+                mock.patch('os.execv', side_effect=Restarted) as mocked_execv:
+            yield mocked_execv
+
+    def test_watermark(self) -> None:
+        """Peaks are recorded by kinds of work, the limit is exceeded only if it's set."""
+        watermark = MemoryWatermark(soft_limit=1)
+        rss = watermark.measure('GET resize', 0)
+        self.assertGreater(rss, MB)
+        self.assertGreaterEqual(watermark.peaks['GET resize'], rss)
+        self.assertTrue(watermark.exceeded(rss))
+        self.assertIn('GET resize', watermark.report(rss))
+
+        self.assertFalse(MemoryWatermark(soft_limit=0).exceeded(rss))
+        with self.assertRaises(MiddlewareNotUsed):
+            MemoryWatermarkMiddleware(lambda request: None)
+
+    def test_command_argv(self) -> None:
+        """Arguments are built by the parser of the command, defaults are omitted."""
+        command = load_command_class('images', 'bulk_ingest')
+        self.assertEqual(
+            command_argv(command, {'source': '/photos', 'username': 'test', 'mode': 'move', 'batch': 500}),
+            [MANAGE_PY, 'bulk_ingest', '/photos', '--username=test', '--mode=move'],
+        )
+        command = load_command_class('images', 'reaper')
+        self.assertEqual(
+            command_argv(command, {'verbosity': 2, 'loop': True, 'after_id': 7, 'stdout': StringIO()}),
+            [MANAGE_PY, 'reaper', '--verbosity=2', '--loop', '--after-id=7'],
+        )
+
+    @override_settings(MEMORY_SOFT_LIMIT_MB=1)
+    def test_retirement(self) -> None:
+        """Worker over the limit sends the signal to itself once, when the request is finished."""
+        client = Client()
+        with mock.patch('os.kill') as mocked_kill, self.assertLogs('app.memory') as logs:
+            client.get(reverse('home'))
+            client.get(reverse('home'))
+        mocked_kill.assert_called_once()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('is retired: RSS', logs.output[0])
+        self.assertEqual(mocked_kill.call_args[0][1], signal.SIGTERM)
+
+    def test_command_restart(self) -> None:
+        """Batch command over the limit is restarted after the processed image."""
+        user = User.objects.create_user(username=uuid4().hex)
+        image = Image.objects.create(user=user, filename=f'{uuid4().hex}.png')
+        with self.restarting() as mocked_execv, mock.patch.object(Image, 'resize'), \
+                override_settings(MEMORY_SOFT_LIMIT_MB=rss_bytes() // MB // 2):
+            call_command('create_resizes', width=10, height=10, username=user.username, stdout=StringIO())
+        mocked_execv.assert_called_once_with(sys.executable, [
+            sys.executable, MANAGE_PY, 'create_resizes', '--skip-checks', '--width=10', '--height=10',
+            f'--username={user.username}', f'--after-id={image.pk}',
+        ])
+
+        with mock.patch('os.execv') as mocked_execv, mock.patch.object(Image, 'resize') as mocked_resize:
+            call_command(
+                'create_resizes', width=10, height=10, username=user.username, after_id=image.pk, stdout=StringIO(),
+            )
+        mocked_execv.assert_not_called()
+        mocked_resize.assert_not_called()
+
+    def test_restart_after_batch(self) -> None:
+        """Commands with pools of workers are restarted after the batch, audit is restarted after the user."""
+        user = User.objects.create_user(username=uuid4().hex)
+        images = [Image.objects.create(user=user, filename=f'{uuid4().hex}.png') for _ in range(3)]
+        with TemporaryDirectory() as tmp_dir, override_settings(
+            ORIGINALS_DIR=os.path.join(tmp_dir, 'originals'), RESIZES_DIR=os.path.join(tmp_dir, 'resizes'),
+            COLD_ORIGINALS_DIR='', MEMORY_SOFT_LIMIT_MB=rss_bytes() // MB // 2,
+        ):
+            with self.restarting() as mocked_execv:
+                call_command('create_placeholders', workers=1, batch=2, stdout=StringIO())
+            mocked_execv.assert_called_once()
+            self.assertEqual(mocked_execv.call_args[0][1][-1], f'--after-id={images[1].pk}')
+
+            with self.restarting() as mocked_execv:
+                call_command('storage_audit', stdout=StringIO())
+            mocked_execv.assert_called_once()
+            self.assertEqual(mocked_execv.call_args[0][1][-1], f'--after-user={user.username}')
+
+        with TemporaryDirectory() as tmp_dir, override_settings(ORIGINALS_DIR=tmp_dir):
+            out = StringIO()
+            call_command('create_placeholders', workers=1, after_id=images[1].pk, stdout=out)
+        self.assertIn('failed 1', out.getvalue())
@@ -0,0 +1,70 @@
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+import numpy as np
+from PIL import Image as PillowImage
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from images.models import Image
+from images.placeholders import blurhash, compute_placeholder, dominant_color
+from images.tiering import GZIP, compress
+
+
+class PlaceholdersTestCase(TestCase):
+    """Tests for placeholders of images."""
+
+    def test_blurhash(self) -> None:
+        """Tests BlurHash of known pixels (values are checked by reference implementation)."""
+        pixels = np.zeros((4, 6, 3))
+        pixels[:, 3:] = 255
+        self.assertEqual(blurhash(pixels), 'L[Lqe9004n_3?bM{M{xufQfQfQfQ')
+
+        pixels = np.full((8, 8, 3), (255, 0, 0), dtype=np.float64)
+        self.assertEqual(blurhash(pixels), 'LfTI:j|cfQ|c|csUfQsUfQfQfQfQ')
+
+    def test_dominant_color(self) -> None:
+        """The most frequent color wins."""
+        pixels = np.zeros((10, 10, 3))
+        pixels[:6] = (200, 100, 50)
+        pixels[6:] = (10, 20, 30)
+        self.assertEqual(dominant_color(pixels), '#c86432')
+
+    def test_compute_placeholder(self) -> None:
+        """Transparent images are composed on white background."""
+        img = PillowImage.new('RGBA', (300, 200), (0, 0, 0, 0))
+        placeholder, color = compute_placeholder(img)
+        self.assertEqual(len(placeholder), 28)
+        self.assertEqual(color, '#ffffff')
+
+    def test_command(self) -> None:
+        """Placeholders of existing images are created by the command."""
+        user = User.objects.create_user(username=uuid4().hex, password=uuid4().hex)
+        with TemporaryDirectory() as tmp_dir, override_settings(
+            ORIGINALS_DIR=os.path.join(tmp_dir, 'originals'), COLD_ORIGINALS_DIR=os.path.join(tmp_dir, 'cold'),
+        ):
+            os.makedirs(os.path.join(tmp_dir, 'originals', str(user)))
+            image = Image.objects.create(user=user, filename=f'{uuid4().hex}.png', original_filename='one.png')
+            PillowImage.new('RGB', (50, 50), (0, 0, 255)).save(image.original_path)
+            missing = Image.objects.create(user=user, filename=f'{uuid4().hex}.png', original_filename='two.png')
+            cold = Image.objects.create(user=user, filename=f'{uuid4().hex}.bmp', original_filename='three.bmp')
+            PillowImage.new('RGB', (50, 50), (255, 0, 0)).save(cold.original_path)
+            compress(cold.original_path, str(user), cold.filename, GZIP, 0.1)
+            os.remove(cold.original_path)
+
+            out = StringIO()
+            call_command('create_placeholders', workers=2, stdout=out)
+            # original is read from the cold tier, but it isn't restored
+            self.assertFalse(cold.original_path.exists())
+
+        image.refresh_from_db()
+        missing.refresh_from_db()
+        self.assertEqual(image.dominant_color, '#0000ff')
+        self.assertEqual(len(image.placeholder), 28)
+        self.assertEqual(missing.placeholder, '')
+        cold.refresh_from_db()
+        self.assertEqual(cold.dominant_color, '#ff0000')
+        self.assertIn('Created 2 placeholders, failed 1', out.getvalue())
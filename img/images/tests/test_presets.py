@@ -0,0 +1,140 @@
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Response, Size
+from images.models import Image, PresetBackfill, ResizePreset
+from images.tests.mixins import TestImageViewBase
+
+
+class ResizePresetTestCase(TestImageViewBase, TestCase):
+    """Tests for resize presets."""
+
+    @property
+    def url(self) -> str:
+        """Return url for upload."""
+        return reverse('upload')
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.user, self.token = self.create_user_with_token()
+        self.tmp_dir = TemporaryDirectory()
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def upload(self, **data) -> dict:
+        """Upload an image and return message of the response."""
+        buffer = BytesIO()
+        PillowImage.new('RGB', (200, 200)).save(buffer, 'JPEG')
+        data['file'] = SimpleUploadedFile(f'{uuid4().hex}.jpg', buffer.getvalue(), content_type='image/jpeg')
+        resp = self.client.post(self.url, data, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        return self.load(resp)['message']
+
+    def test_auto_apply_on_upload(self) -> None:
+        """Sizes of auto applied presets are created on upload."""
+        ResizePreset.objects.create(user=self.user, name='thumbs', sizes='50x50,100x100')
+        ResizePreset.objects.create(user=self.user, name='manual', sizes='20x20', auto_apply=False)
+
+        message = self.upload(sizes='100x100,30x30')
+
+        self.assertEqual(list(message['sizes']), ['100x100', '30x30', '50x50'])
+        image = Image.objects.get()
+        self.assertTrue(os.path.exists(image.path_to_resize(Size(50, 50))))
+        self.assertFalse(os.path.exists(image.path_to_resize(Size(20, 20))))
+
+    def test_upload_by_name(self) -> None:
+        """Sizes of presets are created when preset is requested by name."""
+        ResizePreset.objects.create(user=self.user, name='manual', sizes='20x20', auto_apply=False)
+
+        message = self.upload(presets='manual')
+        self.assertEqual(list(message['sizes']), ['20x20'])
+
+        buffer = BytesIO()
+        PillowImage.new('RGB', (20, 20)).save(buffer, 'JPEG')
+        data = {
+            'file': SimpleUploadedFile('one.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            'presets': 'unknown',
+        }
+        resp = self.client.post(self.url, data, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.load(resp)['message'], {'presets': ['Unknown preset: unknown']})
+
+    def test_resize_by_name(self) -> None:
+        """All sizes of a preset are created by resize request."""
+        filename = self.upload()['filename']
+        ResizePreset.objects.create(user=self.user, name='manual', sizes='20x20,40x40', auto_apply=False)
+
+        url = reverse('resize-n-delete', args=[filename])
+        resp = self.client.post(url, {'preset': 'manual'}, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 201)
+        response = self.load(resp)
+        self.assertEqual(response['code'], Response.OKAY)
+        self.assertEqual(list(response['message']), ['20x20', '40x40'])
+
+        resp = self.client.post(url, {'width': 10}, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 400)
+
+    def test_backfill(self) -> None:
+        """Gained sizes are backfilled for existing images."""
+        for _ in range(3):
+            self.upload()
+        preset = ResizePreset.objects.create(user=self.user, name='thumbs', sizes='50x50')
+        preset.sizes = '50x50,60x60'
+        preset.save()
+
+        self.assertEqual(
+            list(PresetBackfill.objects.values_list('size', 'total')),
+            [('50x50', 3), ('60x60', 3)],
+        )
+
+        backfill = PresetBackfill.objects.get(size='60x60')
+        self.assertEqual(backfill.process(2), 2)
+        self.assertEqual(backfill.status, PresetBackfill.RUNNING)
+        self.assertEqual(backfill.progress, '2/3 (67%)')
+        self.assertEqual(backfill.process(2), 1)
+        self.assertEqual(backfill.status, PresetBackfill.DONE)
+
+        for image in Image.objects.all():
+            self.assertTrue(os.path.exists(image.path_to_resize(Size(60, 60))))
+
+    def test_backfill_corrupt(self) -> None:
+        """Image which can't be resized is counted as failed, next images are backfilled."""
+        for _ in range(3):
+            self.upload()
+        images = list(Image.objects.order_by('pk'))
+        with open(images[0].path_to_original, 'r+b') as original:
+            original.truncate(100)
+        ResizePreset.objects.create(user=self.user, name='thumbs', sizes='50x50')
+        backfill = PresetBackfill.objects.create(preset=ResizePreset.objects.get(), size='70x70', total=3)
+
+        for error in (ValueError('corrupt'), SyntaxError('corrupt'), PillowImage.DecompressionBombError('bomb')):
+            with self.subTest(error=error), mock.patch.object(Image, 'resize', side_effect=error), \
+                    self.assertLogs('images.models', 'ERROR'):
+                backfill.last_image_id = backfill.processed = backfill.failed = 0
+                self.assertEqual(backfill.process(1), 1)
+                self.assertEqual((backfill.failed, backfill.last_image_id), (1, images[0].pk))
+
+        backfill.last_image_id = backfill.processed = backfill.failed = 0
+        with self.assertLogs('images.models', 'ERROR'):
+            self.assertEqual(backfill.process(5), 3)
+        backfill.refresh_from_db()
+        self.assertEqual(backfill.status, PresetBackfill.DONE)
+        self.assertEqual((backfill.failed, backfill.last_image_id), (1, images[2].pk))
+        self.assertFalse(os.path.exists(images[0].path_to_resize(Size(70, 70))))
+        self.assertTrue(os.path.exists(images[2].path_to_resize(Size(70, 70))))
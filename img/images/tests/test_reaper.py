@@ -0,0 +1,84 @@
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Size
+from images.models import Image
+from images.tests.mixins import TestImageViewBase
+
+
+class ReaperTestCase(TestImageViewBase, TestCase):
+    """Tests for deferred deletion of images."""
+
+    @property
+    def url(self) -> str:
+        """Return url for resize/delete."""
+        return reverse('resize-n-delete', args=[self.image.filename])
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.tmp_dir = TemporaryDirectory()
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+
+        self.user, self.token = self.create_user_with_token()
+        self.image = Image.objects.create(user=self.user, filename=f'{uuid4().hex}.png', original_filename='one.png')
+        os.makedirs(self.image.path_to_original.parent)
+        PillowImage.new('RGB', (20, 20)).save(self.image.path_to_original)
+        self.sizes = [Size(10, 10), Size(5, 5)]
+        for size in self.sizes:
+            self.image.resize(size)
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def reap(self) -> str:
+        """Run the command, return its output."""
+        out = StringIO()
+        call_command('reaper', stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_delete(self) -> None:
+        """Deleted image is invisible at once, files are removed by reaper."""
+        headers = {'HTTP_X_AUTH_TOKEN': self.token.token}
+        resp = self.client.delete(self.url, **headers)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(self.image.path_to_original.exists())
+        self.assertFalse(Image.objects.exists())
+        self.assertTrue(Image.all_objects.filter(deleted_at__isnull=False).exists())
+
+        resp = self.client.delete(self.url, **headers)
+        self.assertEqual(resp.status_code, 404)
+        resp = self.client.post(self.url, {'width': 10, 'height': 10}, **headers)
+        self.assertEqual(resp.status_code, 404)
+
+        self.assertIn('Reaped 1 images, failed 0', self.reap())
+        self.assertFalse(Image.all_objects.exists())
+        self.assertFalse(self.image.path_to_original.exists())
+        for size in self.sizes:
+            self.assertFalse(self.image.path_to_resize(size).exists())
+            self.assertTrue(self.image.path_to_resize(size).parent.exists())
+
+        self.assertIn('Nothing to reap', self.reap())
+
+    def test_retry(self) -> None:
+        """Images are retried if files can't be removed."""
+        self.image.tombstone()
+        with mock.patch('os.remove', side_effect=PermissionError('Permission denied')):
+            self.assertIn('Reaped 0 images, failed 1', self.reap())
+        self.assertEqual(Image.all_objects.get().reap_attempts, 1)
+
+        self.assertIn('Reaped 1 images, failed 0', self.reap())
+        self.assertFalse(self.image.path_to_original.exists())
@@ -0,0 +1,135 @@
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from PIL import Image as PillowImage
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connections, router
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.db import end_request, start_request
+from app.middleware import ReplicaRoutingMiddleware
+from images.models import Image, image_lookup
+from images.tests.mixins import TestImageViewBase
+
+
+class ReplicaTestCase(TestImageViewBase, TestCase):
+    """Tests for routing of reads to replicas.
+
+    Replica is a separate database without replication, so it's visible which database is read.
+    It's added in setUpClass, the test runner checks only databases existing at start.
+    """
+
+    @property
+    def url(self) -> str:
+        """Return url for upload."""
+        return reverse('upload')
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Create replica database."""
+        cls.db_dir = TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections.settings['default'],
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.db_dir.name, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        cls.databases = {'default', 'replica'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Remove replica database."""
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.db_dir.cleanup()
+
+    def setUp(self) -> None:
+        """Create user in both databases."""
+        self.user, self.token = self.create_user_with_token()
+        self.user.save(using='replica')
+        self.token.save(using='replica')
+        self.tmp_dir = TemporaryDirectory()
+        self.settings = override_settings(
+            DATABASE_REPLICAS=['replica'],
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(self.tmp_dir.name, 'cache'),
+            }},
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings.enable()
+        cache.clear()
+        # cached images would hide which database is read
+        self.lookup_ttl = mock.patch.object(image_lookup, 'ttl', 0)
+        self.lookup_ttl.start()
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.lookup_ttl.stop()
+        self.settings.disable()
+        self.tmp_dir.cleanup()
+
+    def upload(self) -> str:
+        """Upload an image, return its filename."""
+        buffer = BytesIO()
+        PillowImage.new('RGB', (20, 20)).save(buffer, 'PNG')
+        image_file = SimpleUploadedFile('img.png', buffer.getvalue(), content_type='image/png')
+        resp = self.client.post(self.url, {'file': image_file}, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('db_pin', resp.cookies)
+        return self.load(resp)['message']['filename']
+
+    def test_pinning(self) -> None:
+        """Client reads the primary after a write, the replica otherwise."""
+        filename = self.upload()
+        url = reverse('original', args=[filename])
+
+        # pinned by cookie
+        self.assertEqual(self.client.get(url, HTTP_X_AUTH_TOKEN=self.token.token).status_code, 200)
+        # pinned by user
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(url, HTTP_X_AUTH_TOKEN=self.token.token).status_code, 200)
+
+        # image isn't replicated yet
+        cache.clear()
+        resp = self.client.get(url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 404)
+        self.assertNotIn('db_pin', resp.cookies)
+
+        Image.objects.get(filename=filename).save(using='replica')
+        self.assertEqual(self.client.get(url, HTTP_X_AUTH_TOKEN=self.token.token).status_code, 200)
+
+    def test_without_replicas(self) -> None:
+        """Everything is read from the primary if there are no replicas."""
+        user, token = self.create_user_with_token()
+        with override_settings(DATABASE_REPLICAS=[]):
+            resp = self.client.get(reverse('original', args=['none.png']), HTTP_X_AUTH_TOKEN=token.token)
+        self.assertEqual(self.load(resp)['message'], 'Image not found')
+
+    def test_local_cache(self) -> None:
+        """Users can't be pinned by the cache of a process."""
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                ReplicaRoutingMiddleware(lambda request: None)
+
+    def test_router(self) -> None:
+        """Replicas are read only inside of requests until the first write."""
+        self.assertEqual(router.db_for_read(Image), 'default')
+        token = start_request()
+        try:
+            self.assertEqual(router.db_for_read(Image), 'replica')
+            self.assertEqual(router.db_for_write(Image), 'default')
+            self.assertEqual(router.db_for_read(Image), 'default')
+        finally:
+            end_request(token)
+        self.assertEqual(router.db_for_read(Image), 'default')
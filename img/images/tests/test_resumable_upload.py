@@ -0,0 +1,251 @@
+import os
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from PIL import Image as PillowImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from app.helpers import Response
+from images.models import Image, StorageUsage, UploadSession
+from images.tests.mixins import TestImageViewBase
+from images.uploads import SessionBusy, append_chunk, locked
+
+
+def png_bytes() -> bytes:
+    """Return PNG image."""
+    buffer = BytesIO()
+    PillowImage.new('RGB', (300, 200), (10, 200, 30)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class ResumableUploadTestCase(TestImageViewBase, TestCase):
+    """Tests for resumable uploads."""
+
+    @property
+    def url(self) -> str:
+        """Return url for creation of sessions."""
+        return reverse('upload-session')
+
+    def setUp(self) -> None:
+        """Create user and temporary directories."""
+        self.user, self.token = self.create_user_with_token()
+        self.tmp_dir = TemporaryDirectory()
+        self.settings = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+            UPLOADS_STAGING_DIR=os.path.join(self.tmp_dir.name, 'staging'),
+        )
+        self.settings.enable()
+
+    def tearDown(self) -> None:
+        """Remove temporary directories."""
+        self.settings.disable()
+        self.tmp_dir.cleanup()
+
+    def create_session(self, size: int, **data) -> UploadSession:
+        """Create upload session by API."""
+        resp = self.client.post(
+            self.url, {'filename': 'big.png', 'size': size, **data}, HTTP_X_AUTH_TOKEN=self.token.token,
+        )
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.load(resp)['message']['offset'], 0)
+        return UploadSession.objects.get(key=self.load(resp)['message']['session'])
+
+    def send_chunk(self, upload_session: UploadSession, offset: int, chunk: bytes):
+        """Send chunk by API."""
+        return self.client.put(
+            reverse('upload-chunks', args=[upload_session.key]), chunk, content_type='application/octet-stream',
+            HTTP_X_AUTH_TOKEN=self.token.token, HTTP_X_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_upload(self) -> None:
+        """Chunks are appended to the staging file, image is created on finalization."""
+        content = png_bytes()
+        upload_session = self.create_session(len(content), sizes='100x100')
+        url = reverse('upload-chunks', args=[upload_session.key])
+        middle = len(content) // 2
+
+        resp = self.send_chunk(upload_session, 0, content[:middle])
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['X-Upload-Offset'], str(middle))
+
+        # repeated chunk is rejected, current offset is returned
+        resp = self.send_chunk(upload_session, 0, content[:middle])
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp['X-Upload-Offset'], str(middle))
+
+        resp = self.client.post(url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.load(resp)['message'], 'Upload is not complete')
+
+        resp = self.client.get(url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(self.load(resp)['message']['offset'], middle)
+
+        resp = self.send_chunk(upload_session, middle, content[middle:] + b'extra')
+        self.assertEqual(resp.status_code, 400)
+        resp = self.send_chunk(upload_session, middle, content[middle:])
+        self.assertEqual(resp.status_code, 200)
+
+        resp = self.client.post(url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        message = self.load(resp)['message']
+        self.assertIn('100x100', message['sizes'])
+
+        image = Image.objects.get(user=self.user)
+        self.assertEqual(image.original_filename, 'big.png')
+        self.assertEqual(image.path_to_original.read_bytes(), content)
+        self.assertEqual(StorageUsage.objects.get(user=self.user).originals_bytes, len(content))
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(upload_session.path.exists())
+
+    def test_not_image(self) -> None:
+        """Session is removed if the uploaded file is not an image."""
+        upload_session = self.create_session(4)
+        self.send_chunk(upload_session, 0, b'text')
+
+        resp = self.client.post(reverse('upload-chunks', args=[upload_session.key]), HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['code'], Response.INVALID_PARAMETER)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(upload_session.path.exists())
+
+    def test_limits(self) -> None:
+        """Sessions bigger than the upload limit aren't created, images with too many pixels are rejected."""
+        with override_settings(UPLOAD_MAX_BYTES=100):
+            resp = self.client.post(
+                self.url, {'filename': 'big.png', 'size': 101}, HTTP_X_AUTH_TOKEN=self.token.token,
+            )
+            self.assertEqual(resp.status_code, 413)
+            self.assertEqual(self.load(resp)['message'], 'Upload is too big')
+
+        content = png_bytes()
+        upload_session = self.create_session(len(content))
+        self.send_chunk(upload_session, 0, content)
+        with override_settings(UPLOAD_MAX_PIXELS=300 * 200 - 1):
+            resp = self.client.post(
+                reverse('upload-chunks', args=[upload_session.key]), HTTP_X_AUTH_TOKEN=self.token.token,
+            )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.load(resp)['message'], 'Image has too many pixels: 300x200')
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(upload_session.path.exists())
+        self.assertFalse(Image.objects.exists())
+
+    def test_broken_image(self) -> None:
+        """Image which can't be decoded is rejected, the session is removed."""
+        content = png_bytes()
+        upload_session = self.create_session(len(content) // 2)
+        self.send_chunk(upload_session, 0, content[:len(content) // 2])
+
+        resp = self.client.post(reverse('upload-chunks', args=[upload_session.key]), HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()['code'], Response.INVALID_PARAMETER)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(Image.objects.exists())
+
+    def test_access(self) -> None:
+        """Sessions of other users and expired ones are not found, quota is checked on creation."""
+        upload_session = self.create_session(10)
+        _, token = self.create_user_with_token()
+        resp = self.client.get(reverse('upload-chunks', args=[upload_session.key]), HTTP_X_AUTH_TOKEN=token.token)
+        self.assertEqual(resp.status_code, 404)
+
+        UploadSession.objects.update(expires_at=timezone.now())
+        resp = self.send_chunk(upload_session, 0, b'data')
+        self.assertEqual(resp.status_code, 404)
+
+        StorageUsage.objects.create(user=self.user, max_bytes=100)
+        resp = self.client.post(self.url, {'filename': 'big.png', 'size': 101}, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 413)
+
+    def test_cancel(self) -> None:
+        """Cancelled session is removed with its staging file."""
+        upload_session = self.create_session(10)
+        self.send_chunk(upload_session, 0, b'data')
+        self.assertTrue(upload_session.path.exists())
+
+        url = reverse('upload-chunks', args=[upload_session.key])
+        resp = self.client.delete(url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(upload_session.path.exists())
+
+    def test_staging(self) -> None:
+        """Rest of interrupted chunk is overwritten, the staging file is locked by one request."""
+        path = Path(self.tmp_dir.name) / 'staging' / 'file'
+        with locked(path) as staged:
+            self.assertEqual(append_chunk(staged, 0, BytesIO(b'abcdef'), 6, block_size=4), 6)
+            self.assertEqual(append_chunk(staged, 3, BytesIO(b'XY'), 10), 2)
+            with self.assertRaises(SessionBusy), locked(path):
+                pass
+        self.assertEqual(path.read_bytes(), b'abcXY')
+
+        missing = path.with_name('missing')
+        with self.assertRaises(FileNotFoundError), locked(missing, create=False):
+            pass
+        self.assertFalse(missing.exists())
+
+    def test_concurrent_finalization(self) -> None:
+        """Session finalized by another request is not found, its staging file doesn't appear again."""
+        content = png_bytes()
+        upload_session = self.create_session(len(content))
+        self.send_chunk(upload_session, 0, content)
+        url = reverse('upload-chunks', args=[upload_session.key])
+
+        with locked(upload_session.path):
+            resp = self.client.post(url, HTTP_X_AUTH_TOKEN=self.token.token)
+            self.assertEqual(resp.status_code, 409)
+            resp = self.client.delete(url, HTTP_X_AUTH_TOKEN=self.token.token)
+            self.assertEqual(resp.status_code, 409)
+
+        # the file is moved by the first request, the row isn't deleted yet
+        os.rename(upload_session.path, Path(self.tmp_dir.name) / 'moved')
+        resp = self.client.post(url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 404)
+        self.assertFalse(upload_session.path.exists())
+        self.assertFalse(Image.objects.exists())
+
+        # the row is deleted by the first request after the chunk was checked
+        with mock.patch.object(UploadSession, 'refresh_from_db', side_effect=UploadSession.DoesNotExist):
+            resp = self.send_chunk(upload_session, 0, content)
+        self.assertEqual(resp.status_code, 404)
+        self.assertFalse(upload_session.path.exists())
+
+    def test_cleanup(self) -> None:
+        """Expired sessions and old orphan files are removed."""
+        expired = self.create_session(10)
+        active = self.create_session(10)
+        for upload_session in (expired, active):
+            self.send_chunk(upload_session, 0, b'data')
+        UploadSession.objects.filter(pk=expired.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        orphan = Path(self.tmp_dir.name) / 'staging' / 'orphan'
+        orphan.write_bytes(b'data')
+        fresh_orphan = Path(self.tmp_dir.name) / 'staging' / 'fresh'
+        fresh_orphan.write_bytes(b'data')
+        os.utime(orphan, (0, 0))
+
+        out = StringIO()
+        call_command('cleanup_uploads', stdout=out)
+        self.assertIn('Removed 1 expired uploads, 1 orphan files', out.getvalue())
+        self.assertEqual(list(UploadSession.objects.values_list('pk', flat=True)), [active.pk])
+        self.assertEqual(sorted(os.listdir(Path(self.tmp_dir.name) / 'staging')), sorted([active.key.hex, 'fresh']))
+
+    @override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0)
+    def test_regular_upload_moved(self) -> None:
+        """Regular uploads saved to temporary files are moved to originals."""
+        content = png_bytes()
+        resp = self.client.post(
+            reverse('upload'), {'file': SimpleUploadedFile('img.png', content), 'sizes': '50x50'},
+            HTTP_X_AUTH_TOKEN=self.token.token,
+        )
+        self.assertEqual(resp.status_code, 200)
+        image = Image.objects.get(user=self.user)
+        self.assertEqual(image.path_to_original.read_bytes(), content)
+        self.assertEqual(oct(image.path_to_original.stat().st_mode & 0o777), oct(0o644))
@@ -0,0 +1,92 @@
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Response
+from images.models import Image, ResizePreset, SizePolicy
+from images.tests.mixins import TestImageViewBase
+
+
+class SizePolicyTestCase(TestImageViewBase, TestCase):
+    """Tests for size policies."""
+
+    @property
+    def url(self) -> str:
+        """Return url for upload."""
+        return reverse('upload')
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.user, self.token = self.create_user_with_token()
+        self.tmp_dir = TemporaryDirectory()
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def upload(self, **data):
+        """Upload an image and return the response."""
+        buffer = BytesIO()
+        PillowImage.new('RGB', (200, 200)).save(buffer, 'JPEG')
+        data['file'] = SimpleUploadedFile(f'{uuid4().hex}.jpg', buffer.getvalue(), content_type='image/jpeg')
+        return self.client.post(self.url, data, HTTP_X_AUTH_TOKEN=self.token.token)
+
+    def resize(self, width: int, height: int):
+        """Resize the uploaded image and return the response."""
+        image = Image.objects.get()
+        return self.client.post(
+            reverse('resize-n-delete', args=[image.filename]), {'width': width, 'height': height},
+            HTTP_X_AUTH_TOKEN=self.token.token,
+        )
+
+    def test_step(self) -> None:
+        """Sides are rounded up to the step, the same variant is created for close sizes."""
+        SizePolicy.objects.create(user=self.user, mode=SizePolicy.STEP, step=50)
+
+        resp = self.upload(sizes='101x99,120x100')
+        self.assertEqual(list(self.load(resp)['message']['sizes']), ['150x100'])
+
+        resp = self.resize(801, 600)
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(resp['X-Resize-Size'], '850x600')
+        self.assertTrue(self.load(resp)['message'].endswith(f'/850x600/{Image.objects.get().filename}'))
+
+    def test_allow_list(self) -> None:
+        """Sizes out of the list are rejected."""
+        SizePolicy.objects.create(user=self.user, mode=SizePolicy.ALLOW_LIST, allowed_sizes='100x100,800x600')
+
+        resp = self.upload(sizes='100x100,100x101')
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.load(resp)['code'], Response.INVALID_PARAMETER)
+        self.assertIn('Size 100x101 is not allowed', self.load(resp)['message']['sizes'][0])
+
+        self.assertEqual(self.upload(sizes='100x100').status_code, 200)
+        self.assertEqual(self.resize(800, 600).status_code, 201)
+        self.assertEqual(self.resize(801, 600).status_code, 400)
+
+    def test_presets(self) -> None:
+        """Sizes are snapped up to the nearest size of presets, sizes of presets are not changed."""
+        SizePolicy.objects.create(user=self.user, mode=SizePolicy.PRESETS)
+        ResizePreset.objects.create(user=self.user, name='gallery', sizes='320x240,1024x768', auto_apply=False)
+
+        resp = self.upload(sizes='300x300,100x100', presets='gallery')
+        self.assertEqual(list(self.load(resp)['message']['sizes']), ['1024x768', '320x240'])
+
+        self.assertEqual(self.resize(2000, 2000)['X-Resize-Size'], '1024x768')
+
+    def test_without_policy(self) -> None:
+        """Any size is created if the user has no policy."""
+        self.upload()
+        self.assertEqual(self.resize(801, 599)['X-Resize-Size'], '801x599')
@@ -0,0 +1,94 @@
+from io import BytesIO
+from typing import List
+from unittest import mock
+
+from PIL import Image as PillowImage
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Response
+from images.models import Image, StorageUsage
+from images.sniffing import NOT_AN_IMAGE, UploadRejected, sniff
+from images.tests.mixins import TestImageViewBase
+
+
+class SniffingTestCase(TestImageViewBase, TestCase):
+    """Tests for early rejection of uploads."""
+
+    @property
+    def url(self) -> str:
+        """Return URL for upload."""
+        return reverse('upload')
+
+    def setUp(self) -> None:
+        """Create user and PNG image of 20x20."""
+        self.user, self.token = self.create_user_with_token()
+        content = BytesIO()
+        PillowImage.new('RGB', (20, 20)).save(content, 'PNG')
+        self.png = content.getvalue()
+
+    def test_sniff(self) -> None:
+        """Images are identified by headers, other files are rejected when enough bytes are received."""
+        self.assertTrue(sniff(self.png[:100], complete=False))
+        self.assertFalse(sniff(self.png[:4], complete=False))
+        self.assertFalse(sniff(b'text', complete=False))
+        with self.assertRaisesMessage(UploadRejected, NOT_AN_IMAGE):
+            sniff(b'text', complete=True)
+
+        with override_settings(UPLOAD_SNIFF_BYTES=8):
+            with self.assertRaisesMessage(UploadRejected, NOT_AN_IMAGE):
+                sniff(b'text content', complete=False)
+            # JPEG whose header is longer than sniffed bytes
+            self.assertTrue(sniff(b'\xff\xd8\xff\xe1\x10\x00Exif', complete=False))
+
+        with override_settings(UPLOAD_MAX_PIXELS=399):
+            with self.assertRaisesMessage(UploadRejected, 'Image has too many pixels: 20x20'):
+                sniff(self.png, complete=True)
+
+    @override_settings(UPLOAD_MAX_PIXELS=399)
+    def test_rejected_upload(self) -> None:
+        """Only the sniffed beginning of the rejected file is passed to the next handlers."""
+        uploads = (
+            (SimpleUploadedFile('big.png', self.png), 'Image has too many pixels: 20x20'),
+            (SimpleUploadedFile('text.png', b'text content' * 100000), NOT_AN_IMAGE),
+        )
+        for image_file, message in uploads:
+            received: List[int] = []
+            with self.subTest(message=message), mock.patch(
+                'django.core.files.uploadhandler.MemoryFileUploadHandler.receive_data_chunk',
+                side_effect=lambda raw_data, start: received.append(len(raw_data)),
+            ):
+                resp = self.client.post(self.url, {'file': image_file}, HTTP_X_AUTH_TOKEN=self.token.token)
+                self.assertEqual(resp.status_code, 400)
+                self.assertEqual(self.load(resp)['message'], {'file': [message]})
+                self.assertLess(sum(received), settings.UPLOAD_SNIFF_BYTES)
+        self.assertFalse(Image.objects.exists())
+
+    @override_settings(UPLOAD_MAX_PIXELS=399, UPLOAD_SNIFF_BYTES=8)
+    def test_accepted_by_magic(self) -> None:
+        """Image accepted by magic bytes is checked completely."""
+        resp = self.client.post(
+            self.url, {'file': SimpleUploadedFile('big.png', self.png)}, HTTP_X_AUTH_TOKEN=self.token.token,
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(self.load(resp)['message'], {'file': ['Image has too many pixels: 20x20']})
+        self.assertFalse(Image.objects.exists())
+
+    def test_max_upload(self) -> None:
+        """Requests bigger than the limit of the user or the default one are rejected before the body is read."""
+        with override_settings(UPLOAD_MAX_BYTES=100):
+            resp = self.client.post(
+                self.url, {'file': SimpleUploadedFile('one.png', self.png)}, HTTP_X_AUTH_TOKEN=self.token.token,
+            )
+            self.assertEqual(resp.status_code, 413)
+            self.assertEqual(self.load(resp)['code'], Response.INVALID_REQUEST)
+            self.assertEqual(self.load(resp)['message'], 'Upload is too big')
+
+            StorageUsage.objects.create(user=self.user, max_upload_bytes=0)
+            with mock.patch('os.makedirs'), mock.patch('builtins.open'):
+                resp = self.client.post(
+                    self.url, {'file': SimpleUploadedFile('one.png', self.png)}, HTTP_X_AUTH_TOKEN=self.token.token,
+                )
+            self.assertEqual(resp.status_code, 200)
@@ -0,0 +1,117 @@
+import os
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import mock
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from app.helpers import Size
+from images.management.commands.storage_audit import Command
+from images.models import Image
+
+
+class StorageAuditTestCase(TestCase):
+    """Tests for storage_audit command."""
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.tmp_dir = TemporaryDirectory()
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+        self.size = Size(10, 10)
+
+        self.user = User.objects.create_user(username=f'b{uuid4().hex}', password=uuid4().hex)
+        self.okay = self.create_image(self.user)
+        self.empty = self.create_image(self.user)
+        self.empty.path_to_resize(self.size).write_bytes(b'')
+        self.missing = self.create_image(self.user)
+        os.remove(self.missing.path_to_original)
+        self.orphan_original = self.okay.path_to_original.parent / 'orphan.png'
+        self.orphan_original.write_bytes(b'x')
+        self.orphan_resize = self.okay.path_to_resize(self.size).parent / 'orphan.png'
+        self.orphan_resize.write_bytes(b'x')
+        (self.okay.path_to_original.parent / '.ingest').mkdir()
+
+        # users without directories and without images
+        self.other = self.create_image(User.objects.create_user(username=f'a{uuid4().hex}', password=uuid4().hex))
+        os.remove(self.other.path_to_original)
+        os.makedirs(Path(self.tmp_dir.name) / 'resizes' / 'c-unknown' / '10x10')
+        (Path(self.tmp_dir.name) / 'resizes' / 'c-unknown' / '10x10' / 'lost.png').write_bytes(b'x')
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def create_image(self, user: User) -> Image:
+        """Create image with original and resize."""
+        image = Image.objects.create(user=user, filename=f'{uuid4().hex}.png', original_filename='one.png')
+        os.makedirs(image.path_to_original.parent, exist_ok=True)
+        PillowImage.new('RGB', (20, 20)).save(image.path_to_original)
+        image.resize(self.size)
+        return image
+
+    def audit(self, **options) -> str:
+        """Run the command, return its output."""
+        out = StringIO()
+        options.setdefault('min_age', 0)
+        call_command('storage_audit', workers=2, chunk=2, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_report(self) -> None:
+        """All issues are reported, nothing is changed."""
+        output = self.audit()
+        self.assertIn(f'orphan_original: {self.orphan_original}\n', output)
+        self.assertIn(f'orphan_resize: {self.orphan_resize}\n', output)
+        self.assertIn(f'orphan_resize: {self.tmp_dir.name}/resizes/c-unknown/10x10/lost.png\n', output)
+        self.assertIn(f'empty_resize: {self.empty.path_to_resize(self.size)}\n', output)
+        self.assertIn(f'missing_original: {self.missing.path_to_original}\n', output)
+        self.assertIn(f'missing_original: {self.other.path_to_original}\n', output)
+        self.assertIn('Found 6 issues', output)
+        self.assertTrue(self.orphan_original.exists())
+
+    def test_min_age(self) -> None:
+        """New files are not orphans."""
+        output = self.audit(min_age=3600)
+        self.assertIn('Found 3 issues', output)
+
+    def test_fix(self) -> None:
+        """Issues are fixed."""
+        output = self.audit(repair=True, cleanup=True, delete_missing=True)
+        self.assertIn(f'empty_resize: {self.empty.path_to_resize(self.size)} (repaired)', output)
+        self.assertFalse(self.orphan_original.exists())
+        self.assertFalse(self.orphan_resize.exists())
+        self.assertFalse(Image.objects.filter(pk=self.missing.pk).exists())
+        self.assertGreater(os.path.getsize(self.empty.path_to_resize(self.size)), 0)
+
+        self.assertIn('No issues found', self.audit(verify=True))
+
+    def test_corrupt(self) -> None:
+        """Corrupt resizes are found with verify option only."""
+        self.okay.path_to_resize(self.size).write_bytes(b'broken')
+        self.assertNotIn('corrupt_resize', self.audit().split('\n\n')[0])
+        self.assertIn(f'corrupt_resize: {self.okay.path_to_resize(self.size)}\n', self.audit(verify=True))
+
+    def test_removed_before_fix(self) -> None:
+        """Files removed since the scan are not fixed, the rest of issues are."""
+        fix = Command.fix
+
+        def removing_fix(command: Command, issue, options) -> str:
+            """Remove the file of the issue before the fix."""
+            if issue.path.exists():
+                os.remove(issue.path)
+            return fix(command, issue, options)
+
+        with mock.patch.object(Command, 'fix', removing_fix):
+            output = self.audit(cleanup=True, delete_missing=True)
+        self.assertIn(f'orphan_original: {self.orphan_original} (removed)', output)
+        self.assertIn(f'empty_resize: {self.empty.path_to_resize(self.size)} (removed)', output)
+        self.assertFalse(Image.objects.filter(pk=self.missing.pk).exists())
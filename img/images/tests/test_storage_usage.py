@@ -0,0 +1,90 @@
+import os
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+
+from PIL import Image as PillowImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Response
+from images.models import Image, StorageUsage
+from images.tests.mixins import TestImageViewBase
+
+
+class StorageUsageTestCase(TestImageViewBase, TestCase):
+    """Tests for storage usage counters and quotas."""
+
+    @property
+    def url(self) -> str:
+        """Return url for upload."""
+        return reverse('upload')
+
+    def setUp(self) -> None:
+        """Set up."""
+        self.tmp_dir = TemporaryDirectory()
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+        self.user, self.token = self.create_user_with_token()
+        self.headers = {'HTTP_X_AUTH_TOKEN': self.token.token}
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def upload(self, **data):
+        """Upload an image, return response."""
+        buffer = BytesIO()
+        PillowImage.new('RGB', (100, 100)).save(buffer, 'PNG')
+        data['file'] = SimpleUploadedFile('one.png', buffer.getvalue(), content_type='image/png')
+        return self.client.post(self.url, data, **self.headers)
+
+    def usage(self) -> tuple:
+        """Return counters of the user."""
+        usage = StorageUsage.objects.get(user=self.user)
+        return usage.originals_bytes, usage.originals_count, usage.resizes_bytes, usage.resizes_count
+
+    def test_counters(self) -> None:
+        """Counters follow files."""
+        self.assertEqual(self.upload(sizes='50x50,20x20').status_code, 200)
+        image = Image.objects.get()
+        resizes = sum(os.path.getsize(data[1]) for data in image.resizes_data)
+        self.assertEqual(self.usage(), (os.path.getsize(image.path_to_original), 1, resizes, 2))
+
+        # recreation of existing resize doesn't change count
+        url = reverse('resize-n-delete', args=[image.filename])
+        resp = self.client.post(url, {'width': 50, 'height': 50}, **self.headers)
+        self.assertEqual(resp.status_code, 201)
+        self.assertEqual(self.usage()[3], 2)
+
+        image.delete()
+        self.assertEqual(self.usage(), (0, 0, 0, 0))
+
+    def test_quota(self) -> None:
+        """Upload is rejected if it doesn't fit into quota."""
+        StorageUsage.objects.create(user=self.user, max_files=1)
+        self.assertEqual(self.upload().status_code, 200)
+
+        resp = self.upload()
+        self.assertEqual(resp.status_code, 413)
+        response = self.load(resp)
+        self.assertEqual(response['code'], Response.INVALID_REQUEST)
+        self.assertEqual(response['message'], 'Storage quota exceeded')
+
+        StorageUsage.objects.filter(user=self.user).update(max_files=None, max_bytes=self.usage()[0] + 100)
+        self.assertEqual(self.upload().status_code, 413)
+
+    def test_reconcile(self) -> None:
+        """Counters are recounted from disk."""
+        self.upload(sizes='50x50')
+        expected = self.usage()
+        StorageUsage.objects.filter(user=self.user).update(originals_bytes=1, resizes_count=100)
+
+        call_command('reconcile_usage', stdout=StringIO())
+        self.assertEqual(self.usage(), expected)
+        self.assertIsNotNone(StorageUsage.objects.get(user=self.user).reconciled_at)
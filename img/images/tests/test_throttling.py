@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from app.helpers import Response
+from app.throttling import RateLimiter
+from images.tests.mixins import TestImageViewBase
+
+
+class RateLimiterTestCase(TestImageViewBase, TestCase):
+    """Tests for rate limiting."""
+
+    @property
+    def url(self) -> str:
+        """Return url for resize/delete."""
+        return reverse('resize-n-delete', args=['unknown.jpeg'])
+
+    def setUp(self) -> None:
+        """Set up."""
+        cache.clear()
+
+    @mock.patch('time.time')
+    def test_sliding_window(self, time) -> None:
+        """Hits of previous window are weighted."""
+        limiter = RateLimiter('test', 4, 10)
+        time.return_value = 1000.0
+        self.assertEqual([limiter.hit('a') for _ in range(5)], [0, 0, 0, 0, 10])
+        self.assertEqual(limiter.hit('b'), 0)
+
+        # 4 * 0.5 + 2 hits
+        time.return_value = 1015.0
+        self.assertEqual([limiter.hit('a') for _ in range(3)], [0, 0, 3])
+
+        time.return_value = 1018.0
+        self.assertEqual(limiter.hit('a'), 0)
+        self.assertEqual(limiter.hit('a', cost=3), 2)
+
+        self.assertEqual(RateLimiter('test', 0, 10).hit('a', cost=100), 0)
+
+    def test_view(self) -> None:
+        """Too many requests – 429 error."""
+        user, token = self.create_user_with_token()
+        with mock.patch('images.decorators.rate_limiter', RateLimiter('view', 2, 60)):
+            for _ in range(2):
+                resp = self.client.delete(self.url, HTTP_X_AUTH_TOKEN=token.token)
+                self.assertEqual(resp.status_code, 404)
+
+            resp = self.client.delete(self.url, HTTP_X_AUTH_TOKEN=token.token)
+            self.assertEqual(resp.status_code, 429)
+            self.assertGreater(int(resp['Retry-After']), 0)
+            response = self.load(resp)
+            self.assertEqual(response['code'], Response.INVALID_REQUEST)
+            self.assertEqual(response['message'], 'Too many requests')
+
+            other_user, other_token = self.create_user_with_token()
+            resp = self.client.delete(self.url, HTTP_X_AUTH_TOKEN=other_token.token)
+            self.assertEqual(resp.status_code, 404)
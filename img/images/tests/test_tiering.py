@@ -0,0 +1,161 @@
+import os
+import tarfile
+import time
+from io import BytesIO, StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Dict
+from unittest import skipUnless
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Size
+from images.models import ColdOriginal, Image, StorageUsage
+from images.tests.mixins import TestImageViewBase
+from images.tiering import GZIP, PLAIN, ZSTD, compress, decompress, find_cold
+
+
+def zstd_available() -> bool:
+    """Check if zstandard is installed."""
+    try:
+        import zstandard  # type: ignore  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class TieringTestCase(TestImageViewBase, TestCase):
+    """Tests for the cold tier of originals."""
+
+    @property
+    def url(self) -> str:
+        """Return url for download of the compressible original."""
+        return reverse('original', args=[self.bmp.filename])
+
+    def setUp(self) -> None:
+        """Create idle originals: compressible BMP and incompressible JPEG."""
+        self.user, self.token = self.create_user_with_token()
+        self.tmp_dir = TemporaryDirectory()
+        self.settings = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+            COLD_ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'cold'),
+        )
+        self.settings.enable()
+
+        self.contents: Dict[str, bytes] = {}
+        noise = PillowImage.frombytes('RGB', (100, 100), os.urandom(100 * 100 * 3))
+        self.bmp = self.create_image(PillowImage.new('RGB', (200, 200), '#ff0000'), 'BMP')
+        self.jpeg = self.create_image(noise, 'JPEG')
+        self.mtime = os.stat(self.bmp.original_path).st_mtime
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.settings.disable()
+        self.tmp_dir.cleanup()
+
+    def create_image(self, img: PillowImage, image_format: str, days: int = 100) -> Image:
+        """Create image with the original not read for number of days."""
+        image = Image.objects.create(user=self.user, filename=f'{uuid4().hex}.{image_format.lower()}')
+        os.makedirs(image.original_path.parent, exist_ok=True)
+        img.save(image.original_path, image_format)
+        self.contents[image.filename] = image.original_path.read_bytes()
+        accessed = time.time() - days * 86400
+        os.utime(image.original_path, (accessed, accessed))
+        StorageUsage.add(self.user.pk, originals_bytes=os.path.getsize(image.original_path), originals_count=1)
+        return image
+
+    def tier(self) -> str:
+        """Run the command, return its output."""
+        out = StringIO()
+        call_command('tier_originals', days=30, codec=GZIP, workers=2, stdout=out)
+        return out.getvalue()
+
+    def test_command(self) -> None:
+        """Idle originals are moved, compressible ones are compressed."""
+        recent = self.create_image(PillowImage.new('RGB', (10, 10)), 'PNG', days=1)
+        del self.contents[recent.filename]
+        out = StringIO()
+        call_command('tier_originals', days=30, dry_run=True, stdout=out)
+        self.assertIn('Would move 2 originals', out.getvalue())
+        self.assertFalse(ColdOriginal.objects.exists())
+
+        self.assertIn('Moved 2 originals', self.tier())
+        self.assertFalse(self.bmp.original_path.exists())
+        self.assertFalse(self.jpeg.original_path.exists())
+        self.assertEqual(find_cold(str(self.user), self.bmp.filename)[1], GZIP)  # type: ignore
+        self.assertEqual(find_cold(str(self.user), self.jpeg.filename)[1], PLAIN)  # type: ignore
+
+        bmp = ColdOriginal.objects.get(image=self.bmp)
+        self.assertEqual(bmp.size, len(self.contents[self.bmp.filename]))
+        self.assertLess(bmp.stored_size * 10, bmp.size)
+        self.assertEqual(ColdOriginal.objects.get(image=self.jpeg).saved_bytes, 0)
+
+        out = StringIO()
+        call_command('tier_originals', stats=True, stdout=out)
+        self.assertIn('Cold tier: 2 originals', out.getvalue())
+        self.assertIn('Moved 0 originals', self.tier())
+
+    def test_rehydrate(self) -> None:
+        """Original is restored on the first read with the same bytes and mtime."""
+        self.tier()
+        image = Image.objects.get(pk=self.bmp.pk)
+        image.resize(Size(50, 50), notify=False)
+
+        self.assertTrue(image.path_to_resize(Size(50, 50)).exists())
+        self.assertEqual(image.original_path.read_bytes(), self.contents[image.filename])
+        self.assertEqual(os.stat(image.original_path).st_mtime, self.mtime)
+        self.assertIsNone(find_cold(str(self.user), image.filename))
+        self.assertFalse(ColdOriginal.objects.filter(image=image).exists())
+        self.assertIn('Moved 0 originals', self.tier())
+
+    def test_download(self) -> None:
+        """Original in the cold tier is downloaded as it was uploaded."""
+        self.tier()
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), self.contents[self.bmp.filename])
+
+    def test_export(self) -> None:
+        """Originals in the cold tier are exported decompressed and stay there."""
+        self.tier()
+        resp = self.client.get(reverse('export'), HTTP_X_AUTH_TOKEN=self.token.token)
+        with tarfile.open(fileobj=BytesIO(b''.join(resp.streaming_content))) as archive:
+            for filename, content in self.contents.items():
+                self.assertEqual(archive.extractfile(f'originals/{filename}').read(), content)  # type: ignore
+
+        path = Path(self.tmp_dir.name) / 'export.tar'
+        call_command('export_user', username=self.user.username, output=str(path), stdout=StringIO())
+        with tarfile.open(path) as archive:
+            for filename, content in self.contents.items():
+                self.assertEqual(archive.extractfile(f'originals/{filename}').read(), content)  # type: ignore
+        self.assertEqual(ColdOriginal.objects.count(), 2)
+
+    def test_storage(self) -> None:
+        """Audit finds originals in the cold tier, usage counts their sizes before compression."""
+        usage = StorageUsage.objects.get(user=self.user).originals_bytes
+        self.tier()
+        out = StringIO()
+        call_command('storage_audit', min_age=0, stdout=out)
+        self.assertIn('No issues found', out.getvalue())
+        call_command('reconcile_usage', username=self.user.username, stdout=StringIO())
+        self.assertEqual(StorageUsage.objects.get(user=self.user).originals_bytes, usage)
+
+        self.bmp.remove_files()
+        self.assertIsNone(find_cold(str(self.user), self.bmp.filename))
+        self.assertEqual(
+            StorageUsage.objects.get(user=self.user).originals_bytes, len(self.contents[self.jpeg.filename]),
+        )
+
+    @skipUnless(zstd_available(), 'zstandard is not installed')
+    def test_zstd(self) -> None:
+        """Original is compressed by zstd and restored."""
+        path, codec = compress(self.bmp.original_path, str(self.user), self.bmp.filename, ZSTD, 0.1)
+        self.assertEqual((path.suffix, codec), ('.zst', ZSTD))
+        restored = Path(self.tmp_dir.name) / 'restored.bmp'
+        decompress(path, codec, restored)
+        self.assertEqual(restored.read_bytes(), self.contents[self.bmp.filename])
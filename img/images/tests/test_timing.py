@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+from typing import Dict
+from uuid import uuid4
+
+from PIL import Image as PillowImage
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from app.middleware import ServerTimingMiddleware
+from app.profiling import StackSampler
+from app.timing import Timings, activate, deactivate, describe, timed
+from images.tests.mixins import TestImageViewBase
+
+
+class ServerTimingTestCase(TestImageViewBase, TestCase):
+    """Tests for Server-Timing header and profiling of requests."""
+
+    @property
+    def url(self) -> str:
+        """Return URL for upload."""
+        return reverse('upload')
+
+    def test_timings(self) -> None:
+        """Durations of the same phases are summed up, nothing is measured outside of a request."""
+        with timed('auth'):
+            pass
+
+        timings = Timings()
+        token = activate(timings)
+        with timed('resize', '10x10'):
+            pass
+        timings.add('resize', 1.0, '10x10')
+        timings.add('total', 2.5)
+        describe('cache', 'hits 1')
+        describe('cache', 'hits 2')
+        deactivate(token)
+
+        header = timings.header()
+        self.assertRegex(header, r'^resize;desc="10x10";dur=1\.\d, total;dur=2\.5, cache;desc="hits 2"$')
+
+    def test_disabled(self) -> None:
+        """Middleware isn't used by default."""
+        with self.assertRaises(MiddlewareNotUsed):
+            ServerTimingMiddleware(lambda request: None)
+
+        resp = self.client.get(self.url)
+        self.assertNotIn('Server-Timing', resp)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_header(self) -> None:
+        """Phases of upload are returned in the header."""
+        user, token = self.create_user_with_token()
+        content = BytesIO()
+        PillowImage.new('RGB', (300, 300)).save(content, 'JPEG')
+
+        with TemporaryDirectory() as tmp_dir, override_settings(ORIGINALS_DIR=tmp_dir, RESIZES_DIR=tmp_dir):
+            resp = Client().post(
+                self.url,
+                {'file': SimpleUploadedFile('one.jpeg', content.getvalue()), 'sizes': '200x200'},
+                HTTP_X_AUTH_TOKEN=token.token,
+            )
+
+        self.assertEqual(resp.status_code, 200)
+        for metric in ['auth', 'form', 'write', 'placeholder', 'resize;desc="200x200"', 'db', 'total']:
+            self.assertIn(f'{metric};dur=', resp['Server-Timing'])
+        self.assertRegex(resp['Server-Timing'], r'decoded-cache;desc="hits \d+, misses \d+, evictions \d+')
+
+    def test_profiles(self) -> None:
+        """Sampled requests are profiled, profiles are listed and shown by the command."""
+        with TemporaryDirectory() as tmp_dir, override_settings(PROFILE_SAMPLE_RATE=1, PROFILES_DIR=tmp_dir):
+            resp = Client().get(self.url)
+            self.assertNotIn('Server-Timing', resp)
+
+            names = os.listdir(tmp_dir)
+            self.assertEqual(len(names), 1)
+            self.assertRegex(names[0], r'-GET-upload-\d+ms\.prof$')
+
+            out = StringIO()
+            call_command('profiles', stdout=out)
+            self.assertIn(names[0], out.getvalue())
+
+            out = StringIO()
+            call_command('profiles', names[0], limit=5, stdout=out)
+            self.assertIn('function calls', out.getvalue())
+
+            out = StringIO()
+            call_command('profiles', delete_older=0, stdout=out)
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_stack_sampler(self) -> None:
+        """Stacks of watched threads are sampled."""
+        sampler = StackSampler(0.001)
+        result: Dict[str, int] = {}
+
+        def slow_request() -> None:
+            stacks = sampler.watch()
+            time.sleep(0.05)
+            sampler.unwatch()
+            result.update(stacks)
+
+        thread = threading.Thread(target=slow_request, name=uuid4().hex)
+        thread.start()
+        thread.join()
+
+        self.assertTrue(result)
+        self.assertTrue(all(stack.endswith('.slow_request') for stack in result))
+        self.assertEqual(sampler.watched, {})
@@ -0,0 +1,96 @@
+import os
+from tempfile import TemporaryDirectory
+from uuid import uuid4
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from app.helpers import Response
+from images.models import Image
+from images.tests.mixins import TestImageViewBase
+
+CONTENT = bytes(range(256)) * 4
+
+
+class OriginalViewTestCase(TestImageViewBase, TestCase):
+    """Tests for download of originals."""
+
+    @property
+    def url(self) -> str:
+        """Return URL for download."""
+        return reverse('original', args=[self.image.filename])
+
+    def setUp(self) -> None:
+        """Create image with original file."""
+        self.user, self.token = self.create_user_with_token()
+        self.image = Image.objects.create(user=self.user, filename=f'{uuid4().hex}.png', original_filename='Mój.png')
+        self.tmp_dir = TemporaryDirectory()
+        self.settings = override_settings(ORIGINALS_DIR=self.tmp_dir.name)
+        self.settings.enable()
+        os.makedirs(self.image.path_to_original.parent)
+        self.image.path_to_original.write_bytes(CONTENT)
+
+    def tearDown(self) -> None:
+        """Remove temporary directory."""
+        self.settings.disable()
+        self.tmp_dir.cleanup()
+
+    def test_access(self) -> None:
+        """Originals are available to owners only."""
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 403)
+
+        _, token = self.create_user_with_token()
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=token.token)
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(self.load(resp)['message'], 'Image not found')
+
+        self.image.tombstone()
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 404)
+
+    def test_download(self) -> None:
+        """Whole file is sent with ETag, it isn't sent again if it's not modified."""
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT)
+        self.assertEqual(resp['Content-Length'], str(len(CONTENT)))
+        self.assertEqual(resp['Content-Type'], 'image/png')
+        self.assertEqual(resp['Content-Disposition'], "attachment; filename*=utf-8''M%C3%B3j.png")
+        self.assertEqual(resp['Accept-Ranges'], 'bytes')
+
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.content, b'')
+
+    def test_range(self) -> None:
+        """Ranges of file are sent."""
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(resp.status_code, 206)
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT[10:20])
+        self.assertEqual(resp['Content-Range'], f'bytes 10-19/{len(CONTENT)}')
+        self.assertEqual(resp['Content-Length'], '10')
+
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token, HTTP_RANGE='bytes=-5')
+        self.assertEqual(b''.join(resp.streaming_content), CONTENT[-5:])
+
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token, HTTP_RANGE=f'bytes={len(CONTENT)}-')
+        self.assertEqual(resp.status_code, 416)
+        self.assertEqual(resp['Content-Range'], f'bytes */{len(CONTENT)}')
+
+    def test_missing_file(self) -> None:
+        """Missing file – 404 error."""
+        os.remove(self.image.path_to_original)
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 404)
+        self.assertEqual(self.load(resp), {'code': Response.INVALID_REQUEST, 'message': 'File not found'})
+
+    @override_settings(ORIGINALS_ACCEL_PREFIX='/protected-originals/')
+    def test_accel_redirect(self) -> None:
+        """File is sent by nginx."""
+        resp = self.client.get(self.url, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.content, b'')
+        self.assertEqual(resp['X-Accel-Redirect'], f'/protected-originals/{self.user}/{self.image.filename}')
+        self.assertEqual(resp['Content-Type'], 'image/png')
+        self.assertEqual(resp['Content-Disposition'], "attachment; filename*=utf-8''M%C3%B3j.png")
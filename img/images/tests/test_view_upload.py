@@ -1,17 +1,21 @@
+import os
 import re
-from tempfile import NamedTemporaryFile
+from io import BytesIO
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 from unittest import mock
 from uuid import uuid4
 
 from PIL import Image as PillowImage
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
-from app.helpers import Response
+from app.helpers import Response, Size
 from app.settings import env
-from images.models import Image
+from images.models import Image, StorageUsage
 from images.tests.mixins import TestImageViewBase
+from webhooks.models import WebhookEndpoint, WebhookEvent
 
 
 class UploadViewTestCase(TestImageViewBase, TestCase):
@@ -186,3 +190,63 @@ class UploadViewTestCase(TestImageViewBase, TestCase):
         response = self.load(resp)
         self.assertEqual(response['code'], Response.INVALID_PARAMETER)
         self.assertEqual(response['message'], {'sizes': ['Empty size given']})
+
+    def test_many_files(self) -> None:
+        """Several files are uploaded by one request, failed files don't discard the others."""
+        user, token = self.create_user_with_token()
+        WebhookEndpoint.objects.create(user=user, url='http://127.0.0.1/hook')
+        files = []
+        for name, size in (('one.png', (300, 200)), ('broken.png', None), ('text.png', None), ('two.png', (100, 100))):
+            content = BytesIO()
+            if size:
+                PillowImage.new('RGB', size).save(content, 'PNG')
+            elif name == 'text.png':
+                content.write(b'text content' * 100000)  # skipped while received
+            files.append(SimpleUploadedFile(name, content.getvalue(), content_type='image/png'))
+
+        with TemporaryDirectory() as tmp_dir, override_settings(
+            ORIGINALS_DIR=os.path.join(tmp_dir, 'originals'), RESIZES_DIR=os.path.join(tmp_dir, 'resizes'),
+        ):
+            data = {'file': files, 'sizes': '50x50', 'sizes.3': '20x20'}
+            with mock.patch.object(WebhookEvent, 'notify', side_effect=AssertionError('Events are queued at once')):
+                resp = self.client.post(self.url, data, HTTP_X_AUTH_TOKEN=token.token)
+
+            self.assertEqual(resp.status_code, 207)
+            results = self.load(resp)['message']
+            self.assertEqual(
+                [result['original_filename'] for result in results], ['one.png', 'broken.png', 'text.png', 'two.png'],
+            )
+            self.assertEqual(list(results[0]['sizes']), ['50x50'])
+            self.assertEqual(results[1]['error'], 'File probably is not an image')
+            self.assertEqual(results[2]['error'], 'File probably is not an image')
+            self.assertEqual(list(results[3]['sizes']), ['50x50', '20x20'])
+
+            images = Image.objects.filter(user=user).order_by('original_filename')
+            self.assertEqual([image.filename for image in images], [results[0]['filename'], results[3]['filename']])
+            for image in images:
+                self.assertTrue(image.original_path.exists())
+                self.assertTrue(image.placeholder)
+            self.assertTrue(images[1].path_to_resize(Size(20, 20)).exists())
+            usage = StorageUsage.objects.get(user=user)
+            self.assertEqual((usage.originals_count, usage.resizes_count), (2, 3))
+            events = WebhookEvent.objects.filter(event=WebhookEndpoint.UPLOAD)
+            self.assertEqual(sorted(event.payload['original_filename'] for event in events), ['one.png', 'two.png'])
+
+            broken = SimpleUploadedFile('broken.png', b'text content', content_type='image/png')
+            resp = self.client.post(self.url, {'file': [broken, broken]}, HTTP_X_AUTH_TOKEN=token.token)
+            self.assertEqual(resp.status_code, 400)
+            self.assertEqual(len(self.load(resp)['message']), 2)
+
+    def test_failed_save(self) -> None:
+        """Files of the image are removed if its row isn't saved."""
+        user, token = self.create_user_with_token()
+        content = BytesIO()
+        PillowImage.new('RGB', (100, 100)).save(content, 'PNG')
+        with TemporaryDirectory() as tmp_dir, override_settings(
+            ORIGINALS_DIR=os.path.join(tmp_dir, 'originals'), RESIZES_DIR=os.path.join(tmp_dir, 'resizes'),
+        ):
+            image_file = SimpleUploadedFile('img.png', content.getvalue(), content_type='image/png')
+            with mock.patch.object(Image, 'save', side_effect=DatabaseError('database is locked')):
+                with self.assertRaises(DatabaseError):
+                    self.client.post(self.url, {'file': image_file, 'sizes': '50x50'}, HTTP_X_AUTH_TOKEN=token.token)
+            self.assertEqual([files for _, _, files in os.walk(tmp_dir) if files], [])
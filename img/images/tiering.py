@@ -0,0 +1,131 @@
+"""Cold tier of originals.
+
+Originals which weren't read for a long time are moved to COLD_ORIGINALS_DIR compressed by the codec,
+originals which don't compress well (JPEG, WebP) are moved as is. Files keep bytes of originals, so downloads
+are the same after rehydration. File name in the cold tier is the filename with suffix of the codec.
+"""
+import gzip
+import os
+import shutil
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import BinaryIO, Optional, Tuple
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from images.storage import copy_file, file_size
+
+PLAIN = ''
+GZIP = 'gzip'
+ZSTD = 'zstd'
+CODECS = (GZIP, ZSTD)
+SUFFIXES = {ZSTD: '.zst', GZIP: '.gz', PLAIN: ''}
+ACCESS_RESOLUTION = 3600  # atime is updated not more often than once in this number of seconds
+
+
+def open_compressed(path: Path, codec: str, mode: str) -> BinaryIO:
+    """Open file of the cold tier for reading or writing of uncompressed data."""
+    if codec == GZIP:
+        return gzip.open(path, mode, compresslevel=6)  # type: ignore
+    if codec == ZSTD:
+        try:
+            import zstandard  # type: ignore
+        except ImportError as e:
+            raise ImproperlyConfigured(f'Codec "zstd" requires zstandard: {e}')
+        return zstandard.open(path, mode)
+    return open(path, mode)  # type: ignore
+
+
+def cold_path(username: str, filename: str, codec: str = PLAIN) -> Path:
+    """Return path to the original in the cold tier."""
+    return Path(settings.COLD_ORIGINALS_DIR) / username / f'{filename}{SUFFIXES[codec]}'
+
+
+def find_cold(username: str, filename: str) -> Optional[Tuple[Path, str]]:
+    """Return path and codec of the original in the cold tier, None if it isn't there."""
+    if not settings.COLD_ORIGINALS_DIR:
+        return None
+    for codec in SUFFIXES:
+        path = cold_path(username, filename, codec)
+        if path.exists():
+            return path, codec
+    return None
+
+
+def strip_suffix(name: str) -> str:
+    """Return filename of the original by name of the file in the cold tier."""
+    for suffix in SUFFIXES.values():
+        if suffix and name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def mark_accessed(path: Path) -> None:
+    """Update access time of the original, so it isn't moved to the cold tier (volumes may be mounted noatime)."""
+    with suppress(FileNotFoundError):
+        stat = os.stat(path)
+        now = time.time()
+        if now - stat.st_atime > ACCESS_RESOLUTION:
+            os.utime(path, (now, stat.st_mtime))
+
+
+def read_quietly(path: Path) -> BinaryIO:
+    """Open the file without update of its access time, so reads of tiering don't look like reads of users."""
+    try:
+        return os.fdopen(os.open(path, os.O_RDONLY | getattr(os, 'O_NOATIME', 0)), 'rb')
+    except PermissionError:
+        # O_NOATIME is allowed to the owner of the file only
+        return open(path, 'rb')
+
+
+def temporary_path(path: Path) -> Path:
+    """Return hidden unique path next to the file, audit skips hidden files."""
+    return path.with_name(f'.{path.name}.{uuid4().hex}')
+
+
+def compress(source: Path, username: str, filename: str, codec: str, min_saving: float) -> Tuple[Path, str]:
+    """Write the original to the cold tier, return its path and used codec.
+
+    Original is stored uncompressed if compression saves less than min_saving part of its size.
+    Source isn't removed. Times of the source are kept, so export has the same mtime.
+    """
+    stat = os.stat(source)
+    destination = cold_path(username, filename, codec)
+    os.makedirs(destination.parent, exist_ok=True)
+    tmp = temporary_path(destination)
+    try:
+        with read_quietly(source) as src, open_compressed(tmp, codec, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        if file_size(tmp) > stat.st_size * (1 - min_saving):
+            codec, destination = PLAIN, cold_path(username, filename)
+            with read_quietly(source) as src, open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.utime(tmp, (stat.st_atime, stat.st_mtime))
+        os.replace(tmp, destination)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(tmp)
+    return destination, codec
+
+
+def decompress(source: Path, codec: str, destination: Path) -> None:
+    """Restore the original from the cold tier, source isn't removed.
+
+    Original appears atomically, so concurrent readers don't see a partial file.
+    """
+    os.makedirs(destination.parent, exist_ok=True)
+    tmp = temporary_path(destination)
+    try:
+        if codec == PLAIN:
+            copy_file(source, tmp)
+        else:
+            with open_compressed(source, codec, 'rb') as src, open(tmp, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.utime(tmp, (time.time(), os.stat(source).st_mtime))
+        os.replace(tmp, destination)
+    finally:
+        with suppress(FileNotFoundError):
+            os.remove(tmp)
@@ -0,0 +1,68 @@
+"""Staging files of resumable uploads."""
+import fcntl
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator
+
+from django.core.files.uploadedfile import UploadedFile
+
+
+class SessionBusy(Exception):
+    """Staging file is locked by another request."""
+
+
+class StagedFile(UploadedFile):
+    """Completely uploaded staging file, it's moved to originals instead of copying."""
+
+    def __init__(self, staged: BinaryIO, path: Path, name: str) -> None:
+        """Init method."""
+        super().__init__(staged, name, None, os.fstat(staged.fileno()).st_size)
+        self.path = path
+
+    def temporary_file_path(self) -> str:
+        """Path to the file (the same as Django's temporary uploaded files have)."""
+        return str(self.path)
+
+
+@contextmanager
+def locked(path: Path, create: bool = True) -> Iterator[BinaryIO]:
+    """Open the staging file locked exclusively till the end of the block.
+
+    Missing file is created if it's asked, otherwise FileNotFoundError is raised
+    (the file of finalized or cancelled upload must not appear again).
+    Raises SessionBusy if the file is locked by another request.
+    """
+    flags = os.O_RDWR
+    if create:
+        os.makedirs(path.parent, exist_ok=True)
+        flags |= os.O_CREAT
+    with open(os.open(path, flags, 0o644), 'r+b') as staged:
+        try:
+            fcntl.flock(staged, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SessionBusy()
+        yield staged
+
+
+def append_chunk(staged: BinaryIO, offset: int, stream, length: int, block_size: int = 64 * 1024) -> int:
+    """Write up to length bytes of the stream to the staging file at the offset by blocks.
+
+    Rest of an interrupted chunk after the offset is truncated first.
+    Writing stops at the end of the stream or if client disconnects, written bytes are kept.
+    Returns count of written bytes.
+    """
+    staged.truncate(offset)
+    staged.seek(offset)
+    written = 0
+    while written < length:
+        try:
+            block = stream.read(min(block_size, length - written))
+        except OSError:
+            break
+        if not block:
+            break
+        staged.write(block)
+        written += len(block)
+    staged.flush()
+    return written
@@ -0,0 +1,12 @@
+from django.core.exceptions import ValidationError
+
+from app.helpers import Size
+
+
+def validate_sizes(value: str) -> None:
+    """Validate comma separated sizes "{WIDTH}x{HEIGHT}"."""
+    for size in value.split(','):
+        if not size:
+            raise ValidationError('Empty size given', params={'value': size})
+        if not Size.is_valid(size):
+            raise ValidationError('Value contains inappropriate symbols', params={'value': size})
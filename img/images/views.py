@@ -1,13 +1,26 @@
+import mimetypes
+from urllib.parse import quote
+from uuid import UUID
+
+from PIL import Image as PillowImage, UnidentifiedImageError
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.handlers.wsgi import WSGIRequest
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
+from django.utils.http import content_disposition_header
 from django.views.decorators.csrf import csrf_exempt
 from django.views.generic import View
 
 from app.helpers import Response, Size
-from images.decorators import image_method, token_protected_method
-from images.forms import ResizeImageForm, UploadImageForm
-from images.models import Image
+from app.timing import timed
+from images.archive import iter_archive, iter_bytes
+from images.decorators import image_method, token_protected_method, upload_session_method
+from images.forms import ResizeImageForm, UploadImageForm, UploadImagesForm, UploadSessionForm
+from images.models import Image, ResizeAccess, StorageUsage, UploadSession
+from images.sniffing import NOT_AN_IMAGE, SniffingUploadHandler, UploadRejected, check_pixels, sniffed_files
+from images.tiering import mark_accessed
+from images.uploads import SessionBusy, StagedFile, append_chunk, locked
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -17,22 +30,215 @@ class ImageCreateView(View):
     @token_protected_method
     def post(self, request: WSGIRequest) -> HttpResponse:
         """Upload method."""
+        # checking limits before the body is read
+        usage = StorageUsage.objects.filter(user=request.user).first()
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        max_upload = usage.max_upload if usage else settings.UPLOAD_MAX_BYTES
+        if max_upload and content_length > max_upload:
+            return Response.json(Response.INVALID_REQUEST, 'Upload is too big', 413)
+        if usage and not usage.allows(content_length):
+            return Response.json(Response.INVALID_REQUEST, 'Storage quota exceeded', 413)
+
+        # files which are not images are rejected by their first bytes
+        request.upload_handlers.insert(0, SniffingUploadHandler(request))
+        with timed('body'):
+            sniffed = sniffed_files(request)
+        if len(sniffed) > 1:
+            return self.upload_many(request, sniffed)
+        if sniffed and sniffed[0][2]:
+            return Response.json(Response.INVALID_PARAMETER, {'file': [sniffed[0][2]]}, 400)
+
         # validating post data
-        form = UploadImageForm(request.POST, request.FILES)
-        if not form.is_valid():
+        form = UploadImageForm(request.POST, request.FILES, user=request.user)
+        with timed('form'):
+            is_valid = form.is_valid()
+        if not is_valid:
             return Response.json(Response.INVALID_PARAMETER, form.errors, 400)
 
         form_data = form.clean()
+        sizes = form_data['sizes'] or []
+        for preset in form_data['presets']:
+            sizes += preset.sizes_list
 
         upload = Image.upload(
             form_data['file'],
-            form_data['sizes'],
+            Size.unique(sizes),
             request.FILES.get('file'),
             request.user
         )
 
         return Response.json(Response.OKAY, upload)
 
+    def upload_many(self, request: WSGIRequest, sniffed: list) -> HttpResponse:
+        """Upload of several files, response contains results of files in the same order.
+
+        Status is 207 if some files failed and 400 if all of them failed.
+        """
+        form = UploadImagesForm(request.POST, request.FILES, user=request.user, sniffed=sniffed)
+        with timed('form'):
+            is_valid = form.is_valid()
+        if not is_valid:
+            return Response.json(Response.INVALID_PARAMETER, form.errors, 400)
+
+        uploads = form.clean()['uploads']
+        valid = [upload for upload in uploads if not isinstance(upload[0], ValidationError)]
+        uploaded = iter(Image.upload_many(valid, request.user))
+        results = []
+        for img, _, uploaded_file in uploads:
+            result = img if isinstance(img, ValidationError) else next(uploaded)
+            if isinstance(result, ValidationError):
+                results.append({'original_filename': uploaded_file.name, 'error': result.messages[0]})
+            elif isinstance(result, Exception):
+                results.append({'original_filename': uploaded_file.name, 'error': str(result)})
+            else:
+                results.append({'original_filename': uploaded_file.name, **result})
+
+        failed = sum('error' in result for result in results)
+        if failed == len(results):
+            return Response.json(Response.INVALID_PARAMETER, results, 400)
+        return Response.json(Response.OKAY, results, 207 if failed else 200)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadSessionCreateView(View):
+    """View starting resumable upload of a big image."""
+
+    @token_protected_method
+    def post(self, request: WSGIRequest) -> HttpResponse:
+        """Create upload session, the file is sent by chunks later."""
+        form = UploadSessionForm(request.POST, user=request.user)
+        with timed('form'):
+            is_valid = form.is_valid()
+        if not is_valid:
+            return Response.json(Response.INVALID_PARAMETER, form.errors, 400)
+
+        form_data = form.clean()
+        usage = StorageUsage.objects.filter(user=request.user).first()
+        max_upload = usage.max_upload if usage else settings.UPLOAD_MAX_BYTES
+        if max_upload and form_data['size'] > max_upload:
+            return Response.json(Response.INVALID_REQUEST, 'Upload is too big', 413)
+        if usage and not usage.allows(form_data['size']):
+            return Response.json(Response.INVALID_REQUEST, 'Storage quota exceeded', 413)
+
+        sizes = form_data['sizes'] or []
+        for preset in form_data['presets']:
+            sizes += preset.sizes_list
+        upload_session = UploadSession.objects.create(
+            user=request.user,
+            original_filename=form_data['filename'],
+            size=form_data['size'],
+            sizes=','.join(str(size) for size in Size.unique(sizes)),
+            expires_at=UploadSession.expiration(),
+        )
+
+        return Response.json(Response.OKAY, upload_session.as_dict(), 201)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class UploadSessionView(View):
+    """View for chunks, state, finalization and cancellation of resumable upload.
+
+    Current offset is sent in X-Upload-Offset header of every response.
+    """
+
+    @staticmethod
+    def state(upload_session: UploadSession, code: int, message, status_code: int = 200) -> HttpResponse:
+        """JSON response with the offset header."""
+        return Response.json(code, message, status_code, headers={'X-Upload-Offset': str(upload_session.offset)})
+
+    @token_protected_method
+    @upload_session_method
+    def get(self, request: WSGIRequest, session_id: UUID) -> HttpResponse:
+        """State of the upload."""
+        return self.state(request.upload_session, Response.OKAY, request.upload_session.as_dict())
+
+    @token_protected_method
+    @upload_session_method
+    def put(self, request: WSGIRequest, session_id: UUID) -> HttpResponse:
+        """Append the chunk from the body, its offset is passed in X-Upload-Offset header."""
+        upload_session = request.upload_session
+        try:
+            offset = int(request.headers['X-Upload-Offset'])
+        except (KeyError, ValueError):
+            return self.state(upload_session, Response.INVALID_PARAMETER, 'X-Upload-Offset header is required', 400)
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if offset + length > upload_session.size:
+            return self.state(upload_session, Response.INVALID_PARAMETER, 'Chunk exceeds size of the file', 400)
+
+        try:
+            with locked(upload_session.path) as staged:
+                try:
+                    upload_session.refresh_from_db(fields=['offset'])
+                except UploadSession.DoesNotExist:
+                    # finalized or cancelled meanwhile, the file is created again by the lock
+                    upload_session.remove()
+                    return Response.json(Response.INVALID_REQUEST, 'Upload session not found', 404)
+                if offset != upload_session.offset:
+                    return self.state(upload_session, Response.INVALID_REQUEST, 'Offset mismatch', 409)
+
+                with timed('write'):
+                    written = append_chunk(staged, offset, request, length)
+                upload_session.offset = offset + written
+                upload_session.expires_at = UploadSession.expiration()
+                upload_session.save(update_fields=['offset', 'expires_at'])
+        except SessionBusy:
+            return self.state(upload_session, Response.INVALID_REQUEST, 'Another chunk is being uploaded', 409)
+
+        return self.state(upload_session, Response.OKAY, upload_session.as_dict())
+
+    @token_protected_method
+    @upload_session_method
+    def post(self, request: WSGIRequest, session_id: UUID) -> HttpResponse:
+        """Finalize the upload, the image is created the same way as by regular upload.
+
+        Session is checked again and deleted under the lock, so concurrent requests don't finalize it twice.
+        """
+        upload_session = request.upload_session
+        if upload_session.offset < upload_session.size:
+            return self.state(upload_session, Response.INVALID_REQUEST, 'Upload is not complete', 400)
+
+        try:
+            with locked(upload_session.path, create=False) as staged:
+                upload_session.refresh_from_db(fields=['offset'])
+                if upload_session.offset < upload_session.size:
+                    return self.state(upload_session, Response.INVALID_REQUEST, 'Upload is not complete', 400)
+                try:
+                    img = PillowImage.open(staged)
+                    check_pixels(img)
+                    upload = Image.upload(
+                        img,
+                        Size.list_from_str(upload_session.sizes),
+                        StagedFile(staged, upload_session.path, upload_session.original_filename),
+                        request.user,
+                    )
+                except (OSError, PillowImage.DecompressionBombError, UploadRejected) as e:
+                    upload_session.remove()
+                    message = NOT_AN_IMAGE if isinstance(e, UnidentifiedImageError) else str(e)
+                    return Response.json(Response.INVALID_PARAMETER, message, 400)
+                upload_session.delete()
+        except (FileNotFoundError, UploadSession.DoesNotExist):
+            return Response.json(Response.INVALID_REQUEST, 'Upload session not found', 404)
+        except SessionBusy:
+            return self.state(upload_session, Response.INVALID_REQUEST, 'Upload is being finalized', 409)
+
+        return Response.json(Response.OKAY, upload)
+
+    @token_protected_method
+    @upload_session_method
+    def delete(self, request: WSGIRequest, session_id: UUID) -> HttpResponse:
+        """Cancel the upload, the upload which is being finalized or written is not cancelled."""
+        upload_session = request.upload_session
+        try:
+            with locked(upload_session.path, create=False):
+                upload_session.remove()
+        except FileNotFoundError:
+            # no chunks were sent
+            upload_session.remove()
+        except SessionBusy:
+            return self.state(upload_session, Response.INVALID_REQUEST, 'Upload is in progress', 409)
+
+        return Response.json(Response.OKAY, 'Deleted')
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ImageResizeDeleteView(View):
@@ -42,20 +248,98 @@ class ImageResizeDeleteView(View):
     @image_method
     def post(self, request: WSGIRequest, filename: str) -> HttpResponse:
         """Resize method."""
-        form = ResizeImageForm(request.POST)
-        if not form.is_valid():
+        form = ResizeImageForm(request.POST, user=request.user)
+        with timed('form'):
+            is_valid = form.is_valid()
+        if not is_valid:
             return Response.json(Response.INVALID_PARAMETER, form.errors, 400)
 
         form_data = form.clean()
-        size = Size(form_data['width'], form_data['height'])
+        if form_data['preset']:
+            sizes = form_data['preset'].sizes_list
+            urls = {str(size): request.image.resize(size, keep_decoded=len(sizes) > 1) for size in sizes}
+            return Response.json(Response.OKAY, urls, 201)
+
+        size = form_data['size']
         url = request.image.resize(size)
 
-        return Response.json(Response.OKAY, url, 201)
+        return Response.json(Response.OKAY, url, 201, headers={'X-Resize-Size': str(size)})
 
     @token_protected_method
     @image_method
     def delete(self, request: WSGIRequest, filename: str) -> HttpResponse:
-        """Delete method."""
-        request.image.delete()
+        """Delete method.
+
+        Files are removed later by reaper command.
+        """
+        request.image.tombstone()
 
         return Response.json(Response.OKAY, 'Deleted')
+
+
+class ImageOriginalView(View):
+    """View for download of the original image."""
+
+    @token_protected_method
+    @image_method
+    def get(self, request: WSGIRequest, filename: str) -> HttpResponse:
+        """Download method.
+
+        If ORIGINALS_ACCEL_PREFIX is set, the file is sent by nginx (X-Accel-Redirect to the internal location),
+        otherwise by Django.
+        """
+        image = request.image
+        # original is restored from the cold tier before it's sent
+        path = image.path_to_original
+        mark_accessed(path)
+        if settings.ORIGINALS_ACCEL_PREFIX:
+            response = HttpResponse(content_type=mimetypes.guess_type(image.filename)[0] or 'application/octet-stream')
+            prefix = settings.ORIGINALS_ACCEL_PREFIX.rstrip('/')
+            response['X-Accel-Redirect'] = quote(f'{prefix}/{image.user}/{filename}')
+            response['Content-Disposition'] = content_disposition_header(True, image.original_filename)
+            return response
+
+        try:
+            return Response.file(request, path, image.original_filename)
+        except FileNotFoundError:
+            return Response.json(Response.INVALID_REQUEST, 'File not found', 404)
+
+
+class ExportView(View):
+    """View for export of all originals of the user."""
+
+    @token_protected_method
+    def get(self, request: WSGIRequest) -> HttpResponse:
+        """Stream tar archive of originals with manifest of images, import_user command restores it."""
+        response = StreamingHttpResponse(iter_bytes(iter_archive(request.user)), content_type='application/x-tar')
+        response['Content-Disposition'] = content_disposition_header(True, f'{request.user}.tar')
+        return response
+
+
+class ResizeRegenerateView(View):
+    """View recreating evicted resizes.
+
+    Nginx passes here requests of resizes which are missing on disk.
+    Only resizes which were evicted are recreated, so it can't be used to create arbitrary sizes.
+    """
+
+    def get(self, request: WSGIRequest, username: str, size: str, filename: str) -> HttpResponse:
+        """Recreate resize and return it."""
+        access = ResizeAccess.objects.filter(
+            image__user__username=username,
+            image__filename=filename,
+            image__deleted_at__isnull=True,
+            size=size,
+            evicted_at__isnull=False,
+        ).select_related('image', 'image__user').first()
+        if not access:
+            return Response.json(Response.INVALID_REQUEST, 'Image not found', 404)
+
+        resize_size = Size.from_str(size)
+        path = access.image.path_to_resize(resize_size)
+        if not path.exists():
+            access.image.resize(resize_size, notify=False)
+        access.evicted_at = None
+        access.save(update_fields=['evicted_at'])
+
+        return FileResponse(open(path, 'rb'))
@@ -3,7 +3,9 @@ from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 
 from images.admin import ImageInline
+from images.models import SizePolicy, StorageUsage
 from tokens.models import Token
+from webhooks.admin import WebhookEndpointInline
 
 
 class TokenInline(admin.StackedInline):
@@ -13,16 +15,48 @@ class TokenInline(admin.StackedInline):
     can_delete = False
 
 
+class StorageUsageInline(admin.StackedInline):
+    """Inline with user's storage usage and quota."""
+
+    model = StorageUsage
+    can_delete = False
+    readonly_fields = ('originals_bytes', 'originals_count', 'resizes_bytes', 'resizes_count', 'reconciled_at')
+
+
+class SizePolicyInline(admin.StackedInline):
+    """Inline with sizes allowed to the user."""
+
+    model = SizePolicy
+
+
 class UserAdmin(BaseUserAdmin):
-    """Redefine user admin to include inlines with token and images."""
+    """Redefine user admin to include inlines with token, storage and images."""
 
-    list_display = ('username', 'is_staff', 'images_count')
-    inlines = (TokenInline, ImageInline)
+    list_display = ('username', 'is_staff', 'images_count', 'storage_used', 'files_count')
+    list_select_related = ('storage_usage',)
+    inlines = (TokenInline, WebhookEndpointInline, StorageUsageInline, SizePolicyInline, ImageInline)
 
     def images_count(self, obj) -> int:
         """Return count of images of the user."""
         return obj.images.count()
 
+    def storage_used(self, obj) -> str:
+        """Return used storage in Mb."""
+        usage = getattr(obj, 'storage_usage', None)
+        if not usage:
+            return '-'
+        used = '{:.2f} Mb'.format(usage.used_bytes / 1024 / 1024)
+        if usage.max_bytes is None:
+            return used
+        return '{} of {:.2f} Mb'.format(used, usage.max_bytes / 1024 / 1024)
+
+    def files_count(self, obj) -> str:
+        """Return count of originals and resizes."""
+        usage = getattr(obj, 'storage_usage', None)
+        if not usage:
+            return '-'
+        return f'{usage.originals_count} + {usage.resizes_count}'
+
 
 # Re-register UserAdmin
 admin.site.unregister(User)
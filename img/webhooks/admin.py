@@ -0,0 +1,31 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from webhooks.models import WebhookEndpoint, WebhookEvent
+
+
+class WebhookEndpointInline(admin.StackedInline):
+    """Inline with webhook endpoints of the user."""
+
+    model = WebhookEndpoint
+    extra = 0
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """Queued and dead events admin."""
+
+    list_display = ('pk', 'event', 'endpoint', 'status', 'attempts', 'next_attempt_at', 'last_error')
+    list_filter = ('status', 'event')
+    list_select_related = ('endpoint', 'endpoint__user')
+    readonly_fields = ('endpoint', 'event', 'payload', 'attempts', 'last_error', 'created_at')
+    actions = ('retry',)
+
+    @admin.action(description='Retry selected events')
+    def retry(self, request, queryset) -> None:
+        """Send events again (dead letters as well)."""
+        queryset.update(status=WebhookEvent.PENDING, attempts=0, next_attempt_at=timezone.now())
+
+    def has_add_permission(self, request, obj=None) -> bool:
+        """Add permission."""
+        return False
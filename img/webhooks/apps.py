@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class WebhooksConfig(AppConfig):
+    """Config class."""
+
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'webhooks'
@@ -0,0 +1,55 @@
+"""HTTP client keeping connections to endpoints alive between batches."""
+from http.client import HTTPConnection, HTTPSConnection, RemoteDisconnected
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+class ConnectionPool:
+    """One keep-alive connection per scheme and host."""
+
+    def __init__(self, timeout: float) -> None:
+        """Init method."""
+        self.timeout = timeout
+        self.connections: Dict[Tuple[str, str], HTTPConnection] = {}
+
+    def post(self, url: str, body: bytes, headers: Dict[str, str]) -> int:
+        """Send POST request, return status of the response.
+
+        Request is repeated once on a new connection if the kept one was closed by the server.
+        Raises OSError or HTTPException if the request fails.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        while True:
+            reused = key in self.connections
+            connection = self.connections.get(key) or self.connect(parts.scheme, parts.netloc)
+            self.connections[key] = connection
+            try:
+                connection.request('POST', path, body, headers)
+                response = connection.getresponse()
+                response.read()
+            except (RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                self.close(key)
+                if reused:
+                    continue
+                raise
+            except Exception:
+                self.close(key)
+                raise
+            if response.will_close:
+                self.close(key)
+            return response.status
+
+    def connect(self, scheme: str, netloc: str) -> HTTPConnection:
+        """Create connection (it's opened by the first request)."""
+        connection_class = HTTPSConnection if scheme == 'https' else HTTPConnection
+        return connection_class(netloc, timeout=self.timeout)
+
+    def close(self, key: Optional[Tuple[str, str]] = None) -> None:
+        """Close connection to the host, all connections by default."""
+        keys = [key] if key else list(self.connections)
+        for connection_key in keys:
+            connection = self.connections.pop(connection_key, None)
+            if connection:
+                connection.close()
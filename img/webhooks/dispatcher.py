@@ -0,0 +1,86 @@
+"""Delivery of queued events to webhook endpoints by batches."""
+import json
+import random
+from datetime import timedelta
+from http.client import HTTPException
+from typing import List, Tuple
+
+from django.utils import timezone
+
+from webhooks.client import ConnectionPool
+from webhooks.models import WebhookEndpoint, WebhookEvent
+
+
+class Dispatcher:
+    """Sends due events of every endpoint in one request, failed batches are retried with exponential backoff."""
+
+    def __init__(self, batch_size: int, max_attempts: int, backoff: float, max_backoff: float, timeout: float) -> None:
+        """Init method."""
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool = ConnectionPool(timeout)
+
+    def run_once(self) -> Tuple[int, int, int]:
+        """Send one batch to every endpoint with due events, return count of sent, failed and dead events."""
+        sent = failed = dead = 0
+        endpoint_ids = WebhookEvent.objects.filter(
+            status=WebhookEvent.PENDING, next_attempt_at__lte=timezone.now(), endpoint__is_active=True,
+        ).values_list('endpoint_id', flat=True).distinct().order_by()
+        for endpoint in WebhookEndpoint.objects.filter(pk__in=list(endpoint_ids)):
+            events = list(
+                endpoint.pending_events.filter(
+                    status=WebhookEvent.PENDING, next_attempt_at__lte=timezone.now(),
+                ).order_by('pk')[:self.batch_size]
+            )
+            if not events:
+                continue
+            error = self.send(endpoint, events)
+            if not error:
+                WebhookEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+                sent += len(events)
+                continue
+
+            retried, died = self.fail(events, error)
+            failed += retried
+            dead += died
+        return sent, failed, dead
+
+    def send(self, endpoint: WebhookEndpoint, events: List[WebhookEvent]) -> str:
+        """Post the events to the endpoint, return error or empty string on success."""
+        body = json.dumps({'events': [event.as_dict() for event in events]}).encode()
+        headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'img-webhooks',
+            'X-Webhook-Signature': endpoint.sign(body),
+        }
+        try:
+            status = self.pool.post(endpoint.url, body, headers)
+        except (OSError, HTTPException) as e:
+            return f'{e.__class__.__name__}: {e}'
+        if not 200 <= status < 300:
+            return f'HTTP {status}'
+        return ''
+
+    def fail(self, events: List[WebhookEvent], error: str) -> Tuple[int, int]:
+        """Schedule retry of the events or turn them into dead letters, return count of both."""
+        now = timezone.now()
+        # jitter spreads retries of many endpoints failed at once, events of the batch stay together
+        jitter = random.uniform(1, 1.25)
+        dead = 0
+        for event in events:
+            event.attempts += 1
+            event.last_error = error[:1000]
+            if event.attempts >= self.max_attempts:
+                event.status = WebhookEvent.DEAD
+                dead += 1
+                continue
+            delay = min(self.backoff * 2 ** (event.attempts - 1), self.max_backoff) * jitter
+            event.next_attempt_at = now + timedelta(seconds=delay)
+        WebhookEvent.objects.bulk_update(events, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+        return len(events) - dead, dead
+
+    def close(self) -> None:
+        """Close connections."""
+        self.pool.close()
@@ -0,0 +1,46 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from webhooks.dispatcher import Dispatcher
+
+
+class Command(BaseCommand):
+    """Sends queued events to webhook endpoints.
+
+    Events of every endpoint are sent by batches, so events created between runs are coalesced.
+    Only one dispatcher should be run.
+    Sample how to run: python manage.py dispatch_webhooks --loop
+    """
+
+    def add_arguments(self, parser) -> None:
+        """Add arguments."""
+        parser.add_argument('--batch', type=int, default=settings.WEBHOOK_BATCH_SIZE, help='Events per request')
+        parser.add_argument('--loop', action='store_true', help='Wait for new events instead of exit')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds between runs in loop mode')
+
+    def handle(self, *args, **options) -> None:
+        """Run the command."""
+        if options['batch'] < 1:
+            raise CommandError('Batch should be greater than 1')
+
+        dispatcher = Dispatcher(
+            batch_size=options['batch'],
+            max_attempts=settings.WEBHOOK_MAX_ATTEMPTS,
+            backoff=settings.WEBHOOK_BACKOFF,
+            max_backoff=settings.WEBHOOK_MAX_BACKOFF,
+            timeout=settings.WEBHOOK_TIMEOUT,
+        )
+        try:
+            while True:
+                sent, failed, dead = dispatcher.run_once()
+                if sent or failed or dead:
+                    self.stdout.write(self.style.SUCCESS(f'Sent {sent} events, failed {failed}, dead {dead}'))
+                    continue  # next batches are sent without waiting
+                if not options['loop']:
+                    self.stdout.write('Nothing to send')
+                    break
+                time.sleep(options['interval'])
+        finally:
+            dispatcher.close()
@@ -0,0 +1,124 @@
+import hashlib
+import hmac
+import secrets
+from typing import Dict, Iterable, List, Tuple
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+def generate_secret() -> str:
+    """Return random key of signatures."""
+    return secrets.token_hex(32)
+
+
+class WebhookEndpoint(models.Model):
+    """URL of the user which is notified when uploads, resizes and deletes complete."""
+
+    UPLOAD = 'upload'
+    RESIZE = 'resize'
+    DELETE = 'delete'
+    EVENTS = (
+        (UPLOAD, 'Image uploaded'),
+        (RESIZE, 'Resize created'),
+        (DELETE, 'Files of deleted image removed'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='webhook_endpoints')
+    url = models.URLField(max_length=1024)
+    secret = models.CharField(
+        max_length=64, default=generate_secret, help_text='Key of HMAC-SHA256 signature in X-Webhook-Signature header',
+    )
+    events = models.CharField(
+        max_length=64, blank=True, help_text='Comma separated events: upload,resize,delete. Empty value – all events',
+    )
+    is_active = models.BooleanField(default=True)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        ordering = ['user_id', 'pk']
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'Webhook {self.user}: {self.url}'
+
+    def subscribed(self, event: str) -> bool:
+        """Check if the endpoint is notified about the event."""
+        return not self.events or event in self.events.split(',')
+
+    def sign(self, body: bytes) -> str:
+        """Return signature of the body."""
+        return 'sha256=' + hmac.new(self.secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class WebhookEvent(models.Model):
+    """Event waiting for delivery to an endpoint.
+
+    Delivered events are removed, events which failed all attempts stay as dead letters.
+    """
+
+    PENDING = 'pending'
+    DEAD = 'dead'
+    STATUSES = (
+        (PENDING, 'Pending'),
+        (DEAD, 'Dead letter'),
+    )
+
+    endpoint = models.ForeignKey(WebhookEndpoint, on_delete=models.CASCADE, related_name='pending_events')
+    event = models.CharField(max_length=10, choices=WebhookEndpoint.EVENTS)
+    payload = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = models.Manager()
+
+    class Meta:
+        """Meta class."""
+
+        ordering = ['pk']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self) -> str:
+        """Model as string."""
+        return f'{self.event} #{self.pk}'
+
+    @classmethod
+    def notify(cls, user_id: int, event: str, payload: Dict) -> None:
+        """Queue the event for all endpoints of the user subscribed to it."""
+        cls.notify_many([(user_id, event, payload)])
+
+    @classmethod
+    def notify_many(cls, notifications: Iterable[Tuple[int, str, Dict]]) -> None:
+        """Queue events (user id, event, payload) by one query of endpoints and one insert."""
+        notifications = list(notifications)
+        if not notifications:
+            return
+        endpoints: Dict[int, List[WebhookEndpoint]] = {}
+        for endpoint in WebhookEndpoint.objects.filter(
+                user_id__in={user_id for user_id, _, _ in notifications}, is_active=True):
+            endpoints.setdefault(endpoint.user_id, []).append(endpoint)
+        if not endpoints:
+            return
+
+        cls.objects.bulk_create([
+            cls(endpoint=endpoint, event=event, payload=payload)
+            for user_id, event, payload in notifications
+            for endpoint in endpoints.get(user_id, [])
+            if endpoint.subscribed(event)
+        ])
+
+    def as_dict(self) -> Dict:
+        """Return the event for request body."""
+        return {
+            'id': self.pk,
+            'event': self.event,
+            'created_at': self.created_at.isoformat(),
+            'data': self.payload,
+        }
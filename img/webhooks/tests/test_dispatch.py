@@ -0,0 +1,133 @@
+import json
+import socket
+import threading
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from typing import List, Tuple
+from uuid import uuid4
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from webhooks.dispatcher import Dispatcher
+from webhooks.models import WebhookEndpoint, WebhookEvent
+
+
+class Receiver(ThreadingHTTPServer):
+    """Local HTTP endpoint recording received requests."""
+
+    def __init__(self) -> None:
+        """Init method, listens on a free port."""
+        super().__init__(('127.0.0.1', 0), ReceiverHandler)
+        self.requests: List[Tuple[dict, dict]] = []
+        self.sockets: List[socket.socket] = []
+        self.statuses: List[int] = []
+
+    @property
+    def url(self) -> str:
+        """Return URL of the endpoint."""
+        return f'http://127.0.0.1:{self.server_port}/hook?source=img'
+
+
+class ReceiverHandler(BaseHTTPRequestHandler):
+    """Handler of the receiver keeping connections alive."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self) -> None:
+        """Record connections."""
+        super().setup()
+        self.server.sockets.append(self.connection)  # type: ignore
+
+    def do_POST(self) -> None:  # noqa: N802
+        """Record the request and respond with the next planned status."""
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((dict(self.headers), json.loads(body)))  # type: ignore
+        statuses = self.server.statuses  # type: ignore
+        self.send_response(statuses.pop(0) if statuses else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args) -> None:
+        """Be quiet."""
+
+
+class DispatchTestCase(TestCase):
+    """Tests for delivery of webhooks."""
+
+    def setUp(self) -> None:
+        """Start the receiver."""
+        self.receiver = Receiver()
+        threading.Thread(target=self.receiver.serve_forever, daemon=True).start()
+        self.user = User.objects.create_user(username=uuid4().hex)
+        self.endpoint = WebhookEndpoint.objects.create(user=self.user, url=self.receiver.url)
+        self.dispatcher = Dispatcher(batch_size=2, max_attempts=2, backoff=60, max_backoff=600, timeout=5)
+
+    def tearDown(self) -> None:
+        """Stop the receiver."""
+        self.dispatcher.close()
+        self.receiver.shutdown()
+        self.receiver.server_close()
+
+    def test_batches(self) -> None:
+        """Events are sent by signed batches over one connection and removed after delivery."""
+        WebhookEndpoint.objects.create(user=self.user, url=self.receiver.url, events='delete')
+        WebhookEvent.notify_many([
+            (self.user.pk, WebhookEndpoint.RESIZE, {'size': f'{width}x100'}) for width in (100, 200, 300)
+        ])
+        self.assertEqual(WebhookEvent.objects.count(), 3)
+
+        self.assertEqual(self.dispatcher.run_once(), (2, 0, 0))
+        self.assertEqual(self.dispatcher.run_once(), (1, 0, 0))
+        self.assertEqual(self.dispatcher.run_once(), (0, 0, 0))
+
+        self.assertEqual(len(self.receiver.sockets), 1)
+        self.assertEqual([len(body['events']) for _, body in self.receiver.requests], [2, 1])
+        headers, body = self.receiver.requests[0]
+        self.assertEqual(body['events'][0]['data'], {'size': '100x100'})
+        self.assertEqual(headers['X-Webhook-Signature'], self.endpoint.sign(json.dumps(body).encode()))
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_retries(self) -> None:
+        """Failed batches are retried with backoff and become dead letters after max attempts."""
+        WebhookEvent.notify(self.user.pk, WebhookEndpoint.UPLOAD, {'filename': 'a.png'})
+        self.receiver.statuses = [500, 503]
+
+        self.assertEqual(self.dispatcher.run_once(), (0, 1, 0))
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.attempts, event.last_error), (1, 'HTTP 500'))
+        self.assertGreaterEqual(event.next_attempt_at, timezone.now() + timedelta(seconds=59))
+        self.assertEqual(self.dispatcher.run_once(), (0, 0, 0))
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(self.dispatcher.run_once(), (0, 0, 1))
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.DEAD)
+
+    def test_unreachable(self) -> None:
+        """Connection errors are retried as well."""
+        WebhookEndpoint.objects.filter(pk=self.endpoint.pk).update(url='http://127.0.0.1:9/hook')
+        WebhookEvent.notify(self.user.pk, WebhookEndpoint.UPLOAD, {'filename': 'a.png'})
+
+        self.assertEqual(self.dispatcher.run_once(), (0, 1, 0))
+        self.assertIn('ConnectionRefusedError', WebhookEvent.objects.get().last_error)
+
+    def test_reconnect(self) -> None:
+        """Connection closed by the endpoint between batches is opened again."""
+        WebhookEvent.notify(self.user.pk, WebhookEndpoint.UPLOAD, {'filename': 'a.png'})
+        self.dispatcher.run_once()
+        self.receiver.sockets[0].shutdown(socket.SHUT_RDWR)
+
+        WebhookEvent.notify(self.user.pk, WebhookEndpoint.UPLOAD, {'filename': 'b.png'})
+        self.assertEqual(self.dispatcher.run_once(), (1, 0, 0))
+        self.assertEqual(len(self.receiver.requests), 2)
+        self.assertEqual(len(self.receiver.sockets), 2)
+
+    def test_command(self) -> None:
+        """Command sends all due events."""
+        WebhookEvent.notify(self.user.pk, WebhookEndpoint.DELETE, {'filename': 'a.png'})
+        out = StringIO()
+        call_command('dispatch_webhooks', stdout=out)
+        self.assertIn('Sent 1 events, failed 0, dead 0', out.getvalue())
@@ -0,0 +1,58 @@
+import os
+from io import BytesIO, StringIO
+from tempfile import TemporaryDirectory
+
+from PIL import Image as PillowImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from images.models import Image
+from images.tests.mixins import TestImageViewBase
+from webhooks.models import WebhookEndpoint, WebhookEvent
+
+
+class EventsTestCase(TestImageViewBase, TestCase):
+    """Tests for events of images."""
+
+    @property
+    def url(self) -> str:
+        """Return url for upload."""
+        return reverse('upload')
+
+    def setUp(self) -> None:
+        """Create user with webhook endpoint."""
+        self.user, self.token = self.create_user_with_token()
+        WebhookEndpoint.objects.create(user=self.user, url='http://127.0.0.1/hook')
+        self.tmp_dir = TemporaryDirectory()
+        self.settings_override = override_settings(
+            ORIGINALS_DIR=os.path.join(self.tmp_dir.name, 'originals'),
+            RESIZES_DIR=os.path.join(self.tmp_dir.name, 'resizes'),
+        )
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        """Tear down."""
+        self.settings_override.disable()
+        self.tmp_dir.cleanup()
+
+    def test_events(self) -> None:
+        """Upload, resize and removal of files are queued, resizes of upload are reported by upload event."""
+        buffer = BytesIO()
+        PillowImage.new('RGB', (200, 200)).save(buffer, 'PNG')
+        image_file = SimpleUploadedFile('img.png', buffer.getvalue(), content_type='image/png')
+        resp = self.client.post(self.url, {'file': image_file, 'sizes': '50x50'}, HTTP_X_AUTH_TOKEN=self.token.token)
+        filename = self.load(resp)['message']['filename']
+        url = reverse('resize-n-delete', args=[filename])
+        self.client.post(url, {'width': 70, 'height': 70}, HTTP_X_AUTH_TOKEN=self.token.token)
+        self.client.delete(url, HTTP_X_AUTH_TOKEN=self.token.token)
+        call_command('reaper', stdout=StringIO())
+
+        events = list(WebhookEvent.objects.values_list('event', 'payload'))
+        self.assertEqual([event for event, _ in events], ['upload', 'resize', 'delete'])
+        self.assertEqual(list(events[0][1]['sizes']), ['50x50'])
+        self.assertEqual(events[0][1]['original_filename'], 'img.png')
+        self.assertEqual(events[1][1]['size'], '70x70')
+        self.assertEqual(events[2][1], {'filename': filename})
+        self.assertFalse(Image.all_objects.exists())